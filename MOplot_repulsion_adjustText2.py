@@ -1,21 +1,77 @@
 
 # %%
-import seaborn as sns
 import json
-import matplotlib.pyplot as plt
+import logging
 import numpy as np
 import pandas as pd
 import os
-from adjustText import adjust_text
-
-def main():
+from label_layout import place_texts, transform_snapshot
+from stage_profile import configure as configure_profile, stage
+
+logger = logging.getLogger(__name__)
+
+# seaborn, matplotlib.pyplot and adjustText are imported by the functions that draw, so that
+# check_degen, the settings helpers and the level layout can be imported without them.
+
+# The values of the optional settings; degen, size, figsize, textX, texty, marker_size, line_width,
+# vertical_jitter and use_adjust_text have no default and must be in every settings file; textX and texty are in points
+DEFAULT_SETTINGS = {
+    "use_orbital_labels": False,
+    "label_engine": "native",
+    "label_column": None,
+    "jitter_seed": 2,
+    "split_spins": True,
+    "level_engine": "stripplot",
+    "bar_width": 0.6,
+    "degen_gap": 0.05,
+    "correlate": None,
+    "correlation_fchk": None,
+    "sharey": True,
+    "ncols": None,
+}
+
+def main(settings_file="settings.json"):
     """
     The main function that runs the MOplot program.
+
+    :param settings_file: The path to the settings file.
     """
-    settings = load_settings("settings.json")
+    settings = load_settings(settings_file)
+    # "profile": true prints a table of stage timings on exit, a path writes them as JSON (see stage_profile)
+    configure_profile(settings.get("profile"), settings.get("profile_memory", True))
+
+    plot_settings(settings, get_path(settings["data_path"]))
+
+
+def plot_settings(settings, data_path, ax=None):
+    """
+    Call plotMO_cat with the options stored in a settings dictionary, plotMO_panels if the settings list "panels", or plotMO_dos if they have a "dos" entry.
+
+    :param settings: The settings, as loaded by load_settings.
+    :param data_path: The full path to the data file, an orbital table already in memory, or an orbital store directory, which is read with the optional "query" entry of the settings (see orbital_store.load_orbitals).
+    :param ax: An Axes to draw into instead of creating and showing a new figure. Panels replace the contents of its Figure.
+    :return: The Axes containing the plot, or the list of panel Axes, or the level and DOS Axes.
+    """
+    settings = with_defaults(settings)
+    if isinstance(data_path, str) and os.path.isdir(data_path):
+        from orbital_store import load_orbitals
+
+        data_path = load_orbitals(data_path, **settings.get("query", {}))
+
+    if "panels" in settings:
+        return plotMO_panels(
+            data_path,
+            settings,
+            settings["panels"],
+            settings["ncols"],
+            figure=None if ax is None else ax.figure,
+        )
 
-    plotMO_cat(
-        get_path(settings["data_path"]),
+    if "dos" in settings:
+        return plotMO_dos(data_path, settings, settings["dos"], figure=None if ax is None else ax.figure)
+
+    return plotMO_cat(
+        data_path,
         settings["degen"],
         settings["size"],
         tuple(settings["figsize"]),
@@ -26,6 +82,16 @@ def main():
         settings["vertical_jitter"],
         settings["use_adjust_text"],
         use_orbital_labels=settings["use_orbital_labels"],
+        ax=ax,
+        label_engine=settings["label_engine"],
+        jitter_seed=settings["jitter_seed"],
+        split_spins=settings["split_spins"],
+        label_column=settings["label_column"],
+        level_engine=settings["level_engine"],
+        bar_width=settings["bar_width"],
+        degen_gap=settings["degen_gap"],
+        correlate=settings["correlate"],
+        correlation_fchk=settings["correlation_fchk"],
     )
 
 
@@ -43,6 +109,16 @@ def get_path(path):
     return full_path
 
 
+def with_defaults(settings):
+    """
+    Fill in the optional settings that a settings dictionary leaves out.
+
+    :param settings: The settings, as loaded by load_settings, or a panel merged over them.
+    :return: A new dictionary with DEFAULT_SETTINGS under the given settings.
+    """
+    return {**DEFAULT_SETTINGS, **settings}
+
+
 def load_settings(file_path):
     """
     Load the settings from a JSON file.
@@ -54,25 +130,81 @@ def load_settings(file_path):
         return json.load(f)
 
 
-def check_degen(array, degen):
+def degen_clusters(array, degen, groups=None):
     """
-    Given an array of values, check how many previous entries are within some tolerance of it and precede it by less than 4 places. Return an array of integers with the same length as the input array.
+    Cluster the values of an array that lie within some tolerance of each other. Values in different groups (e.g. compounds) are never put in the same cluster.
 
     :param array: The array of values to check for degeneracy.
     :param degen: The tolerance for degeneracy.
-    :return: An array of integers with the same length as the input array.
+    :param groups: Optional group labels with the same length as array, e.g. the compound column.
+    :return: An array with the cluster number of every value, numbered from 0 in order of group and value.
+    """
+    values = np.asarray(array, dtype=float)
+    n = len(values)
+    index = np.arange(n)
+    if groups is None:
+        group_codes = np.zeros(n, dtype=int)
+    else:
+        group_codes = np.unique(np.asarray(groups), return_inverse=True)[1].ravel()
+
+    # Sort by group then value, and start a new cluster wherever the group changes or the gap to the previous value reaches degen
+    order = np.lexsort((index, values, group_codes))
+    new_cluster = np.ones(n, dtype=bool)
+    new_cluster[1:] = (np.diff(group_codes[order]) != 0) | (np.diff(values[order]) >= degen)
+    cluster = np.empty(n, dtype=int)
+    cluster[order] = np.cumsum(new_cluster) - 1
+    return cluster
+
+
+def check_degen(array, degen, groups=None, cluster=None):
     """
-    # consider changing this so that only things with the same x axis coordinate are considered degenerate
+    Given an array of values, cluster the values that lie within some tolerance of each other and return each value's rank within its cluster. Values in different groups (e.g. compounds) are never considered degenerate. Return an array of integers with the same length as the input array, where 0 marks the first member of each cluster in input order.
 
-    degen = degen
-    degen_array = np.zeros(len(array), dtype=int)
-    for i in range(0, len(array)):
-        for j in range(0, i):
-            if (abs(array[i] - array[j]) < degen) and i - j < 4:
-                degen_array[i] += 1
+    :param array: The array of values to check for degeneracy.
+    :param degen: The tolerance for degeneracy.
+    :param groups: Optional group labels with the same length as array, e.g. the compound column.
+    :param cluster: The output of degen_clusters for the same arguments, if it has already been computed.
+    :return: An array of integers with the same length as the input array.
+    """
+    if cluster is None:
+        cluster = degen_clusters(array, degen, groups)
+    n = len(cluster)
+    index = np.arange(n)
+
+    # Rank the members of each cluster by their position in the input
+    order = np.lexsort((index, cluster))
+    sorted_cluster = cluster[order]
+    starts = np.ones(n, dtype=bool)
+    starts[1:] = sorted_cluster[1:] != sorted_cluster[:-1]
+    first = np.maximum.accumulate(np.where(starts, index, 0))
+    degen_array = np.empty(n, dtype=int)
+    degen_array[order] = index - first
     return degen_array
 
 
+def spin_columns(dataset, split_spins=True):
+    """
+    Return the x-axis column of every orbital and the order of the columns. Each compound has one column, except that open-shell compounds (those with beta orbitals in the spin column) get an alpha and a beta column side by side when split_spins is on.
+
+    :param dataset: The orbital table; the spin column is optional and missing spins count as alpha.
+    :param split_spins: Whether to split open-shell compounds into alpha and beta columns.
+    :return: A tuple (columns, order): a Series with the column name of every orbital, and the list of column names in plotting order.
+    """
+    compound = dataset["compound"].astype(str)
+    if not split_spins or "spin" not in dataset:
+        return compound, list(compound.unique())
+    spin = dataset["spin"].fillna("alpha")
+    open_shell = set(compound[spin == "beta"])
+    columns = compound.where(~compound.isin(open_shell), compound + " " + spin.map({"alpha": "α", "beta": "β"}))
+    order = []
+    for name in compound.unique():
+        if name in open_shell:
+            order.extend([name + " α", name + " β"])
+        else:
+            order.append(name)
+    return columns, order
+
+
 def repel_annotations(ax, annotations):
     """
     Detect and resolve overlapping annotations on a given Axes object using adjustText.
@@ -81,6 +213,8 @@ def repel_annotations(ax, annotations):
     :param annotations: List of the annotations on the Axes.
     :return: None
     """
+    from adjustText import adjust_text
+
     # List to store texts for adjust_text
     texts = []
 
@@ -116,17 +250,7 @@ def points_to_data_x(ax, points_distance_x):
     :param points_distance_x: The distance in points to convert.
     :return: The distance in data coordinates along the x-axis.
     """
-    # Transform a point at the origin to display coordinates
-    disp_coord = ax.transData.transform((0, 0))
-
-    # Add the desired offset in points
-    disp_coord_offset = disp_coord[0] + points_distance_x, disp_coord[1]
-
-    # Inverse transform the new display coordinate back to data coordinates
-    data_coord = ax.transData.inverted().transform(disp_coord_offset)
-
-    # Return the difference, which represents the points_distance in data coordinates
-    return data_coord[0] - 0
+    return transform_snapshot(ax).pixels_to_data((points_distance_x, 0))[0]
 
 
 def points_to_data_y(ax, points_distance_y):
@@ -137,17 +261,7 @@ def points_to_data_y(ax, points_distance_y):
     :param points_distance_y: The distance in points to convert.
     :return: The distance in data coordinates along the y-axis.
     """
-    # Transform a point at the origin to display coordinates
-    disp_coord = ax.transData.transform((0, 0))
-
-    # Add the desired offset in points
-    disp_coord_offset = disp_coord[0], disp_coord[1] + points_distance_y
-
-    # Inverse transform the new display coordinate back to data coordinates
-    data_coord = ax.transData.inverted().transform(disp_coord_offset)
-
-    # Return the difference, which represents the points_distance in data coordinates
-    return data_coord[1] - 0
+    return transform_snapshot(ax).pixels_to_data((0, points_distance_y))[1]
 
 
 def points_to_data(ax, offset):
@@ -155,10 +269,295 @@ def points_to_data(ax, offset):
     Convert a distance in points to a distance in data coordinates.
 
     :param ax: The Axes object containing the plot.
-    :param offset: The distance in points to convert.
+    :param offset: The distance in points to convert, or an (n, 2) array of distances.
     :return: The distance in data coordinates.
     """
-    return points_to_data_x(ax, offset[0]), points_to_data_y(ax, offset[1])
+    data = transform_snapshot(ax).pixels_to_data(offset)
+    return tuple(data) if data.ndim == 1 else data
+
+
+def prepare_levels(dataset, degen, vertical_jitter, jitter_seed=2, split_spins=True):
+    """
+    Work out where every level of an orbital table is drawn: its column, its numeric x position, its rank among degenerate levels and its jittered energy.
+
+    :param dataset: The orbital table.
+    :param degen: The tolerance for degeneracy.
+    :param vertical_jitter: The amount of vertical jitter to apply to degenerate levels.
+    :param jitter_seed: The seed of the random generator used for the jitter.
+    :param split_spins: Whether to split open-shell compounds into alpha and beta columns.
+    :return: A tuple (levels, column_order): a copy of the table with the jittered eV and the added _column, _x, _degen, _cluster and _jitter columns, and the list of column names in plotting order.
+    """
+    dataset = dataset.reset_index(drop=True)
+    eV = dataset.loc[:, "eV"]
+    # Open-shell compounds get an alpha and a beta column; degeneracy is only checked within a column
+    column, column_order = spin_columns(dataset, split_spins)
+
+    # Apply a small vertical offset to the data points to avoid overlapping points
+    # Degenerate points move up by a multiple of one batched draw, a little further for each additional degenerate level
+    with stage("check_degen"):
+        cluster = degen_clusters(eV, degen, column)
+        degen_num = check_degen(eV, degen, column, cluster)
+    rng = np.random.default_rng(jitter_seed)
+    multiplier = np.where(degen_num > 0, 1 + 0.25 * (degen_num - 1), 0.0)
+
+    # Create a mapping of column names to their numeric x-values
+    compound_to_x = {name: i for i, name in enumerate(column_order)}
+    jitter = multiplier * rng.uniform(0, vertical_jitter, len(dataset))
+    levels = dataset.assign(
+        eV=eV + jitter,
+        _column=column,
+        _x=column.map(compound_to_x).to_numpy(dtype=float),
+        _degen=degen_num,
+        _cluster=cluster,
+        _jitter=jitter,
+    )
+    return levels, column_order
+
+
+def engine_levels(levels, level_engine):
+    """
+    Undo the vertical jitter of prepare_levels for the "lines" engine, which sets degenerate levels side by side instead, so that they are drawn at their true energies. Degeneracy is kept as it was worked out.
+
+    :param levels: The levels from prepare_levels.
+    :param level_engine: The engine the levels will be drawn with, see draw_levels.
+    :return: The levels, with unjittered energies for "lines".
+    """
+    if level_engine != "lines":
+        return levels
+    jitter = levels["_jitter"].to_numpy()
+    return levels.assign(eV=np.where(jitter != 0, levels["eV"] - jitter, levels["eV"]), _jitter=0.0)
+
+
+def select_columns(levels, column_order, compounds):
+    """
+    Take the levels of some compounds out of the output of prepare_levels and give them x positions of their own, in the order the compounds are listed. Degeneracy and jitter are kept as they were worked out for the whole table.
+
+    :param levels: The levels from prepare_levels.
+    :param column_order: The column names in plotting order.
+    :param compounds: The compounds to keep.
+    :return: A tuple (levels, column_order) for the selected compounds.
+    """
+    columns = levels[["compound", "_column"]].drop_duplicates()
+    rank = {name: i for i, name in enumerate(column_order)}
+    order = []
+    for name in compounds:
+        order.extend(sorted(columns.loc[columns["compound"] == name, "_column"], key=rank.get))
+    selected = levels[levels["_column"].isin(order)].reset_index(drop=True)
+    compound_to_x = {name: i for i, name in enumerate(order)}
+    return selected.assign(_x=selected["_column"].map(compound_to_x).to_numpy(dtype=float)), order
+
+
+def draw_levels(
+    ax, levels, column_order, marker_size, line_width, hue_order=None, level_engine="stripplot", bar_width=0.6, degen_gap=0.05
+):
+    """
+    Draw the energy levels from prepare_levels as horizontal markers, one column per compound (or spin).
+
+    :param ax: The Axes to draw into.
+    :param levels: The levels from prepare_levels.
+    :param column_order: The column names in plotting order.
+    :param marker_size: The size of the markers.
+    :param line_width: The width of the lines.
+    :param hue_order: The order of the symmetry labels in the palette, so that several panels colour them alike.
+    :param level_engine: "stripplot" draws markers with seaborn, "lines" draws bars with degenerate levels side by side as one LineCollection (see level_lines.draw_level_lines).
+    :param bar_width: The width of a column's bars with the "lines" engine, in columns.
+    :param degen_gap: The space between degenerate bars with the "lines" engine, in columns.
+    :return: None
+    """
+    if level_engine == "lines":
+        from level_lines import draw_level_lines
+
+        with stage("level_lines"):
+            draw_level_lines(ax, levels, column_order, line_width, hue_order, bar_width, degen_gap)
+        return
+
+    import seaborn as sns
+
+    with stage("stripplot"):
+        sns.stripplot(
+            data=levels,
+            x="_column",
+            y="eV",
+            order=column_order,
+            marker="_",
+            linewidth=line_width,  # width of markers
+            zorder=3,
+            s=marker_size,  # size of markers
+            hue="symmetry_label",
+            hue_order=hue_order,
+            edgecolor="face",
+            palette="flare_r",
+            ax=ax,
+            legend=False,
+            jitter=False,
+            dodge=False,
+        )
+    ax.set_xlim(-0.5, len(column_order))
+
+
+def draw_correlations(
+    ax,
+    levels,
+    column_order,
+    correlate,
+    marker_size,
+    level_engine="stripplot",
+    bar_width=0.6,
+    degen_gap=0.05,
+    correlation_fchk=None,
+):
+    """
+    Link "the same" orbital in neighbouring columns with dashed lines (see correlation_lines.correlation_pairs). The limits must be final, as the ends of the markers are converted to data coordinates with one transform.
+
+    :param ax: The Axes containing the levels.
+    :param levels: The levels from prepare_levels.
+    :param column_order: The column names in plotting order.
+    :param correlate: "symmetry_label", "orbital_label" or "overlap".
+    :param marker_size: The size of the markers, which sets where the links of stripplot levels start and end.
+    :param level_engine: The engine the levels were drawn with, see draw_levels.
+    :param bar_width: See draw_levels.
+    :param degen_gap: See draw_levels.
+    :param correlation_fchk: For "overlap", a dict mapping every compound to its .fchk file.
+    :return: The LineCollection of the links.
+    """
+    from correlation_lines import correlation_pairs, draw_correlation_lines
+
+    with stage("correlation"):
+        left, right = correlation_pairs(levels, column_order, correlate, correlation_fchk)
+        if level_engine == "lines":
+            from level_lines import level_extents
+
+            x0, x1 = level_extents(levels, bar_width, degen_gap)
+        else:
+            # A "_" marker of size marker_size is a line marker_size points long
+            half = transform_snapshot(ax).points_to_data((0.5 * marker_size, 0))[0]
+            x0, x1 = levels["_x"].to_numpy() - half, levels["_x"].to_numpy() + half
+        return draw_correlation_lines(ax, levels, left, right, x0, x1)
+
+
+def level_labels(levels, use_orbital_labels, label_column=None):
+    """
+    Return the label text of every level.
+
+    :param levels: The levels from prepare_levels.
+    :param use_orbital_labels: Whether to label levels with orbital_label instead of symmetry_label.
+    :param label_column: A column to label levels with instead, overriding use_orbital_labels; missing values become empty labels.
+    :return: A Series of labels.
+    """
+    if label_column is not None:
+        return levels[label_column].fillna("")
+    return levels.loc[:, "orbital_label" if use_orbital_labels else "symmetry_label"]
+
+
+def draw_labels(
+    ax,
+    levels,
+    size,
+    textX,
+    marker_size,
+    line_width,
+    texty,
+    use_adjust_text,
+    use_orbital_labels,
+    label_engine="native",
+    label_column=None,
+    level_engine="stripplot",
+    bar_width=0.6,
+    degen_gap=0.05,
+):
+    """
+    Label the levels from prepare_levels, moving each further degenerate level's label to the right. With the "lines" level engine the labels are centred under the bars instead and drawn as one LabelLayer, unless adjustText moves them. The limits must be final, as the offsets are converted to data coordinates with one transform.
+
+    :param ax: The Axes containing the levels.
+    :param levels: The levels from prepare_levels.
+    :param size: The size of the labels.
+    :param textX: The x offset of the labels in points, multiplied for each degenerate level.
+    :param marker_size: The size of the markers.
+    :param line_width: The width of the lines.
+    :param texty: The y offset of the labels in points.
+    :param use_adjust_text: Whether to move labels so that they do not overlap.
+    :param use_orbital_labels: Whether to label levels with orbital_label instead of symmetry_label.
+    :param label_engine: "native" or "adjust_text", see plotMO_cat.
+    :param label_column: A column to label levels with instead, overriding use_orbital_labels.
+    :param level_engine: The engine the levels were drawn with, see draw_levels.
+    :param bar_width: See draw_levels.
+    :param degen_gap: See draw_levels.
+    :return: The artists of the labels: Text objects, or one LabelLayer.
+    """
+    labels = level_labels(levels, use_orbital_labels, label_column)
+    compound_numeric = levels["_x"].to_numpy()
+    degen_num = levels["_degen"].to_numpy()
+
+    if level_engine == "lines":
+        from level_lines import draw_label_layer, label_positions
+
+        with stage("label_transforms"):
+            label_xy = label_positions(ax, levels, line_width, texty, bar_width, degen_gap)
+        if not (use_adjust_text and label_engine == "adjust_text"):
+            with stage("label_layer"):
+                return [draw_label_layer(ax, label_xy, labels, size, use_adjust_text, compound_numeric)]
+    else:
+        # Define offsets for labels in points, based on textX, as the "lines" engine and annotate use points
+        textX = float(textX)
+        offsets = np.column_stack(
+            (
+                0.5 * marker_size + 2 * (degen_num + 1) * textX,
+                np.full(len(degen_num), line_width + texty, dtype=float),
+            )
+        )
+        with stage("label_transforms"):
+            label_xy = np.column_stack((compound_numeric, levels["eV"])) + transform_snapshot(
+                ax
+            ).points_to_data(offsets)
+
+    texts = []  # List to store the text objects
+
+    with stage("label_text"):
+        for i in range(0, len(levels)):
+            label = labels[i]  # the label text
+
+            new_x, new_y = label_xy[i]
+            logger.debug("label %d at x=%s, offset %s", i, compound_numeric[i], new_x - compound_numeric[i])
+
+            # Use ax.text to add the text at the new position
+            text = ax.text(
+                new_x,
+                new_y,
+                label,
+                size=size,
+                ha="center",
+                va="top",
+                fontstyle="oblique",
+                zorder=4,
+            )
+            texts.append(text)
+
+    if use_adjust_text and label_engine == "native":
+        with stage("place_texts"):
+            place_texts(ax, texts, columns=compound_numeric)
+    elif use_adjust_text:  # Apply adjust_text() outside the loop
+        from adjustText import adjust_text
+
+        with stage("adjust_text"):
+            adjust_text(
+                texts,
+                x=[t.get_position()[0] for t in texts],
+                y=[t.get_position()[1] for t in texts],
+                force_text=(0.001, 0.001),
+                force_static=(0.001, 0.001),
+                force_pull=(0.001, 0.005),
+                force_explode=(0.001, 0.001),
+                # explode_radius=(15),
+                expand=(1.1, 1.1),
+                ensure_inside_axes=True,
+                ax=ax,
+                avoid_self=False,
+                # only_move={"static": "x", "text": "x", "explode": "x", "pull": "x"},
+                # only_move={"static": "y", "text": "y", "explode": "y", "pull": "y"},
+                expand_axes=True,
+                # time_lim = 0.1
+            )
+    return texts
 
 
 def plotMO_cat(
@@ -173,179 +572,272 @@ def plotMO_cat(
     vertical_jitter,
     use_adjust_text,
     use_orbital_labels,
+    ax=None,
+    label_engine="native",
+    jitter_seed=2,
+    split_spins=True,
+    label_column=None,
+    level_engine="stripplot",
+    bar_width=0.6,
+    degen_gap=0.05,
+    correlate=None,
+    correlation_fchk=None,
 ):
     """
     Plot molecular orbitals given a path to a formatted molecular orbital list with labels.
 
-    :param data_path: The path to the data file.
+    :param data_path: The path to the data file, or a DataFrame with the same columns.
     :param degen: The tolerance for degeneracy.
     :param size: The size of the plot.
     :param figsize: The size of the figure.
-    :param textX: The x-axis label.
+    :param textX: The x offset of the labels in points, multiplied for each degenerate level.
     :param marker_size: The size of the markers.
     :param line_width: The width of the lines.
-    :param texty: The y-axis label.
+    :param texty: The y offset of the labels in points; with the "lines" level engine, the space between a bar and its label.
     :param vertical_jitter: The amount of vertical jitter to apply to the data points.
-    :param use_adjust_text: Whether to use adjustText to repel overlapping annotations.
-    :return: None
+    :param use_adjust_text: Whether to move labels so that they do not overlap.
+    :param use_orbital_labels: Whether to label levels with orbital_label instead of symmetry_label.
+    :param ax: An existing Axes to draw into. It is resized to figsize and not shown, so that one Figure can be reused across renders. If None, a new figure is created and shown.
+    :param label_engine: How overlapping labels are moved when use_adjust_text is on: "native" packs each column of labels in y in a single pass, "adjust_text" falls back to adjustText's force simulation.
+    :param jitter_seed: The seed of the random generator used for the vertical jitter, so that figures are reproducible.
+    :param split_spins: Whether to draw the alpha and beta orbitals of open-shell compounds (see the spin column) in two columns side by side.
+    :param label_column: A column to label levels with instead, e.g. the composition_label column written by extract_orbitals.py --composition. Overrides use_orbital_labels.
+    :param level_engine: "stripplot" draws the levels as seaborn markers; "lines" draws them as bars in one LineCollection, with degenerate levels side by side and the labels as one batched layer, which is much faster for large diagrams. vertical_jitter is ignored with "lines".
+    :param bar_width: The width of a column's bars with the "lines" engine, as a fraction of the column.
+    :param degen_gap: The space between the bars of degenerate levels with the "lines" engine, as a fraction of the column.
+    :param correlate: Link corresponding orbitals of neighbouring columns with dashed lines, matching them by "symmetry_label", by "orbital_label", or by coefficient "overlap". None draws no links.
+    :param correlation_fchk: For correlate="overlap", a dict mapping every compound to its .fchk file.
+    :return: The Axes containing the plot.
     """
-
-    # Set theme and define figure size.
-    sns.set_theme(
-        style="ticks", context="notebook", font_scale=1
-    )  # change this so that you can use different settings
-    fig, ax = plt.subplots(figsize=figsize)
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    show = ax is None
+    if show:
+        # Set theme and define figure size.
+        sns.set_theme(
+            style="ticks", context="notebook", font_scale=1
+        )  # change this so that you can use different settings
+        fig, ax = plt.subplots(figsize=figsize)
+    else:
+        ax.figure.set_size_inches(figsize)
     ax.grid(axis="y")
 
     # Define variables
-    dataset = pd.read_csv(data_path)
-    orbital_num = dataset.loc[:, "orbital_num"]
-    orbital_label = dataset.loc[:, "orbital_label"]
-    compound = dataset.loc[:, "compound"]
-    eV = dataset.loc[:, "eV"]
-    symmetry_label = dataset.loc[:, "symmetry_label"]
-
-    # Apply a small vertical offset to the data points to avoid overlapping points
-    np.random.seed(2)
-    degen_num = check_degen(eV, degen)
-    for i in range(0, len(compound)):
-        if degen_num[i] == 0:
-            # Apply no offset for nondegenerate points
-            pass
-        elif degen_num[i] == 1:
-            # Annotate degenerate points with an offset of offD
-            dataset["eV"][i] = dataset["eV"][i] + np.random.uniform(
-                0, vertical_jitter, 1
-            )
-        elif degen_num[i] == 2:
-            # Annotate doubly degenerate points with an offset of offD2
-            dataset["eV"][i] = dataset["eV"][i] + 1.25 * np.random.uniform(
-                0, vertical_jitter, 1
-            )
-        elif degen_num[i] == 3:
-            # Annotate triply degenerate points with an offset of offD3
-            dataset["eV"][i] = dataset["eV"][i] + 1.5 * np.random.uniform(
-                0, vertical_jitter, 1
-            )
-        else:
-            print("Error: check_degen() returned a value greater than 3.")
+    if isinstance(data_path, pd.DataFrame):
+        dataset = data_path
+    else:
+        with stage("read_csv"):
+            dataset = pd.read_csv(data_path)
+    with stage("prepare_levels"):
+        dataset, column_order = prepare_levels(dataset, degen, vertical_jitter, jitter_seed, split_spins)
+        dataset = engine_levels(dataset, level_engine)
 
     # Plot data
-    sns.stripplot(
-        data=dataset,
-        x="compound",
-        y="eV",
-        marker="_",
-        linewidth=line_width,  # width of markers
-        zorder=3,
-        s=marker_size,  # size of markers
-        hue="symmetry_label",
-        edgecolor="face",
-        palette="flare_r",
-        ax=ax,
-        legend=False,
-        jitter=False,
-        dodge=False,
-    )
+    draw_levels(ax, dataset, column_order, marker_size, line_width, None, level_engine, bar_width, degen_gap)
+    if correlate:
+        draw_correlations(
+            ax, dataset, column_order, correlate, marker_size, level_engine, bar_width, degen_gap, correlation_fchk
+        )
 
     # Plot labels and fix labels of degenerate energy levels
-    # Define offsets for labels, based on textX:
-    textX = float(textX)
-    offD3 = (0.5 * marker_size + 8 * textX, line_width + texty)
-    offD2 = (0.5 * marker_size + 6 * textX, line_width + texty)
-    offD = (0.5 * marker_size + 4 * textX, line_width + texty)
-    offset = (0.5 * marker_size + 2 * textX, line_width + texty)
+    with stage("draw_labels"):
+        draw_labels(
+            ax,
+            dataset,
+            size,
+            textX,
+            marker_size,
+            line_width,
+            texty,
+            use_adjust_text,
+            use_orbital_labels,
+            label_engine,
+            label_column,
+            level_engine,
+            bar_width,
+            degen_gap,
+        )
+
+    # plt.ylabel("eV", fontsize=14)
+    # plt.xticks(fontsize=12)
+    # plt.yticks(fontsize=12)
 
-    offD3_data = points_to_data(ax, offD3)
-    offD2_data = points_to_data(ax, offD2)
-    offD_data = points_to_data(ax, offD)
-    offset_data = points_to_data(ax, offset)
+    ax.set(xlabel=None)
+    ax.set_ylabel("eV")
 
-    degen_num = check_degen(eV, degen)
+    sns.despine(ax=ax)
+    if show:
+        plt.show()
+    return ax
 
-    # Create a mapping of compound names to their numeric x-values
-    unique_compounds = dataset["compound"].unique()
-    # Recreate the compound_to_x mapping
-    compound_to_x = {compound: i for i, compound in enumerate(unique_compounds)}
-    # Use the mapping to get numeric x-values for each compound in the dataset
-    compound_numeric = [compound_to_x[comp] for comp in compound]
 
-    ax.set_xlim(-0.5, len(unique_compounds))
+def plotMO_panels(data_path, settings, panels, ncols=None, figure=None):
+    """
+    Draw several panels into one figure, each showing some of the compounds of one orbital table. The table is read once, and the degeneracy, jitter and colour of every level are worked out once for the whole table, so a compound is drawn the same way in every panel it appears in. Labels are placed after every panel is drawn, when the shared y-limits are final.
 
-    texts = []  # List to store the text objects
+    A panel is a dict such as {"compounds": ["NiCis", "NiTrans"], "title": "Ni"}. It may also override the label settings size, textX, texty, use_adjust_text, use_orbital_labels, label_engine and label_column, and the level settings level_engine, bar_width, degen_gap, correlate and correlation_fchk. Links are drawn once the shared limits are final. A panel without compounds shows every compound.
 
-    for i in range(0, len(compound)):
-        x = compound_to_x[compound[i]]  # retrieve the numeric x position
-        y = eV[i]  # original y position
-        if use_orbital_labels:
-            label = orbital_label[i]
-        else:
-            label = symmetry_label[i]  # the label text
-
-        # Assign offsets based on degeneracy
-        if degen_num[i] == 0:
-            offset = offset_data
-        elif degen_num[i] == 1:
-            offset = offD_data
-        elif degen_num[i] == 2:
-            offset = offD2_data
-        elif degen_num[i] == 3:
-            offset = offD3_data
-        else:
-            print("Error: check_degen() returned a value greater than 3.")
-
-        # Calculate the new x and y positions using the offsets
-        new_x = x + offset[0]
-        print(x)
-        print(offset[0])
-        new_y = y + offset[1]
-
-        # Use ax.text to add the text at the new position
-        text = ax.text(
-            new_x,
-            new_y,
-            label,
-            size=size,
-            ha="center",
-            va="top",
-            fontstyle="oblique",
-            zorder=4,
+    :param data_path: The path to the data file, or a DataFrame with the same columns.
+    :param settings: The settings, as loaded by load_settings; figsize is the size of the whole figure, and "sharey" (default true) shares the energy axis between panels.
+    :param panels: The list of panels.
+    :param ncols: The number of panels per row; all panels are in one row if None.
+    :param figure: A Figure to draw into, which is cleared first. If None, a new figure is created and shown.
+    :return: The list of Axes, one per panel.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    if isinstance(data_path, pd.DataFrame):
+        dataset = data_path
+    else:
+        dataset = pd.read_csv(data_path)
+    settings = with_defaults(settings)
+    levels, column_order = prepare_levels(
+        dataset,
+        settings["degen"],
+        settings["vertical_jitter"],
+        settings["jitter_seed"],
+        settings["split_spins"],
+    )
+    hue_order = list(levels["symmetry_label"].dropna().unique())
+
+    show = figure is None
+    if show:
+        sns.set_theme(style="ticks", context="notebook", font_scale=1)
+        figure = plt.figure(figsize=tuple(settings["figsize"]))
+    else:
+        figure.clf()
+        figure.set_size_inches(tuple(settings["figsize"]))
+    ncols = ncols or len(panels)
+    nrows = -(-len(panels) // ncols)
+    grid = figure.subplots(nrows, ncols, sharey=settings["sharey"], squeeze=False)
+    axes = list(grid.ravel()[: len(panels)])
+    for ax in grid.ravel()[len(panels):]:
+        ax.remove()
+
+    # Draw every panel's levels first, so that the shared limits are final before any label is placed
+    selections, orders = [], []
+    for ax, panel in zip(axes, panels):
+        options = {**settings, **panel}
+        selected, order = select_columns(levels, column_order, panel.get("compounds", list(levels["compound"].unique())))
+        selected = engine_levels(selected, options["level_engine"])
+        selections.append(selected)
+        orders.append(order)
+        ax.grid(axis="y")
+        draw_levels(
+            ax,
+            selected,
+            order,
+            options["marker_size"],
+            options["line_width"],
+            hue_order,
+            options["level_engine"],
+            options["bar_width"],
+            options["degen_gap"],
         )
 
-        if use_adjust_text:
-            texts.append(text)
+    for ax, panel, selected, order in zip(axes, panels, selections, orders):
+        options = {**settings, **panel}
+        if options["correlate"]:
+            draw_correlations(
+                ax,
+                selected,
+                order,
+                options["correlate"],
+                options["marker_size"],
+                options["level_engine"],
+                options["bar_width"],
+                options["degen_gap"],
+                options["correlation_fchk"],
+            )
 
-    if use_adjust_text:  # Apply adjust_text() outside the loop
-        adjust_text(
-            texts,
-            x=[t.get_position()[0] for t in texts],
-            y=[t.get_position()[1] for t in texts],
-            force_text=(0.001, 0.001),
-            force_static=(0.001, 0.001),
-            force_pull=(0.001, 0.005),
-            force_explode=(0.001, 0.001),
-            # explode_radius=(15),
-            expand=(1.1, 1.1),
-            ensure_inside_axes=True,
-            ax=ax,
-            avoid_self=False,
-            # only_move={"static": "x", "text": "x", "explode": "x", "pull": "x"},
-            # only_move={"static": "y", "text": "y", "explode": "y", "pull": "y"},
-            expand_axes=True,
-            # time_lim = 0.1
+    for i, (ax, panel, selected) in enumerate(zip(axes, panels, selections)):
+        options = {**settings, **panel}
+        draw_labels(
+            ax,
+            selected,
+            options["size"],
+            options["textX"],
+            options["marker_size"],
+            options["line_width"],
+            options["texty"],
+            options["use_adjust_text"],
+            options["use_orbital_labels"],
+            options["label_engine"],
+            options["label_column"],
+            options["level_engine"],
+            options["bar_width"],
+            options["degen_gap"],
         )
+        ax.set(xlabel=None)
+        ax.set_ylabel("eV" if i % ncols == 0 else "")
+        if "title" in panel:
+            ax.set_title(panel["title"])
+        sns.despine(ax=ax)
 
-    # plt.ylabel("eV", fontsize=14)
-    # plt.xticks(fontsize=12)
-    # plt.yticks(fontsize=12)
+    if show:
+        plt.show()
+    return axes
 
-    ax.set(xlabel=None)
-    plt.ylabel("eV")
 
-    sns.despine()
-    plt.show()
+def plotMO_dos(data_path, settings, dos, figure=None):
+    """
+    Draw the level diagram of a settings dict beside the broadened density of states of the compounds' checkpoints, on a shared energy axis (see density_of_states).
+
+    dos is a dict such as {"files": {"NiCis": "NiCis.fchk"}, "fwhm": 0.2}. Its optional entries are "shape" ("gaussian" or "lorentzian"), "range" (the energy grid [emin, emax], by default the levels' range padded by 1 eV), "step" (0.01 eV), "project" (element-projected densities, false), "by_angular" (false) and "width_ratio" (the width of the DOS panel relative to the diagram, 0.4).
+
+    :param data_path: The path to the data file, or a DataFrame with the same columns.
+    :param settings: The settings, as loaded by load_settings.
+    :param dos: The DOS settings.
+    :param figure: A Figure to draw into, which is cleared first. If None, a new figure is created and shown.
+    :return: A tuple (levels_ax, dos_ax).
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    from density_of_states import dos_table, energy_grid, plot_dos
+
+    if isinstance(data_path, pd.DataFrame):
+        dataset = data_path
+    else:
+        dataset = pd.read_csv(data_path)
+
+    show = figure is None
+    if show:
+        sns.set_theme(style="ticks", context="notebook", font_scale=1)
+        figure = plt.figure(figsize=tuple(settings["figsize"]))
+    else:
+        figure.clf()
+    levels_ax, dos_ax = figure.subplots(
+        1, 2, sharey=True, gridspec_kw={"width_ratios": [1, dos.get("width_ratio", 0.4)]}
+    )
+    cat_settings = {key: value for key, value in settings.items() if key != "dos"}
+    plot_settings(cat_settings, dataset, ax=levels_ax)
+
+    # The labels are placed for the diagram's limits, so the DOS must not change them
+    ylim = levels_ax.get_ylim()
+    emin, emax = dos.get("range", (dataset["eV"].min() - 1, dataset["eV"].max() + 1))
+    with stage("dos"):
+        table = dos_table(
+            dos["files"],
+            energy_grid(emin, emax, dos.get("step", 0.01)),
+            dos.get("fwhm", 0.2),
+            dos.get("shape", "gaussian"),
+            dos.get("project", False),
+            by_angular=dos.get("by_angular", False),
+        )
+    plot_dos(dos_ax, table, project=dos.get("project", False))
+    levels_ax.set_ylim(ylim)
+    dos_ax.legend(fontsize="x-small", frameon=False)
+    sns.despine(ax=dos_ax)
+
+    if show:
+        plt.show()
+    return levels_ax, dos_ax
 
 
-main()
+if __name__ == "__main__":
+    main()
 
 # %%
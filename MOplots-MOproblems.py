@@ -2,11 +2,11 @@
 # - Add option to plot with or without labels
 
 # Import modules
-import seaborn as sns
-import matplotlib.pyplot as plt
+# seaborn and matplotlib.pyplot are imported by the plotting functions, so that importing this module stays cheap
 import numpy as np
 import pandas as pd
 import os
+from MOplot_repulsion_adjustText2 import check_degen, degen_clusters
 
 
 def get_path():
@@ -26,6 +26,9 @@ def plotMO_swarm(data_path, degen, size, figsize, textX, marker_size, line_width
 
     """
 
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     # Set theme and define figure size.
     sns.set_theme(style='ticks', context='paper')
     fig, ax = plt.subplots(figsize=figsize)
@@ -67,62 +70,33 @@ def plotMO_swarm(data_path, degen, size, figsize, textX, marker_size, line_width
     #offD = (4*textX, 0)
     #offset = (2*textX, 0)
     
-    offD3 = (0.5 * marker_size + 8*textX, line_width + texty)
-    offD2 = (0.5 * marker_size + 6*textX, line_width + texty)
-    offD = (0.5 * marker_size + 4*textX, line_width + texty)
-    offset = (0.5 * marker_size + 2*textX, line_width + texty)
+    degen_num = check_degen(eV, degen, compound)
 
-    degen_num = check_degen(eV, degen)
 
+    # Offset labels to the right, further for each degenerate level. The offsets stay in points
+    # (textcoords="offset points"), so the labels keep their place when the window is resized
+    compound_to_x = {c: i for i, c in enumerate(compound.unique())}
+    x = compound.map(compound_to_x).to_numpy()
+    offsets = np.column_stack((0.5 * marker_size + 2 * (degen_num + 1) * textX,
+                               np.full(len(compound), line_width + texty, dtype=float)))
 
     for i in range(0, len(compound)):
-        if degen_num[i] == 0:
-            # Annotate non-degenerate points with an offset of offset
-            ax.annotate(symmetry_label[i], xy=(compound[i], eV[i]), xytext=offset, size=size,
-                        ha="center", va="top", textcoords="offset points")
-        elif degen_num[i] == 1:
-            # Annotate degenerate points with an offset of offD
-            ax.annotate(symmetry_label[i], xy=(compound[i], eV[i]), xytext=offD, size=size,
-                        ha="center", va="top", textcoords="offset points")
-        elif degen_num[i] == 2:
-            # Annotate doubly degenerate points with an offset of offD2
-            ax.annotate(symmetry_label[i], xy=(compound[i], eV[i]), xytext=offD2, size=size,
-                        ha="center", va="top", textcoords="offset points")
-        elif degen_num[i] == 3:
-            # Annotate triply degenerate points with an offset of offD3
-            ax.annotate(symmetry_label[i], xy=(compound[i], eV[i]), xytext=offD3, size=size,
-                        ha="center", va="top", textcoords="offset points")
-        else:
-            print("Error: check_degen() returned a value greater than 3.")
+        ax.annotate(symmetry_label[i], xy=(x[i], eV[i]), xytext=offsets[i], size=size,
+                    ha="center", va="top", textcoords="offset points")
 
 
     sns.despine()
     plt.show()
 
-# for each entry in an array, check how many previous entries are within some tolerance of it
-
-
-def check_degen(array, degen):
-    """check_degen:
-    Given an array of values, check how many previous entries are within some tolerance of it and precede it by less than 4 places. Return an array of integers with the same length as the input array.
-    """
-    # consider changing this so that only things with the same x axis coordinate are considered degenerate
-    
-    degen = degen
-    degen_array = np.zeros(len(array), dtype=int)
-    for i in range(0, len(array)):
-        for j in range(0, i):
-            if (abs(array[i] - array[j]) < degen) and i - j < 4:
-                degen_array[i] += 1
-    return degen_array
-
-
 def plotMO_cat(data_path, degen, size, figsize, textX, marker_size, line_width, texty, vertical_jitter):
     """PlotMO:
     Given a path to a formatted molecular orbital list with labels, plot molecular orbitals.
 
     """
 
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     # Set theme and define figure size.
     sns.set_theme(style='ticks', context='paper')
     fig, ax = plt.subplots(figsize=figsize)
@@ -136,19 +110,28 @@ def plotMO_cat(data_path, degen, size, figsize, textX, marker_size, line_width,
     eV = dataset.loc[:, "eV"]
     symmetry_label = dataset.loc[:, "symmetry_label"]
 
+    # Draw the alpha and beta orbitals of open-shell compounds (see the spin column) in two columns side by side
+    column = compound.astype(str)
+    if 'spin' in dataset:
+        spin = dataset['spin'].fillna('alpha')
+        open_shell = column.isin(column[spin == 'beta'])
+        column = column.where(~open_shell, column + ' ' + spin.map({'alpha': 'α', 'beta': 'β'}))
+    dataset = dataset.assign(column=column)
+
     #Apply a small vertical offset to the data points to avoid overlapping points
-    np.random.seed(2)
-    degen_num = check_degen(eV, degen)
-    for i in range(0, len(compound)):
-        if degen_num[i] > 0:
-            # Apply small vetical offset to degenerate points\
-            dataset['eV'][i] = dataset['eV'][i] + np.random.uniform(-vertical_jitter, vertical_jitter, 1)
+    rng = np.random.default_rng(2)
+    cluster = degen_clusters(eV, degen, column)
+    degen_num = check_degen(eV, degen, column, cluster)
+    # Apply small vertical offset to degenerate points, drawn in one batch
+    jitter = rng.uniform(-vertical_jitter, vertical_jitter, len(dataset))
+    dataset = dataset.assign(eV=eV + np.where(degen_num > 0, jitter, 0.0))
+    eV = dataset.loc[:, "eV"]
             
     #dataset['eV'] = dataset['eV'] + np.random.uniform(-0.1, 0.1, len(dataset))
       
 
     # Plot data
-    sns.stripplot(data=dataset, x='compound', y='eV',
+    sns.stripplot(data=dataset, x='column', y='eV',
                   marker='_',
                   linewidth=line_width, # width of markers
                   zorder=3,
@@ -174,33 +157,20 @@ def plotMO_cat(data_path, degen, size, figsize, textX, marker_size, line_width,
     #offD2 = (6*textX, 0)
     #offD = (4*textX, 0)
     #offset = (2*textX, 0)
-    
-    offD3 = (0.5 * marker_size + 8*textX, line_width + texty)
-    offD2 = (0.5 * marker_size + 6*textX, line_width + texty)
-    offD = (0.5 * marker_size + 4*textX, line_width + texty)
-    offset = (0.5 * marker_size + 2*textX, line_width + texty)
 
-    degen_num = check_degen(eV, degen)
+    # Keep the clusters found before the jitter, so labels stay with the levels they were offset for
+    degen_num = check_degen(eV, degen, column, cluster)
+
+    # Offset labels to the right, further for each degenerate level. The offsets stay in points
+    # (textcoords="offset points"), so the labels keep their place when the window is resized
+    compound_to_x = {c: i for i, c in enumerate(column.unique())}
+    x = column.map(compound_to_x).to_numpy()
+    offsets = np.column_stack((0.5 * marker_size + 2 * (degen_num + 1) * textX,
+                               np.full(len(compound), line_width + texty, dtype=float)))
 
     for i in range(0, len(compound)):
-        if degen_num[i] == 0:
-            # Annotate non-degenerate points with an offset of offset
-            ax.annotate(symmetry_label[i], xy=(compound[i], eV[i]), xytext=offset, size=size,
-                        ha="center", va="top", textcoords="offset points")
-        elif degen_num[i] == 1:
-            # Annotate degenerate points with an offset of offD
-            ax.annotate(symmetry_label[i], xy=(compound[i], eV[i]), xytext=offD, size=size,
-                        ha="center", va="top", textcoords="offset points")
-        elif degen_num[i] == 2:
-            # Annotate doubly degenerate points with an offset of offD2
-            ax.annotate(symmetry_label[i], xy=(compound[i], eV[i]), xytext=offD2, size=size,
-                        ha="center", va="top", textcoords="offset points")
-        elif degen_num[i] == 3:
-            # Annotate triply degenerate points with an offset of offD3
-            ax.annotate(symmetry_label[i], xy=(compound[i], eV[i]), xytext=offD3, size=size,
-                        ha="center", va="top", textcoords="offset points")
-        else:
-            print("Error: check_degen() returned a value greater than 3.")
+        ax.annotate(symmetry_label[i], xy=(x[i], eV[i]), xytext=offsets[i], size=size,
+                    ha="center", va="top", textcoords="offset points")
 
     # change axis label size using plt.xlabel
     #plt.xlabel('Compound', fontsize=14)
@@ -212,14 +182,15 @@ def plotMO_cat(data_path, degen, size, figsize, textX, marker_size, line_width,
     plt.show()
 
 
-data_path = get_path() # path to data file
-degen = 0.05 # degeneracy tolerance
-size = 11 # size of labels
-figsize = (6.5, 4.5) # size of figure
-textX = 11 # multiple for x offset of labels
-texty = 2 #y offset of labels added to marker hight
-marker_size = 20 # size of markers
-line_width = 3 # width of markers
-vertical_jitter = 0.075 # amount of vertical jitter applied to degenerate points
-plotMO_cat(data_path, degen, size, figsize, textX, marker_size, line_width, texty, vertical_jitter)
-#plotMO_swarm(data_path, degen, size, figsize, textX, marker_size, line_width, texty)
+if __name__ == "__main__":
+    data_path = get_path() # path to data file
+    degen = 0.05 # degeneracy tolerance
+    size = 11 # size of labels
+    figsize = (6.5, 4.5) # size of figure
+    textX = 11 # multiple for x offset of labels
+    texty = 2 #y offset of labels added to marker hight
+    marker_size = 20 # size of markers
+    line_width = 3 # width of markers
+    vertical_jitter = 0.075 # amount of vertical jitter applied to degenerate points
+    plotMO_cat(data_path, degen, size, figsize, textX, marker_size, line_width, texty, vertical_jitter)
+    #plotMO_swarm(data_path, degen, size, figsize, textX, marker_size, line_width, texty)
@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))  # the project modules live one level up
+
+import matplotlib
+
+matplotlib.use("Agg")  # render off-screen, before pyplot is imported
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from density_of_states import checkpoint_dos, energy_grid
+from extract_orbitals import orbital_columns
+from fchk_class import Fchk
+from label_layout import place_labels_1d, place_texts
+from correlation_lines import correlation_pairs
+from MOplot_repulsion_adjustText2 import check_degen, draw_labels, draw_levels, plotMO_cat, prepare_levels
+from synthetic import orbital_frame, write_fchk
+
+# Problem sizes: each preset sets the checkpoint and orbital table dimensions
+PRESETS = {
+    "small": {"nat": 20, "nbasis": 200, "opt_steps": 20, "compounds": 8, "levels": 20},
+    "medium": {"nat": 60, "nbasis": 800, "opt_steps": 100, "compounds": 20, "levels": 40},
+    "large": {"nat": 150, "nbasis": 2000, "opt_steps": 500, "compounds": 50, "levels": 80},
+}
+
+# Arguments of plotMO_cat, as in settings.json
+PLOT_SETTINGS = {
+    "degen": 0.03,
+    "size": 8,
+    "figsize": (12, 8),
+    "textX": 3,
+    "marker_size": 20,
+    "line_width": 2,
+    "texty": 0.01,
+    "vertical_jitter": 0.0,
+    "use_adjust_text": True,
+    "use_orbital_labels": False,
+}
+
+# A result this much slower than the baseline is reported as a regression
+REGRESSION_RATIO = 1.2
+
+
+def measure(func, repeat):
+    """
+    Time a function over several runs, then run it once more under tracemalloc for its peak Python memory.
+
+    :param func: A function of no arguments.
+    :param repeat: The number of timed runs.
+    :return: A dict with the min, median and max time in seconds and the peak memory in bytes.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "max": max(times),
+        "repeat": repeat,
+        "peak_bytes": peak,
+    }
+
+
+def fchk_benchmarks(size, tmpdir):
+    """
+    Build the checkpoint benchmarks: eager and lazy parsing, HOMO/LUMO extraction with and without the coefficient matrices, trajectory loading, and total and projected densities of states.
+
+    :param size: The preset dict.
+    :param tmpdir: The directory to write the synthetic checkpoints in.
+    :return: A dict mapping benchmark names to functions of no arguments.
+    """
+    full = write_fchk(os.path.join(tmpdir, "full.fchk"), size["nat"], size["nbasis"], beta=True, opt_steps=size["opt_steps"])
+    bare = write_fchk(os.path.join(tmpdir, "bare.fchk"), size["nat"], size["nbasis"], coefficients=False)
+    parsed = Fchk(full)
+    grid = energy_grid()
+
+    def extract():
+        orbital_columns(Fchk(full, lazy=True), "bench", 10, 10)
+
+    return {
+        "fchk_parse": lambda: Fchk(full),
+        "fchk_parse_no_coefficients": lambda: Fchk(bare),
+        "fchk_parse_lazy": lambda: Fchk(full, lazy=True).ahomo,
+        "extract_homo_lumo": extract,
+        "extract_from_parsed": lambda: orbital_columns(parsed, "bench", 10, 10),
+        "fchk_trajectory": lambda: Fchk(full, lazy=True).trajectory(),
+        "dos_total": lambda: checkpoint_dos(parsed, grid),
+        "dos_projected": lambda: checkpoint_dos(Fchk(full, lazy=True), grid, project=True),
+    }
+
+
+def table_benchmarks(size):
+    """
+    Build the orbital table benchmarks: degeneracy detection, correlation matching, label packing, label placement on a figure and a full plotMO_cat render with each level engine.
+
+    :param size: The preset dict.
+    :return: A dict mapping benchmark names to functions of no arguments.
+    """
+    frame = orbital_frame(size["compounds"], size["levels"])
+    settings = PLOT_SETTINGS
+    rng = np.random.default_rng(0)
+    heights = rng.uniform(0.05, 0.15, len(frame))
+    fig, ax = plt.subplots(figsize=settings["figsize"])
+    levels, column_order = prepare_levels(frame, settings["degen"], settings["vertical_jitter"])
+    draw_levels(ax, levels, column_order, settings["marker_size"], settings["line_width"])
+
+    def label():
+        for text in list(ax.texts):
+            text.remove()
+        texts = draw_labels(
+            ax,
+            levels,
+            settings["size"],
+            settings["textX"],
+            settings["marker_size"],
+            settings["line_width"],
+            settings["texty"],
+            False,
+            settings["use_orbital_labels"],
+        )
+        place_texts(ax, texts, columns=levels["_x"].to_numpy())
+
+    render_ax = plt.subplots()[1]
+
+    def render(level_engine="stripplot"):
+        render_ax.cla()
+        plotMO_cat(frame, ax=render_ax, level_engine=level_engine, **settings)
+        render_ax.figure.canvas.draw()
+
+    return {
+        "check_degen": lambda: check_degen(frame["eV"], settings["degen"], frame["compound"]),
+        "correlation_pairs": lambda: correlation_pairs(levels, column_order),
+        "place_labels_1d": lambda: place_labels_1d(frame["eV"], heights, frame["compound"]),
+        "label_placement": label,
+        "plotMO_cat_render": render,
+        "plotMO_cat_render_lines": lambda: render("lines"),
+    }
+
+
+def metadata(preset):
+    """
+    Describe the machine and the code a run measured, so results from different versions can be told apart.
+
+    :param preset: The name of the preset.
+    :return: A dict of metadata.
+    """
+    import pandas as pd
+    import seaborn as sns
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "preset": preset,
+        "size": PRESETS[preset],
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "matplotlib": matplotlib.__version__,
+        "seaborn": sns.__version__,
+    }
+
+
+def compare(results, baseline):
+    """
+    Compare the median times of a run with those of a baseline run.
+
+    :param results: The benchmark results of this run.
+    :param baseline: The benchmark results of the baseline.
+    :return: A list of (name, ratio) for the benchmarks that got slower by more than REGRESSION_RATIO.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median"] / baseline[name]["median"]
+        if ratio > REGRESSION_RATIO:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time parsing, extraction, degeneracy detection, label placement and rendering on synthetic data."
+    )
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small", help="problem size")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("-k", "--select", default=None, help="only run benchmarks whose name contains this")
+    parser.add_argument("-o", "--output", default=None, help="JSON file to write the results to")
+    parser.add_argument("--compare", default=None, help="JSON results of an earlier run to check for regressions")
+    args = parser.parse_args(argv)
+
+    size = PRESETS[args.preset]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        benchmarks = {**fchk_benchmarks(size, tmpdir), **table_benchmarks(size)}
+        for name, func in benchmarks.items():
+            if args.select and args.select not in name:
+                continue
+            results[name] = measure(func, args.repeat)
+            result = results[name]
+            print(
+                f"{name:<28} median {result['median'] * 1000:9.2f} ms"
+                f"  min {result['min'] * 1000:9.2f} ms  peak {result['peak_bytes'] / 2**20:8.2f} MiB",
+                file=sys.stderr,
+            )
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    report = {
+        "meta": metadata(args.preset),
+        "max_rss_bytes": maxrss if sys.platform == "darwin" else maxrss * 1024,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline)
+        for name, ratio in regressions:
+            print(f"REGRESSION {name}: {ratio:.2f}x the baseline median", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
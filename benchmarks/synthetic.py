@@ -0,0 +1,159 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+# Atomic numbers drawn for the synthetic molecules: a metal centre surrounded by organic atoms
+ORGANIC = np.array([1, 1, 1, 6, 6, 6, 7, 8])
+METALS = np.array([28, 30, 46, 78])
+SYMMETRY_LABELS = ["$a_{1u}$", "$a_{2u}$", "$b_{1g}$", "$b_{2u}$", "$e_{g}$", "$e_{u}$"]
+
+
+def scalar_line(name, kind, value):
+    """
+    Format a scalar section header the way Gaussian does.
+
+    :param name: The section name.
+    :param kind: "I" or "R".
+    :param value: The value.
+    :return: The line, without a newline.
+    """
+    if kind == "I":
+        return f"{name:<43}I{value:>17d}"
+    return f"{name:<43}R{value:>27.15E}"
+
+
+def array_block(name, kind, values):
+    """
+    Format an array section the way Gaussian does, with six integers or five reals per line.
+
+    :param name: The section name.
+    :param kind: "I" or "R".
+    :param values: The values.
+    :return: The header and value lines, joined with newlines.
+    """
+    values = np.asarray(values)
+    per_line, fmt = (6, "%12d") if kind == "I" else (5, "%16.8E")
+    out = io.StringIO()
+    out.write(f"{name:<43}{kind}   N={len(values):>12d}\n")
+    full = len(values) // per_line * per_line
+    if full:
+        np.savetxt(out, values[:full].reshape(-1, per_line), fmt=fmt, delimiter="")
+    if full < len(values):
+        np.savetxt(out, values[full:].reshape(1, -1), fmt=fmt, delimiter="")
+    return out.getvalue().rstrip("\n")
+
+
+def shells_for(nat, nbasis, rng):
+    """
+    Spread nbasis basis functions over nat atoms as s, p and pure d shells, the way a split-valence basis set would.
+
+    :param nat: The number of atoms.
+    :param nbasis: The number of basis functions.
+    :param rng: The random generator.
+    :return: A tuple (shell_types, shell_to_atom) with Gaussian's codes and 1-based atoms.
+    """
+    sizes = {0: 1, 1: 3, -2: 5}
+    types, atoms, total = [], [], 0
+    while total < nbasis:
+        shell = int(rng.choice([0, 1, -2], p=[0.4, 0.4, 0.2]))
+        if total + sizes[shell] > nbasis:
+            shell = 0
+        types.append(shell)
+        atoms.append(int(rng.integers(1, nat + 1)))
+        total += sizes[shell]
+    order = np.argsort(atoms, kind="stable")
+    return np.asarray(types)[order], np.asarray(atoms)[order]
+
+
+def write_fchk(path, nat=20, nbasis=200, beta=False, coefficients=True, opt_steps=0, seed=0):
+    """
+    Write a synthetic Gaussian formatted checkpoint with the sections this project reads.
+
+    :param path: The file to write.
+    :param nat: The number of atoms.
+    :param nbasis: The number of basis functions (and of MOs).
+    :param beta: Whether to write an unrestricted calculation with beta orbitals.
+    :param coefficients: Whether to write the MO coefficient matrices.
+    :param opt_steps: The number of geometries in an optimization trajectory, or 0 for none.
+    :param seed: The seed of the random generator.
+    :return: The path.
+    """
+    rng = np.random.default_rng(seed)
+    numbers = rng.choice(ORGANIC, size=nat)
+    numbers[0] = rng.choice(METALS)
+    nelec = min(int(numbers.sum()), 2 * nbasis - 2)
+    alpha = (nelec + 1) // 2
+    beta_electrons = nelec // 2 if not beta else nelec - alpha
+    shell_types, shell_atoms = shells_for(nat, nbasis, rng)
+
+    blocks = [
+        "Synthetic checkpoint",
+        f"{'SP':<10}{'UB3LYP' if beta else 'RB3LYP':<60}def2SVP",
+        scalar_line("Number of atoms", "I", nat),
+        scalar_line("Charge", "I", 0),
+        scalar_line("Multiplicity", "I", 1 + alpha - beta_electrons),
+        scalar_line("Number of electrons", "I", nelec),
+        scalar_line("Number of alpha electrons", "I", alpha),
+        scalar_line("Number of beta electrons", "I", beta_electrons),
+        scalar_line("Number of basis functions", "I", nbasis),
+        scalar_line("Number of independent functions", "I", nbasis),
+        array_block("Atomic numbers", "I", numbers),
+        array_block("Nuclear charges", "R", numbers.astype(float)),
+        array_block("Current cartesian coordinates", "R", rng.normal(scale=5.0, size=3 * nat)),
+        array_block("Shell types", "I", shell_types),
+        array_block("Shell to atom map", "I", shell_atoms),
+        scalar_line("SCF Energy", "R", -1500.0 - rng.random()),
+        scalar_line("Total Energy", "R", -1500.0 - rng.random()),
+        array_block("Alpha Orbital Energies", "R", np.sort(rng.normal(-0.5, 1.0, nbasis))),
+    ]
+    if beta:
+        blocks.append(array_block("Beta Orbital Energies", "R", np.sort(rng.normal(-0.5, 1.0, nbasis))))
+    if coefficients:
+        blocks.append(array_block("Alpha MO coefficients", "R", rng.normal(size=nbasis * nbasis)))
+        if beta:
+            blocks.append(array_block("Beta MO coefficients", "R", rng.normal(size=nbasis * nbasis)))
+    blocks.append(array_block("Total SCF Density", "R", rng.normal(size=nbasis * (nbasis + 1) // 2)))
+    if opt_steps:
+        blocks.append(array_block("Optimization Number of geometries", "I", [opt_steps]))
+        blocks.append(array_block("Opt point       1 Geometries", "R", rng.normal(scale=5.0, size=3 * nat * opt_steps)))
+    blocks.append(array_block("Dipole Moment", "R", rng.normal(size=3)))
+    with open(path, "w") as f:
+        f.write("\n".join(blocks) + "\n")
+    return path
+
+
+def orbital_frame(n_compounds=20, n_levels=40, degenerate_fraction=0.3, seed=0):
+    """
+    Make a synthetic orbital table in the CSV schema, with many compounds and levels, some of them degenerate.
+
+    :param n_compounds: The number of compounds.
+    :param n_levels: The number of levels per compound, half occupied and half virtual.
+    :param degenerate_fraction: The fraction of levels that repeat the energy of the level below them.
+    :param seed: The seed of the random generator.
+    :return: A DataFrame with the columns of the orbital CSV files.
+    """
+    rng = np.random.default_rng(seed)
+    energies = np.sort(rng.normal(-4.0, 2.0, (n_compounds, n_levels)), axis=1)
+    repeat = rng.random((n_compounds, n_levels)) < degenerate_fraction
+    repeat[:, 0] = False
+    for j in range(1, n_levels):
+        energies[:, j] = np.where(repeat[:, j], energies[:, j - 1] + rng.normal(0, 0.005, n_compounds), energies[:, j])
+    homo = n_levels // 2 - 1
+    offsets = np.arange(n_levels) - homo
+    labels = np.where(
+        offsets <= 0,
+        np.char.add("HOMO", np.where(offsets == 0, "", np.char.add("-", (-offsets).astype(str)))),
+        np.char.add("LUMO", np.where(offsets == 1, "", np.char.add("+", (offsets - 1).astype(str)))),
+    )
+    frame = pd.DataFrame(
+        {
+            "compound": np.repeat([f"C{i:03d}" for i in range(n_compounds)], n_levels),
+            "unround_eV": energies.ravel(),
+            "eV": np.round(energies.ravel(), 2),
+            "symmetry_label": rng.choice(SYMMETRY_LABELS, n_compounds * n_levels),
+            "orbital_label": np.tile(labels, n_compounds),
+            "orbital_num": np.tile(np.arange(n_levels) + 100, n_compounds),
+        }
+    )
+    return frame
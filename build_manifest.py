@@ -0,0 +1,172 @@
+import glob
+import hashlib
+import json
+import os
+
+from fchk_cache import file_hash
+
+MANIFEST_FILE = ".moplot-manifest.json"
+
+# The modules whose code decides what a figure looks like; editing one of them invalidates every figure
+CODE_FILES = [
+    "MOplot_repulsion_adjustText2.py",
+    "label_layout.py",
+    "level_lines.py",
+    "correlation_lines.py",
+    "density_of_states.py",
+    "orbital_composition.py",
+    "orbital_store.py",
+    "extract_orbitals.py",
+    "fchk_class.py",
+]
+
+
+def load_manifest(path):
+    """
+    Read a build manifest, or return an empty one if there is none or it cannot be read.
+
+    :param path: The manifest file.
+    :return: A dict mapping the input of each job, relative to the manifest directory, to its record.
+    """
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, path):
+    """
+    Write a build manifest, replacing the old one in one step so an interrupted build never leaves it half-written.
+
+    :param manifest: A dict mapping the input of each job, relative to the manifest directory, to its record.
+    :param path: The manifest file.
+    :return: None
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def file_state(path, previous=None):
+    """
+    Describe a file by its size, mtime and content hash. The hash of previous is reused when the size and mtime have not changed, so unchanged inputs are not read again.
+
+    :param path: The file.
+    :param previous: The state recorded for the file by the last build, or None.
+    :return: A dict with size, mtime and hash, or None if the file does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime") == stat.st_mtime:
+        return previous
+    return {"size": stat.st_size, "mtime": stat.st_mtime, "hash": file_hash(path)}
+
+
+def input_files(data_path):
+    """
+    Return the files a figure is drawn from: the data file itself, or every Parquet file of an orbital store.
+
+    :param data_path: The data file or orbital store directory.
+    :return: A sorted list of paths.
+    """
+    if os.path.isdir(data_path):
+        return sorted(glob.glob(os.path.join(data_path, "*.parquet")))
+    return [data_path]
+
+
+def settings_inputs(settings):
+    """
+    Return the files named in a settings dict that a figure reads besides its data: the checkpoints that correlate="overlap" matches orbitals by (correlation_fchk, a dict or a list), for the figure and for each of its panels, and the checkpoints of a density-of-states panel (dos.files).
+
+    :param settings: The settings, with paths resolved as the renderer reads them.
+    :return: A sorted list of paths.
+    """
+    files = (settings.get("dos") or {}).get("files") or {}
+    paths = set(files.values() if isinstance(files, dict) else files)
+    for panel in settings.get("panels") or [{}]:
+        options = {**settings, **panel}
+        if options.get("correlate") == "overlap":
+            checkpoints = options.get("correlation_fchk") or {}
+            paths.update(checkpoints.values() if isinstance(checkpoints, dict) else checkpoints)
+    return sorted(paths)
+
+
+def settings_digest(settings, **options):
+    """
+    Return a hash of a settings dict and any other options that change the output, e.g. the formats and dpi.
+
+    :param settings: The settings.
+    :param options: Further options to include.
+    :return: The hex digest.
+    """
+    text = json.dumps({"settings": settings, "options": options}, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def code_digest():
+    """
+    Return a hash of the plotting code, so that figures are redrawn after it changes.
+
+    :return: The hex digest.
+    """
+    head = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha1()
+    for name in CODE_FILES:
+        path = os.path.join(head, name)
+        if os.path.exists(path):
+            digest.update(file_hash(path).encode())
+    return digest.hexdigest()
+
+
+def job_record(data_path, settings_hash, outputs, previous=None, code_hash=None, settings=None):
+    """
+    Build the manifest record of a rendered or checked job.
+
+    :param data_path: The data file or orbital store the figure is drawn from.
+    :param settings_hash: The output of settings_digest.
+    :param outputs: The figure files the job writes.
+    :param previous: The record of the last build, whose file hashes are reused where possible.
+    :param code_hash: The output of code_digest.
+    :param settings: The settings, whose checkpoint files (see settings_inputs) are recorded as inputs too.
+    :return: The record, a dict of input states, the settings and code hashes and the output states.
+    """
+    previous = previous or {}
+    old_inputs, old_outputs = previous.get("inputs", {}), previous.get("outputs", {})
+    inputs = input_files(data_path) + settings_inputs(settings or {})
+    return {
+        "inputs": {p: file_state(p, old_inputs.get(p)) for p in inputs},
+        "settings": settings_hash,
+        "code": code_hash,
+        "outputs": {p: file_state(p, old_outputs.get(p)) for p in outputs},
+    }
+
+
+def content_hashes(states):
+    """
+    Reduce file states to their content hashes, ignoring sizes and mtimes.
+
+    :param states: A dict mapping paths to file states.
+    :return: A dict mapping paths to hashes, or None for missing files.
+    """
+    return {path: state and state["hash"] for path, state in states.items()}
+
+
+def is_up_to_date(record, previous):
+    """
+    Return True if a job's inputs, settings, code and outputs all match the last build, so it need not be rendered again. A missing or edited output also counts as a change.
+
+    :param record: The current record from job_record.
+    :param previous: The record of the last build, or None.
+    :return: Whether the job can be skipped.
+    """
+    if not previous or any(state is None for state in record["outputs"].values()):
+        return False
+    if record["settings"] != previous.get("settings") or record["code"] != previous.get("code"):
+        return False
+    return all(
+        content_hashes(record[key]) == content_hashes(previous.get(key, {})) for key in ("inputs", "outputs")
+    )
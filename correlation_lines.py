@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+
+# How correlate may match orbitals between neighbouring columns
+CORRELATION_MODES = ("symmetry_label", "orbital_label", "overlap")
+
+
+def blank_labels(labels):
+    """
+    Find the labels that carry no information: missing values, whitespace, and the '" "' placeholder written by extract_orbitals.py.
+
+    :param labels: The labels.
+    :return: A boolean array, True for blank labels.
+    """
+    text = pd.Series(labels, dtype=object).fillna("").astype(str).str.strip().str.strip('"').str.strip()
+    return (text == "").to_numpy()
+
+
+def match_by_key(energy_a, energy_b, keys_a, keys_b):
+    """
+    Pair the orbitals of two columns that have the same key, e.g. the same symmetry label. Keys held by one orbital on each side are paired directly in one vectorized step; where several orbitals share a key, they are paired by Hungarian matching on the energy difference, so the closest levels are linked. Blank keys are never matched.
+
+    :param energy_a: The energies of the first column.
+    :param energy_b: The energies of the second column.
+    :param keys_a: The keys of the first column.
+    :param keys_b: The keys of the second column.
+    :return: A tuple (ia, ib) of index arrays into the two columns.
+    """
+    n_a = len(keys_a)
+    codes = pd.factorize(np.concatenate((np.asarray(keys_a, dtype=object), np.asarray(keys_b, dtype=object))))[0]
+    codes[blank_labels(np.concatenate((keys_a, keys_b)))] = -1
+    codes_a, codes_b = codes[:n_a], codes[n_a:]
+    n_keys = codes.max() + 1 if len(codes) else 0
+    count_a = np.bincount(codes_a[codes_a >= 0], minlength=n_keys)
+    count_b = np.bincount(codes_b[codes_b >= 0], minlength=n_keys)
+
+    # Keys with one orbital on each side
+    single = (count_a == 1) & (count_b == 1)
+    position_b = np.full(n_keys, -1)
+    position_b[codes_b[codes_b >= 0]] = np.flatnonzero(codes_b >= 0)
+    ia = [np.flatnonzero((codes_a >= 0) & single[codes_a])]
+    ib = [position_b[codes_a[ia[0]]]]
+
+    # Keys shared by several orbitals on either side
+    for code in np.flatnonzero((count_a > 0) & (count_b > 0) & ~single):
+        rows, cols = np.flatnonzero(codes_a == code), np.flatnonzero(codes_b == code)
+        r, c = linear_sum_assignment(np.abs(energy_a[rows, None] - energy_b[None, cols]))
+        ia.append(rows[r])
+        ib.append(cols[c])
+    return np.concatenate(ia), np.concatenate(ib)
+
+
+def coefficient_overlap(coeffs_a, coeffs_b):
+    """
+    Return the absolute overlap of every pair of MOs of two calculations in the same basis, as the cosine of their coefficient vectors. The .fchk has no AO overlap matrix, so the basis functions are treated as orthonormal; this ranks pairs well when both calculations share a geometry-independent basis ordering.
+
+    :param coeffs_a: The coefficient rows of the first set of MOs.
+    :param coeffs_b: The coefficient rows of the second set of MOs.
+    :return: An array with one row per MO of the first set and one column per MO of the second, with values in [0, 1].
+    """
+    if coeffs_a.shape[1] != coeffs_b.shape[1]:
+        raise ValueError(
+            f"cannot overlap MOs with {coeffs_a.shape[1]} and {coeffs_b.shape[1]} basis functions; "
+            "correlate by label instead"
+        )
+    a = coeffs_a / np.linalg.norm(coeffs_a, axis=1, keepdims=True)
+    b = coeffs_b / np.linalg.norm(coeffs_b, axis=1, keepdims=True)
+    return np.abs(a @ b.T)
+
+
+def match_by_overlap(energy_a, energy_b, overlap, energy_weight=0.1, min_overlap=0.5):
+    """
+    Pair the orbitals of two columns by Hungarian matching on their overlap, using the energy difference to break near-ties. Pairs that overlap less than min_overlap are dropped.
+
+    :param energy_a: The energies of the first column.
+    :param energy_b: The energies of the second column.
+    :param overlap: The output of coefficient_overlap for the two columns.
+    :param energy_weight: The cost of one eV of energy difference, relative to a full loss of overlap.
+    :param min_overlap: The smallest overlap worth linking.
+    :return: A tuple (ia, ib) of index arrays into the two columns.
+    """
+    cost = (1 - overlap) + energy_weight * np.abs(energy_a[:, None] - energy_b[None, :])
+    ia, ib = linear_sum_assignment(cost)
+    keep = overlap[ia, ib] >= min_overlap
+    return ia[keep], ib[keep]
+
+
+def column_coefficients(fchk, levels):
+    """
+    Read the coefficient rows of the orbitals of one column from its checkpoint, one batch per spin.
+
+    :param fchk: The parsed Fchk of the column's compound.
+    :param levels: The levels of the column, with orbital_num and an optional spin column.
+    :return: An array with one coefficient row per level.
+    """
+    orbital_num = levels["orbital_num"].to_numpy(dtype=int)
+    spins = levels["spin"].fillna("alpha").to_numpy() if "spin" in levels else np.full(len(levels), "alpha")
+    coeffs = None
+    for spin in np.unique(spins):
+        mask = spins == spin
+        rows = np.asarray(fchk.mo_coefficients(orbital_num[mask], spin), dtype=float)
+        if coeffs is None:
+            coeffs = np.empty((len(levels), rows.shape[1]))
+        coeffs[mask] = rows
+    return coeffs if coeffs is not None else np.zeros((0, 0))
+
+
+def correlation_pairs(levels, column_order, correlate="symmetry_label", fchk=None, energy_weight=0.1, min_overlap=0.5):
+    """
+    Match the orbitals of every pair of neighbouring columns.
+
+    :param levels: The levels from prepare_levels.
+    :param column_order: The column names in plotting order.
+    :param correlate: "symmetry_label" or "orbital_label" to link orbitals with the same label, or "overlap" to link orbitals by coefficient overlap.
+    :param fchk: For "overlap", a dict mapping every compound to its Fchk or .fchk path.
+    :param energy_weight: See match_by_overlap.
+    :param min_overlap: See match_by_overlap.
+    :return: A tuple (left, right) of row positions in levels, one pair per link.
+    """
+    if correlate not in CORRELATION_MODES:
+        raise ValueError(f"correlate must be one of {', '.join(CORRELATION_MODES)}, not {correlate!r}")
+    if correlate == "overlap":
+        if not fchk:
+            raise ValueError('correlate="overlap" needs the .fchk file of every compound')
+        from fchk_class import Fchk
+
+        fchk = {name: f if isinstance(f, Fchk) else Fchk(f, lazy=True) for name, f in fchk.items()}
+
+    column = levels["_column"].to_numpy()
+    energy = levels["eV"].to_numpy(dtype=float)
+    members = {name: np.flatnonzero(column == name) for name in column_order}
+    coeffs = {}
+    left, right = [], []
+    for name_a, name_b in zip(column_order[:-1], column_order[1:]):
+        rows_a, rows_b = members[name_a], members[name_b]
+        if not len(rows_a) or not len(rows_b):
+            continue
+        if correlate == "overlap":
+            for name, rows in ((name_a, rows_a), (name_b, rows_b)):
+                if name not in coeffs:
+                    compound = levels["compound"].iat[rows[0]]
+                    coeffs[name] = column_coefficients(fchk[compound], levels.iloc[rows])
+            overlap = coefficient_overlap(coeffs[name_a], coeffs[name_b])
+            ia, ib = match_by_overlap(energy[rows_a], energy[rows_b], overlap, energy_weight, min_overlap)
+        else:
+            keys = levels[correlate].to_numpy()
+            ia, ib = match_by_key(energy[rows_a], energy[rows_b], keys[rows_a], keys[rows_b])
+        left.append(rows_a[ia])
+        right.append(rows_b[ib])
+    if not left:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    return np.concatenate(left), np.concatenate(right)
+
+
+def draw_correlation_lines(ax, levels, left, right, x0, x1, line_width=1.0, color="0.5", linestyle="--"):
+    """
+    Draw the links between matched orbitals as one LineCollection, from the right end of each level to the left end of its partner.
+
+    :param ax: The Axes containing the levels.
+    :param levels: The levels from prepare_levels.
+    :param left: The row positions of the levels on the left of each link.
+    :param right: The row positions of the levels on the right of each link.
+    :param x0: The left end of every level, in data coordinates.
+    :param x1: The right end of every level, in data coordinates.
+    :param line_width: The width of the links, in points.
+    :param color: The colour of the links.
+    :param linestyle: The line style of the links.
+    :return: The LineCollection.
+    """
+    from matplotlib.collections import LineCollection
+
+    energy = levels["eV"].to_numpy(dtype=float)
+    segments = np.stack(
+        (np.column_stack((x1[left], energy[left])), np.column_stack((x0[right], energy[right]))), axis=1
+    )
+    lines = LineCollection(segments, colors=color, linewidths=line_width, linestyles=linestyle, zorder=2)
+    ax.add_collection(lines, autolim=False)
+    return lines
@@ -0,0 +1,251 @@
+import argparse
+import csv
+import sys
+
+import numpy as np
+import pandas as pd
+
+from extract_orbitals import compound_name_from_path, find_fchk_files, orbital_spins
+from stage_profile import stage
+
+DOS_SHAPES = ("gaussian", "lorentzian")
+
+# FWHM of a Gaussian in units of its standard deviation
+GAUSSIAN_FWHM = 2 * np.sqrt(2 * np.log(2))
+
+
+def energy_grid(emin=-20.0, emax=10.0, step=0.01):
+    """
+    Return an evenly spaced energy grid.
+
+    :param emin: The lowest energy, in eV.
+    :param emax: The highest energy, in eV.
+    :param step: The spacing of the grid, in eV.
+    :return: The grid, including emin and emax.
+    """
+    return emin + step * np.arange(int(round((emax - emin) / step)) + 1)
+
+
+def stick_spectrum(energies, grid, weights=None):
+    """
+    Bin levels onto an evenly spaced grid, splitting each level between its two neighbouring grid points in proportion to its distance from them, so the mean energy of the spectrum is kept exactly. Levels outside the grid are dropped.
+
+    :param energies: The level energies, in eV.
+    :param grid: The energy grid from energy_grid.
+    :param weights: The weight of every level, or an (n, k) array of k weights per level; 1 if None.
+    :return: The density in states per eV, with one row per grid point (and one column per weight if weights is 2-D).
+    """
+    energies = np.asarray(energies, dtype=float)
+    step = grid[1] - grid[0]
+    position = (energies - grid[0]) / step
+    inside = (position >= 0) & (position <= len(grid) - 1)
+    index = np.minimum(np.floor(position[inside]).astype(np.int64), len(grid) - 2)
+    upper = position[inside] - index
+    if weights is None:
+        weights = np.ones(len(energies))
+    weights = np.asarray(weights, dtype=float)[inside]
+    columns = weights if weights.ndim > 1 else weights[:, None]
+    sticks = np.empty((len(grid), columns.shape[1]))
+    for j in range(columns.shape[1]):
+        sticks[:, j] = np.bincount(index, columns[:, j] * (1 - upper), minlength=len(grid))
+        sticks[1:, j] += np.bincount(index + 1, columns[:, j] * upper, minlength=len(grid))[1:]
+    sticks /= step
+    return sticks if weights.ndim > 1 else sticks[:, 0]
+
+
+def broadening_kernel(step, fwhm=0.2, shape="gaussian", max_points=None):
+    """
+    Sample a unit-area line shape on the grid spacing. A Gaussian is cut off at six standard deviations and a Lorentzian at a hundred half-widths (or max_points either side), and the samples are scaled to sum to one, so broadening keeps the number of states.
+
+    :param step: The spacing of the grid, in eV.
+    :param fwhm: The full width at half maximum, in eV.
+    :param shape: "gaussian" or "lorentzian".
+    :param max_points: The largest number of samples either side of the centre, e.g. the length of the grid.
+    :return: The kernel, an array of odd length centred on its middle sample.
+    """
+    if shape == "gaussian":
+        sigma = fwhm / GAUSSIAN_FWHM
+        half = int(np.ceil(6 * sigma / step))
+    elif shape == "lorentzian":
+        gamma = fwhm / 2
+        half = int(np.ceil(100 * gamma / step))
+    else:
+        raise ValueError(f"shape must be one of {', '.join(DOS_SHAPES)}, not {shape!r}")
+    if max_points is not None:
+        half = min(half, max_points)
+    x = step * np.arange(-half, half + 1)
+    if shape == "gaussian":
+        kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    else:
+        kernel = 1 / (1 + (x / gamma) ** 2)
+    return kernel / kernel.sum()
+
+
+def broaden(sticks, kernel):
+    """
+    Convolve a stick spectrum with a line shape by FFT, along the energy axis.
+
+    :param sticks: The output of stick_spectrum.
+    :param kernel: The output of broadening_kernel.
+    :return: The broadened spectrum, with the shape of sticks.
+    """
+    from scipy.signal import fftconvolve
+
+    if sticks.ndim == 1:
+        return fftconvolve(sticks, kernel, mode="same")
+    return fftconvolve(sticks, kernel[:, None], mode="same", axes=0)
+
+
+def checkpoint_dos(fchk, grid, fwhm=0.2, shape="gaussian", project=False, fragments=None, by_angular=False, chunk=1024):
+    """
+    Compute the broadened density of states of one checkpoint from its full orbital manifold. A restricted orbital counts as two states and an unrestricted orbital as one, so the totals of restricted and unrestricted calculations compare directly.
+
+    Levels are binned onto the grid padded by the half-width of the line shape and the result is cropped after broadening, so levels just outside the grid still contribute their tails. With project on, the density is split into fragments by C-squared populations (see orbital_composition). Only the orbitals within reach of the grid are analysed, chunk coefficient rows at a time, so memory stays bounded for large basis sets.
+
+    :param fchk: The parsed Fchk.
+    :param grid: The energy grid from energy_grid.
+    :param fwhm: The full width at half maximum of the broadening, in eV.
+    :param shape: "gaussian" or "lorentzian".
+    :param project: Whether to add one column per fragment.
+    :param fragments: A dict mapping fragment names to 0-based atom indices; atoms are grouped by element if None.
+    :param by_angular: Whether to split every fragment into its s, p, d, ... contributions.
+    :param chunk: The number of orbitals analysed at once.
+    :return: A DataFrame with an eV column, a total column and, with project on, one column per fragment, in states per eV.
+    """
+    from orbital_composition import checkpoint_groups, orbital_composition
+
+    step = grid[1] - grid[0]
+    kernel = broadening_kernel(step, fwhm, shape, len(grid))
+    spins = orbital_spins(fchk)
+    occupancy = 2.0 if len(spins) == 1 else 1.0
+    half = len(kernel) // 2
+    padded = grid[0] + step * np.arange(-half, len(grid) + half)
+    columns = {"eV": grid}
+    total = np.zeros(len(padded))
+    projected = {}
+    # The basis-function-to-fragment matrix is the same for every chunk and spin, so it is built once
+    groups = checkpoint_groups(fchk, fragments, by_angular) if project else None
+    for spin in spins:
+        energies = np.asarray(fchk.alpha_energies if spin == "alpha" else fchk.beta_energies, dtype=float)
+        total += occupancy * stick_spectrum(energies, padded)
+        if not project:
+            continue
+        with stage("dos projection"):
+            # Orbital energies are sorted, so the orbitals that reach the grid are one contiguous block
+            first = np.searchsorted(energies, padded[0], side="left")
+            last = np.searchsorted(energies, padded[-1], side="right")
+            for start in range(first, last, chunk):
+                stop = min(start + chunk, last)
+                composition = orbital_composition(fchk, slice(start, stop), spin, groups=groups)
+                sticks = occupancy / 100 * stick_spectrum(energies[start:stop], padded, composition.to_numpy())
+                for j, name in enumerate(composition.columns):
+                    projected[name] = projected.get(name, 0) + sticks[:, j]
+    with stage("dos broaden"):
+        names = ["total"] + list(projected)
+        broadened = broaden(np.column_stack([total] + [projected[name] for name in projected]), kernel)
+    columns.update(zip(names, broadened[half : half + len(grid)].T))
+    return pd.DataFrame(columns)
+
+
+def iter_dos(checkpoints, grid, fwhm=0.2, shape="gaussian", project=False, fragments=None, by_angular=False):
+    """
+    Stream the density of states of many checkpoints, opening each one lazily and releasing it before the next, so memory stays flat however many compounds there are.
+
+    :param checkpoints: A dict mapping compound names to Fchk objects or .fchk paths, or a list of paths, named as by extract_orbitals.py.
+    :param grid: The energy grid shared by every compound.
+    :param fwhm: See checkpoint_dos.
+    :param shape: See checkpoint_dos.
+    :param project: See checkpoint_dos.
+    :param fragments: See checkpoint_dos.
+    :param by_angular: See checkpoint_dos.
+    :return: A generator of (compound, DataFrame) tuples.
+    """
+    from fchk_class import Fchk
+
+    if not isinstance(checkpoints, dict):
+        checkpoints = {compound_name_from_path(path): path for path in checkpoints}
+    for name, fchk in checkpoints.items():
+        if not isinstance(fchk, Fchk):
+            fchk = Fchk(fchk, lazy=True)
+        yield name, checkpoint_dos(fchk, grid, fwhm, shape, project, fragments, by_angular)
+
+
+def dos_table(checkpoints, grid, fwhm=0.2, shape="gaussian", project=False, fragments=None, by_angular=False):
+    """
+    Return the density of states of many checkpoints as one table.
+
+    :return: A DataFrame with a compound column and the columns of checkpoint_dos; fragments a compound lacks are NaN.
+    """
+    frames = [
+        frame.assign(compound=name)
+        for name, frame in iter_dos(checkpoints, grid, fwhm, shape, project, fragments, by_angular)
+    ]
+    table = pd.concat(frames, ignore_index=True)
+    return table[["compound"] + [c for c in table.columns if c != "compound"]]
+
+
+def plot_dos(ax, table, compounds=None, project=True):
+    """
+    Draw densities of states with the energy on the y-axis, so they can sit beside a level diagram from plotMO_cat on a shared energy axis. Every compound's total is filled, and its fragment projections are drawn as lines in the same colour.
+
+    :param ax: The Axes to draw into.
+    :param table: The output of dos_table.
+    :param compounds: The compounds to draw; all of them if None.
+    :param project: Whether to draw the fragment projections as well as the totals.
+    :return: None
+    """
+    fragments = [c for c in table.columns if c not in ("compound", "eV", "total")]
+    linestyles = ["--", ":", "-."]
+    for i, (name, frame) in enumerate(table.groupby("compound", sort=False)):
+        if compounds is not None and name not in compounds:
+            continue
+        color = f"C{i}"
+        ax.fill_betweenx(frame["eV"], 0, frame["total"], color=color, alpha=0.25, lw=0)
+        ax.plot(frame["total"], frame["eV"], color=color, lw=1, label=name)
+        if not project:
+            continue
+        for j, fragment in enumerate(c for c in fragments if frame[c].notna().any()):
+            ax.plot(
+                frame[fragment],
+                frame["eV"],
+                color=color,
+                lw=0.8,
+                linestyle=linestyles[j % len(linestyles)],
+                label=f"{name} {fragment}",
+            )
+    ax.set_xlim(left=0)
+    ax.set_xlabel("DOS (states/eV)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compute broadened (and optionally atom-projected) densities of states from .fchk files, "
+        "streaming one compound at a time into a long-format CSV."
+    )
+    parser.add_argument("paths", nargs="+", help=".fchk files, directories or glob patterns")
+    parser.add_argument("-o", "--output", default="dos.csv", help="CSV to write, one row per compound, energy and component")
+    parser.add_argument("--range", nargs=2, type=float, default=(-20.0, 10.0), metavar=("EMIN", "EMAX"), help="energy range in eV")
+    parser.add_argument("--step", type=float, default=0.01, help="grid spacing in eV")
+    parser.add_argument("--fwhm", type=float, default=0.2, help="broadening FWHM in eV")
+    parser.add_argument("--shape", choices=DOS_SHAPES, default="gaussian", help="line shape")
+    parser.add_argument("--project", action="store_true", help="add element-projected densities from the MO coefficients")
+    parser.add_argument("--by-angular", action="store_true", help="split projections into s, p, d, ... contributions")
+    args = parser.parse_args(argv)
+
+    paths = find_fchk_files(args.paths)
+    if not paths:
+        parser.error("no .fchk files found")
+    grid = energy_grid(args.range[0], args.range[1], args.step)
+    with open(args.output, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["compound", "eV", "component", "dos"])
+        for name, frame in iter_dos(paths, grid, args.fwhm, args.shape, args.project, None, args.by_angular):
+            for component in frame.columns[1:]:
+                writer.writerows(zip([name] * len(grid), np.round(grid, 6), [component] * len(grid), frame[component]))
+            print(f"{name}: {len(frame.columns) - 2} projections", file=sys.stderr)
+    print(f"Wrote {args.output}: {len(paths)} compounds.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+import argparse
+import csv
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from fchk_class import Fchk
+
+CSV_HEADER = ["compound", "unround_eV", "eV", "symmetry_label", "orbital_label", "orbital_num", "spin"]
+
+# The Fchk attributes orbital_columns reads, cached on their own when no composition is asked for
+ENERGY_ATTRIBUTES = ["alpha_energies", "beta_energies"]
+
+
+def get_orbitals_around_homo_lumo(fchk_data, N_orbitals, spin="alpha"):
+    result = {}
+    if spin == "beta":
+        homo, lumo, energies = fchk_data.bhomo, fchk_data.blumo, fchk_data.beta_energies
+    else:
+        homo, lumo, energies = fchk_data.ahomo, fchk_data.alumo, fchk_data.alpha_energies
+
+    # HOMO energies and labels
+    start_homo = homo - N_orbitals + 1
+    end_homo = homo + 1  # +1 to include HOMO itself
+    for i in range(start_homo, end_homo):
+        if i < 0:
+            continue
+        label_diff = homo - i
+        label = f"HOMO-{label_diff}" if label_diff != 0 else "HOMO"
+        result[label] = {
+            'orbital_number': i,
+            'energy': energies[i]
+        }
+
+    # LUMO energies and labels
+    start_lumo = lumo
+    end_lumo = lumo + N_orbitals  # +N_orbitals to include LUMO itself and N_orbitals above it
+    for i in range(start_lumo, end_lumo):
+        if i >= len(energies):
+            break
+        label_diff = i - lumo
+        label = f"LUMO+{label_diff}" if label_diff != 0 else "LUMO"
+        result[label] = {
+            'orbital_number': i,
+            'energy': energies[i]
+        }
+
+    return result
+
+
+def orbital_spins(fchk_data):
+    """
+    Return the spins with their own orbitals in a checkpoint: ["alpha"] for restricted calculations, ["alpha", "beta"] for unrestricted ones, told apart by the Beta Orbital Energies section, so a beta manifold without electrons is kept.
+
+    :param fchk_data: The parsed Fchk.
+    :return: The list of spins.
+    """
+    return ["alpha", "beta"] if fchk_data.beta_energies is not None else ["alpha"]
+
+
+def orbital_columns(fchk_data, compound_name, n_occupied=None, n_virtual=None, spin=None):
+    """
+    Return a window of orbitals (or the full manifold) as a dict of columns in the CSV schema, built from whole arrays.
+    The alpha and beta windows of an unrestricted calculation come from the same parsed checkpoint, alpha rows first.
+
+    :param fchk_data: The parsed Fchk.
+    :param compound_name: The value of the compound column.
+    :param n_occupied: The number of occupied orbitals to include, or None for all of them.
+    :param n_virtual: The number of virtual orbitals to include, or None for all of them.
+    :param spin: "alpha" or "beta", or None for every spin in the checkpoint.
+    :return: A dict mapping each name in CSV_HEADER to an array with one entry per orbital.
+    """
+    spins = orbital_spins(fchk_data) if spin is None else [spin]
+    windows = [fchk_data.orbital_window(n_occupied, n_virtual, s) for s in spins]
+    energy = np.concatenate([w["energy"] for w in windows])
+    return {
+        "compound": np.full(len(energy), compound_name, dtype=object),
+        "unround_eV": energy,
+        "eV": np.round(energy, 2),
+        "symmetry_label": np.full(len(energy), r'" "', dtype=object),
+        "orbital_label": np.concatenate([w["label"] for w in windows]),
+        "orbital_num": np.concatenate([w["orbital_num"] for w in windows]),
+        "spin": np.repeat(spins, [len(w["energy"]) for w in windows]),
+    }
+
+
+def orbital_table(fchk_data, compound_name, n_occupied=None, n_virtual=None, spin=None):
+    """
+    Return the columns of orbital_columns as a DataFrame.
+
+    :return: A DataFrame with the columns of CSV_HEADER.
+    """
+    import pandas as pd
+
+    return pd.DataFrame(orbital_columns(fchk_data, compound_name, n_occupied, n_virtual, spin), columns=CSV_HEADER)
+
+
+def write_rows(csvfile, columns):
+    """
+    Write a dict of columns to an open CSV file as rows, in one call.
+
+    :param csvfile: The open file.
+    :param columns: A dict of equally long columns, in the order of the CSV header.
+    :return: None
+    """
+    csv.writer(csvfile).writerows(zip(*(np.asarray(c).tolist() for c in columns.values())))
+
+
+def write_orbitals_to_csv(fchk_data, N_orbitals, compound_name, csv_filename):
+    # Write the window around the gap with a single call
+    with open(csv_filename, "w", newline="") as csvfile:
+        csv.writer(csvfile).writerow(CSV_HEADER)
+        write_rows(csvfile, orbital_columns(fchk_data, compound_name, N_orbitals, N_orbitals))
+
+
+def compound_name_from_path(path):
+    """
+    Return the compound name for a checkpoint, e.g. "NiCis" for NiCis_06-20-23_1.fchk.
+
+    :param path: The path to the .fchk file.
+    :return: The part of the file name before the first underscore.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem.split("_")[0]
+
+
+def find_fchk_files(patterns):
+    """
+    Expand directories and glob patterns into a sorted list of .fchk files.
+
+    :param patterns: Directories, glob patterns or file paths.
+    :return: The list of matching files, without duplicates.
+    """
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*.fchk")
+        files.extend(sorted(glob.glob(pattern)))
+    return list(dict.fromkeys(files))
+
+
+def extract_file(path, N_orbitals, cache_dir=None, composition=False):
+    """
+    Extract the orbital table for one checkpoint, catching any error so one bad file cannot stop a batch.
+    Errors from a cache shared with other workers count as cache misses; only errors reading the checkpoint itself fail the file.
+
+    :param path: The path to the .fchk file.
+    :param N_orbitals: The number of occupied and of virtual orbitals to include, or None for every orbital.
+    :param cache_dir: If given, load the checkpoint through the binary cache in this directory, and reuse the table cached there if the checkpoint is unchanged.
+    :param composition: Whether to add a composition_label column (see orbital_composition.label_table).
+    :return: A tuple (path, columns, error), where columns is a dict as returned by orbital_columns and error is None on success.
+    """
+    try:
+        fchk_data = None
+        if cache_dir is not None:
+            from fchk_cache import load_fchk, read_table, write_table
+
+            key = f"{N_orbitals}:{composition}"
+            try:
+                # An unchanged checkpoint reuses the table extracted last time with the same options
+                columns = read_table(path, key, cache_dir)
+                if columns is not None:
+                    return path, columns, None
+                # The table needs only the orbital energies, unless the composition reads the coefficients
+                fchk_data = load_fchk(path, cache_dir=cache_dir, attributes=None if composition else ENERGY_ATTRIBUTES)
+            except OSError:
+                # Another worker sharing the cache evicted the entry under us; parse without the cache
+                cache_dir = None
+        if fchk_data is None:
+            fchk_data = Fchk(path, lazy=True)
+        columns = orbital_columns(fchk_data, compound_name_from_path(path), N_orbitals, N_orbitals)
+        if composition:
+            from orbital_composition import composition_column
+
+            columns["composition_label"] = composition_column(fchk_data, columns["orbital_num"], columns["spin"])
+        if cache_dir is not None:
+            try:
+                write_table(columns, path, key, cache_dir)
+            except OSError:
+                pass  # the entry was evicted meanwhile; the table is simply not cached
+        return path, columns, None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+
+def available_cpus():
+    """
+    Return the number of cores this process may run on, which is fewer than os.cpu_count() under an affinity mask, a container CPU set or a batch scheduler allocation.
+
+    :return: The number of usable cores, at least 1.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def extract_batch(paths, N_orbitals, csv_filename, jobs=None, cache_dir=None, progress=True, composition=False):
+    """
+    Parse many checkpoints in a process pool and stream their rows into one combined CSV.
+    Rows are written in the order of paths as soon as each file is done.
+
+    :param paths: The .fchk files to extract.
+    :param N_orbitals: The number of occupied and of virtual orbitals to include, or None for every orbital.
+    :param csv_filename: The combined CSV to write.
+    :param jobs: The number of worker processes, defaulting to the number of usable cores.
+    :param cache_dir: If given, load checkpoints through the binary cache in this directory.
+    :param progress: Whether to report progress on stderr.
+    :param composition: Whether to add a composition_label column.
+    :return: A dict mapping each failed path to its error message.
+    """
+    jobs = jobs or available_cpus()
+    failures = {}
+    with open(csv_filename, "w", newline="") as csvfile, ProcessPoolExecutor(max_workers=jobs) as pool:
+        csv.writer(csvfile).writerow(CSV_HEADER + ["composition_label"] if composition else CSV_HEADER)
+        results = pool.map(
+            extract_file,
+            paths,
+            [N_orbitals] * len(paths),
+            [cache_dir] * len(paths),
+            [composition] * len(paths),
+            chunksize=max(1, len(paths) // (jobs * 4)),
+        )
+        for done, (path, columns, error) in enumerate(results, start=1):
+            if error is None:
+                write_rows(csvfile, columns)
+            else:
+                failures[path] = error
+            if progress:
+                status = "ok" if error is None else "FAILED " + error
+                print(f"[{done}/{len(paths)}] {path}: {status}", file=sys.stderr)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Extract the orbitals around the HOMO/LUMO gap from many .fchk files into one CSV. "
+        "Unrestricted calculations give alpha and beta rows, told apart by the spin column."
+    )
+    parser.add_argument("paths", nargs="+", help=".fchk files, directories or glob patterns")
+    parser.add_argument("-o", "--output", default="orbitals.csv", help="combined CSV to write")
+    parser.add_argument("-n", "--n-orbitals", type=int, default=5, help="orbitals to take on each side of the gap")
+    parser.add_argument("--all", action="store_true", help="take every orbital instead of a window around the gap")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: all usable cores)")
+    parser.add_argument(
+        "--composition", action="store_true", help="add a composition_label column, e.g. '62%% Ni d, 21%% N p'"
+    )
+    parser.add_argument("--cache-dir", default=None, help="reuse parsed checkpoints from this cache directory")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not report progress")
+    args = parser.parse_args(argv)
+
+    paths = find_fchk_files(args.paths)
+    if not paths:
+        parser.error("no .fchk files found")
+    failures = extract_batch(
+        paths, None if args.all else args.n_orbitals, args.output, args.jobs, args.cache_dir,
+        progress=not args.quiet, composition=args.composition,
+    )
+    print(f"Wrote {args.output}: {len(paths) - len(failures)} of {len(paths)} files extracted.", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
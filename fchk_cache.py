@@ -0,0 +1,319 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+
+from fchk_class import SECTION_ATTRIBUTES, Fchk
+
+DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "moplot", "fchk")
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+# The layout of cache entries and tables; bump it whenever what they hold changes, so older ones are rebuilt
+CACHE_FORMAT = 2
+
+
+def get_cache_dir(cache_dir=None):
+    """
+    Return the cache directory, falling back to $MOPLOT_CACHE_DIR and then ~/.cache/moplot/fchk.
+
+    :param cache_dir: An explicit cache directory, or None.
+    :return: The absolute path of the cache directory.
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get("MOPLOT_CACHE_DIR", DEFAULT_CACHE_DIR)
+    return os.path.abspath(os.path.expanduser(cache_dir))
+
+
+def file_hash(filename, chunk_size=1 << 20):
+    """
+    Return the SHA-1 hex digest of a file's contents, read in chunks.
+
+    :param filename: The file to hash.
+    :param chunk_size: The number of bytes read at a time.
+    :return: The hex digest.
+    """
+    digest = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_signature(filename, use_hash=False):
+    """
+    Describe the state of a source file so that a stale cache entry can be detected.
+
+    :param filename: The .fchk file.
+    :param use_hash: Whether to include a content hash, not just size and mtime.
+    :return: A dict with the file's size, mtime and optionally its hash.
+    """
+    stat = os.stat(filename)
+    signature = {"size": stat.st_size, "mtime": stat.st_mtime}
+    if use_hash:
+        signature["hash"] = file_hash(filename)
+    return signature
+
+
+def entry_dir(filename, cache_dir):
+    """
+    Return the cache entry directory for a .fchk file, keyed by its absolute path.
+
+    :param filename: The .fchk file.
+    :param cache_dir: The cache directory.
+    :return: The path of the entry directory.
+    """
+    key = hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()
+    return os.path.join(cache_dir, key)
+
+
+def to_json(value):
+    """
+    Convert NumPy scalars and nested sequences into plain JSON types.
+
+    :param value: The value to convert.
+    :return: The converted value.
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    return value
+
+
+def write_entry(fchk, filename, cache_dir, use_hash=False, attributes=None):
+    """
+    Write a parsed Fchk to the cache as one .npy file per array plus a meta.json of scalars.
+    The entry is assembled in a temporary directory and moved into place, so a reader
+    never sees a half-written entry.
+
+    :param fchk: The parsed Fchk.
+    :param filename: The .fchk file it was parsed from.
+    :param cache_dir: The cache directory.
+    :param use_hash: Whether to record a content hash of the source.
+    :param attributes: The section-backed attributes to store (see fchk_class.SECTION_ATTRIBUTES), or None for all of them.
+    :return: The path of the entry directory.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    target = entry_dir(filename, cache_dir)
+    tmp = tempfile.mkdtemp(dir=cache_dir, prefix=".tmp-")
+    scalars, arrays = {}, []
+    for name, value in fchk.to_dict(attributes).items():
+        if isinstance(value, np.ndarray):
+            np.save(os.path.join(tmp, name + ".npy"), value)
+            arrays.append(name)
+        else:
+            scalars[name] = to_json(value)
+    meta = {
+        "format": CACHE_FORMAT,
+        "source": os.path.abspath(filename),
+        "signature": source_signature(filename, use_hash),
+        "arrays": arrays,
+        "scalars": scalars,
+        "attributes": sorted(SECTION_ATTRIBUTES if attributes is None else attributes),
+    }
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    shutil.rmtree(target, ignore_errors=True)
+    try:
+        os.replace(tmp, target)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)  # another process wrote the same entry first
+    return target
+
+
+def valid_entry(filename, cache_dir, use_hash=False):
+    """
+    Return the entry directory and metadata for filename if the entry still matches the source file.
+
+    :param filename: The .fchk file.
+    :param cache_dir: The cache directory.
+    :param use_hash: Whether to validate with a content hash instead of size and mtime.
+    :return: A tuple (entry directory, meta), or None if there is no valid entry.
+    """
+    target = entry_dir(filename, cache_dir)
+    meta_path = os.path.join(target, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    if meta.get("format") != CACHE_FORMAT:
+        return None
+    stored = meta["signature"]
+    current = source_signature(filename, use_hash=False)
+    if current["size"] != stored["size"]:
+        return None
+    if use_hash:
+        if stored.get("hash") != file_hash(filename):
+            return None
+    elif current["mtime"] != stored["mtime"]:
+        return None
+    return target, meta
+
+
+def read_entry(filename, cache_dir, use_hash=False, coeff_dtype=np.float64, attributes=None):
+    """
+    Load a cached Fchk if its entry still matches the source file, memory-mapping the arrays.
+    The MO coefficient matrices stay on disk until rows of them are read.
+
+    :param filename: The .fchk file.
+    :param cache_dir: The cache directory.
+    :param use_hash: Whether to validate with a content hash instead of size and mtime.
+    :param coeff_dtype: The dtype the MO coefficients must be stored in for the entry to be used.
+    :param attributes: The section-backed attributes the caller needs, or None for all of them; an entry holding fewer is not used.
+    :return: The cached Fchk, or None if there is no valid entry.
+    """
+    entry = valid_entry(filename, cache_dir, use_hash)
+    if entry is None:
+        return None
+    target, meta = entry
+    stored = set(meta.get("attributes", SECTION_ATTRIBUTES))
+    if not stored.issuperset(SECTION_ATTRIBUTES if attributes is None else attributes):
+        return None  # a partial entry, written for a caller that needed fewer sections
+
+    values = dict(meta["scalars"])
+    if values.get("formula") is not None:
+        values["formula"] = [tuple(f) for f in values["formula"]]
+    for name in meta["arrays"]:
+        values[name] = np.load(os.path.join(target, name + ".npy"), mmap_mode="r")
+    coeffs = values.get("alpha_coeffs")
+    if coeffs is not None and (coeffs.ndim != 2 or coeffs.dtype != np.dtype(coeff_dtype)):
+        return None  # written with another dtype, or as a flat vector by an older version
+    os.utime(target)  # mark the entry as recently used for eviction
+    return Fchk.from_dict(values, coeff_dtype)
+
+
+def table_file(target, key):
+    """
+    Return the path of a cached orbital table inside an entry directory. The key is combined with CACHE_FORMAT, so tables of another format are never found.
+
+    :param target: The entry directory.
+    :param key: A string naming the options the table was extracted with.
+    :return: The path of the table file.
+    """
+    key = f"{CACHE_FORMAT}:{key}"
+    return os.path.join(target, "table-" + hashlib.sha1(key.encode()).hexdigest()[:16] + ".pkl")
+
+
+def read_table(filename, key, cache_dir, use_hash=False):
+    """
+    Return an orbital table cached for an unchanged checkpoint, without parsing or loading the checkpoint.
+
+    :param filename: The .fchk file.
+    :param key: A string naming the options the table was extracted with, e.g. the window size.
+    :param cache_dir: The cache directory.
+    :param use_hash: Whether to validate with a content hash instead of size and mtime.
+    :return: The table as a dict of columns (see extract_orbitals.orbital_columns), or None if there is no valid cached table.
+    """
+    entry = valid_entry(filename, get_cache_dir(cache_dir), use_hash)
+    if entry is None or not os.path.exists(table_file(entry[0], key)):
+        return None
+    try:
+        with open(table_file(entry[0], key), "rb") as f:
+            columns = pickle.load(f)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None  # written by an incompatible version of a library
+    return columns if isinstance(columns, dict) else None
+
+
+def write_table(columns, filename, key, cache_dir):
+    """
+    Store an orbital table next to the checkpoint's cache entry, which must already exist. The table is dropped with the entry when the checkpoint changes.
+
+    :param columns: The table as a dict of columns.
+    :param filename: The .fchk file it was extracted from.
+    :param key: A string naming the options the table was extracted with.
+    :param cache_dir: The cache directory.
+    :return: The path of the table file.
+    """
+    path = table_file(entry_dir(filename, get_cache_dir(cache_dir)), key)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(columns, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return path
+
+
+def entry_size(path):
+    """
+    Return the total size in bytes of the files in a cache entry. Files removed while they are counted, e.g. by another process evicting the entry, are skipped.
+
+    :param path: The entry directory.
+    :return: The size in bytes.
+    """
+    total = 0
+    for name in os.listdir(path):
+        try:
+            total += os.path.getsize(os.path.join(path, name))
+        except OSError:
+            continue
+    return total
+
+
+def evict(cache_dir, max_bytes, keep=None):
+    """
+    Remove the least recently used entries until the cache fits in max_bytes.
+    Several processes may share one cache directory, so entries that vanish while they are measured are skipped.
+
+    :param cache_dir: The cache directory.
+    :param max_bytes: The size limit in bytes.
+    :param keep: An entry directory that must not be removed.
+    :return: The list of removed entry directories.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if os.path.isdir(path) and not name.startswith("."):
+            try:
+                entries.append((os.path.getmtime(path), entry_size(path), path))
+            except OSError:
+                continue  # evicted by another process
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    removed = []
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed.append(path)
+    return removed
+
+
+def load_fchk(
+    filename,
+    tag="",
+    cache_dir=None,
+    max_bytes=DEFAULT_MAX_BYTES,
+    use_hash=False,
+    coeff_dtype=np.float64,
+    attributes=None,
+):
+    """
+    Return a Fchk for filename, reusing a binary sidecar from the cache when the source is unchanged.
+    On a miss the checkpoint is parsed, written to the cache, and the cache is trimmed to max_bytes.
+    With attributes given, a miss opens the checkpoint lazily and decodes and caches only those sections,
+    so a caller that needs the orbital energies never parses the MO coefficient matrices.
+
+    :param filename: The .fchk file.
+    :param tag: The tag to attach to the Fchk.
+    :param cache_dir: The cache directory, see get_cache_dir().
+    :param max_bytes: The maximum total size of the cache in bytes.
+    :param use_hash: Whether to validate entries with a content hash instead of size and mtime.
+    :param coeff_dtype: The dtype of the MO coefficient matrices, e.g. np.float32 to halve the cache.
+    :param attributes: The section-backed attributes the caller needs, e.g. ["alpha_energies", "beta_energies"], or None for all of them.
+    :return: The Fchk.
+    """
+    cache_dir = get_cache_dir(cache_dir)
+    fchk = read_entry(filename, cache_dir, use_hash, coeff_dtype, attributes)
+    if fchk is None:
+        fchk = Fchk(filename, lazy=attributes is not None, coeff_dtype=coeff_dtype)
+        target = write_entry(fchk, filename, cache_dir, use_hash, attributes)
+        evict(cache_dir, max_bytes, keep=target)
+    fchk.tag = tag
+    return fchk
@@ -1,32 +1,312 @@
 import numpy as np
+import json
+import mmap
+import os
+from collections import deque
+from itertools import islice
+
+from stage_profile import stage
+
+#species should be extended to contain all elements
+species = {
+	1: 'H', 2: 'He', 3: 'Li', 4: 'Be', 5: 'B', 6: 'C', 7: 'N', 8: 'O',
+	9: 'F', 10: 'Ne', 11: 'Na', 12: 'Mg', 13: 'Al', 14: 'Si', 15: 'P',
+	16: 'S', 17: 'Cl', 18: 'Ar', 19: 'K', 20: 'Ca', 21: 'Sc', 22: 'Ti',
+	23: 'V', 24: 'Cr', 25: 'Mn', 26: 'Fe', 27: 'Co', 28: 'Ni', 29: 'Cu',
+	30: 'Zn', 31: 'Ga', 32: 'Ge', 33: 'As', 34: 'Se', 35: 'Br', 36: 'Kr',
+	37: 'Rb', 38: 'Sr', 39: 'Y', 40: 'Zr', 41: 'Nb', 42: 'Mo', 43: 'Tc',
+	44: 'Ru', 45: 'Rh', 46: 'Pd', 47: 'Ag', 48: 'Cd', 49: 'In', 50: 'Sn',
+	51: 'Sb', 52: 'Te', 53: 'I', 54: 'Xe', 55: 'Cs', 56: 'Ba', 57: 'La',
+	58: 'Ce', 59: 'Pr', 60: 'Nd', 61: 'Pm', 62: 'Sm', 63: 'Eu', 64: 'Gd',
+	65: 'Tb', 66: 'Dy', 67: 'Ho', 68: 'Er', 69: 'Tm', 70: 'Yb', 71: 'Lu',
+	72: 'Hf', 73: 'Ta', 74: 'W', 75: 'Re', 76: 'Os', 77: 'Ir', 78: 'Pt',
+	79: 'Au', 80: 'Hg', 81: 'Tl', 82: 'Pb', 83: 'Bi', 84: 'Po', 85: 'At',
+	86: 'Rn', 87: 'Fr', 88: 'Ra', 89: 'Ac', 90: 'Th', 91: 'Pa', 92: 'U',
+	93: 'Np', 94: 'Pu', 95: 'Am', 96: 'Cm', 97: 'Bk', 98: 'Cf', 99: 'Es',
+	100: 'Fm', 101: 'Md', 102: 'No', 103: 'Lr', 104: 'Rf', 105: 'Db',
+	106: 'Sg', 107: 'Bh', 108: 'Hs', 109: 'Mt', 110: 'Ds', 111: 'Rg',
+	112: 'Cn', 113: 'Nh', 114: 'Fl', 115: 'Mc', 116: 'Lv', 117: 'Ts',
+	118: 'Og'
+}
+
+HARTREE_TO_EV = 27.2114
+BOHR_TO_ANGSTROM = 0.529177
+AU_TO_DEBYE = 2.541746473 # dip in fchk is in C*m units, 1 C*m = 2.541746473 D
+
+# number of values Gaussian writes on each line of an array block, and the width of each value
+PER_LINE = {'I': 6, 'R': 5, 'C': 5, 'L': 72}
+WIDTH = {'I': 12, 'R': 16, 'C': 12, 'L': 1}
+
+
+def parse_header(line):
+	'''
+	Split a section header line into (name, type, count, value).
+	Arrays have count set and value None, scalars have count None.
+	Returns None for lines that are not section headers.
+	'''
+	tokens = line.split()
+	if len(tokens) < 3:
+		return None
+	if tokens[-2] == 'N=':
+		return ' '.join(tokens[:-3]), tokens[-3], int(tokens[-1]), None
+	name, kind, value = ' '.join(tokens[:-2]), tokens[-2], tokens[-1]
+	if kind == 'I':
+		value = int(value)
+	elif kind == 'R':
+		value = float(value)
+	return name, kind, None, value
+
+
+def block_lines(kind, n):
+	'''
+	Return the number of text lines holding an array of n values of the given type.
+	'''
+	per_line = PER_LINE.get(kind, 5)
+	return -(-n // per_line)
+
+
+def decode_block(kind, text, n):
+	'''
+	Bulk-convert the text of an array block into a NumPy array.
+	Raises ValueError if a numeric block is malformed or holds fewer than n values, e.g. in a truncated file.
+	'''
+	if kind in ('I', 'R'):
+		try:
+			values = np.fromstring(text, dtype=np.int64 if kind == 'I' else np.float64, sep=' ')
+		except ValueError as e:
+			raise ValueError(f"array block of {n} values is malformed or truncated: {e}") from e
+		if len(values) < n:
+			raise ValueError(f"array block holds {len(values)} of {n} values; the file is truncated")
+		return values[:n]
+	if kind == 'L':
+		return np.frombuffer(b''.join(text.split()), dtype='S1')[:n] == b'T'
+	return ''.join(text.decode().splitlines()).rstrip()
+
+
+def iter_sections(inputfile, wanted=None):
+	'''
+	Stream the sections of an open .fchk file, reading it exactly once.
+	Yields (name, type, count, value) where array values are decoded in bulk.
+	Arrays whose name is not in wanted are skipped without being decoded.
+	'''
+	for line in inputfile:
+		header = parse_header(line.decode())
+		if header is None:
+			continue
+		name, kind, n, value = header
+		if n is not None:
+			lines = islice(inputfile, block_lines(kind, n))
+			if wanted is not None and name not in wanted:
+				deque(lines, maxlen=0)
+				continue
+			with stage('fchk decode ' + name):
+				value = decode_block(kind, b''.join(lines), n)
+		yield name, kind, n, value
+
+
+class FchkIndex:
+	'''
+	Byte-offset index of every section in a .fchk file, built over an mmap of the file.
+	sections maps array names to (type, count, offset, length) and scalars maps
+	scalar names to (type, value). The index can be saved as JSON next to the
+	checkpoint so that a later open skips the scan.
+	'''
+	def __init__(self, sections, scalars, size=None, mtime=None):
+		self.sections = sections
+		self.scalars = scalars
+		self.size = size
+		self.mtime = mtime
+
+	@classmethod
+	def build(cls, filename):
+		'''
+		Scan a .fchk file once, jumping over array blocks without decoding them.
+		'''
+		stat = os.stat(filename)
+		sections, scalars = {}, {}
+		with open(filename,'rb') as inputfile, \
+				mmap.mmap(inputfile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+			end = mm.find(b'\n')
+			newline = 2 if mm[end-1:end] == b'\r' else 1
+			pos = mm.find(b'\n', end + 1) + 1 # skip the title and calculation lines
+			while 0 < pos < len(mm):
+				end = mm.find(b'\n', pos)
+				if end == -1:
+					end = len(mm)
+				header = parse_header(mm[pos:end].decode())
+				pos = end + 1
+				if header is None:
+					continue
+				name, kind, n, value = header
+				if n is None:
+					scalars[name] = (kind, value)
+					continue
+				length = block_length(mm, pos, kind, n, newline)
+				sections[name] = (kind, n, pos, length)
+				pos += length
+		return cls(sections, scalars, stat.st_size, stat.st_mtime)
+
+	@classmethod
+	def load(cls, index_file):
+		'''
+		Read an index written by save().
+		'''
+		with open(index_file, 'r') as f:
+			data = json.load(f)
+		sections = {name: tuple(entry) for name, entry in data['sections'].items()}
+		scalars = {name: tuple(entry) for name, entry in data['scalars'].items()}
+		return cls(sections, scalars, data['size'], data['mtime'])
+
+	@classmethod
+	def open(cls, filename, index_file=None):
+		'''
+		Return the index for filename, reusing index_file when it still matches the
+		file's size and modification time, and (re)writing it otherwise.
+		'''
+		if index_file and os.path.exists(index_file):
+			index = cls.load(index_file)
+			if index.matches(filename):
+				return index
+		index = cls.build(filename)
+		if index_file:
+			index.save(index_file)
+		return index
+
+	def save(self, index_file):
+		'''
+		Write the index as JSON.
+		'''
+		data = {'size': self.size, 'mtime': self.mtime,
+				'sections': self.sections, 'scalars': self.scalars}
+		with open(index_file, 'w') as f:
+			json.dump(data, f)
+
+	def matches(self, filename):
+		'''
+		Return True if filename still has the size and modification time the index was built from.
+		'''
+		stat = os.stat(filename)
+		return stat.st_size == self.size and stat.st_mtime == self.mtime
+
+	def read(self, filename, name):
+		'''
+		Decode one named section of filename straight from its byte range.
+		'''
+		if name in self.scalars:
+			return self.scalars[name][1]
+		kind, n, offset, length = self.sections[name]
+		if length == 0:
+			return decode_block(kind, b'', n)
+		with open(filename,'rb') as inputfile, \
+				mmap.mmap(inputfile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+			return decode_block(kind, mm[offset:offset+length], n)
+
+	def read_values(self, filename, name, start, stop):
+		'''
+		Decode only values start..stop-1 of a numeric array section. For fixed-width blocks just
+		the lines holding those values are read; other blocks are decoded whole and sliced.
+		'''
+		kind, n, offset, length = self.sections[name]
+		start, stop = max(start, 0), min(stop, n)
+		if stop <= start:
+			return decode_block(kind, b'', 0)
+		per_line, width = PER_LINE[kind], WIDTH[kind]
+		nlines = block_lines(kind, n)
+		last = n - (nlines-1)*per_line
+		line_bytes = None
+		for newline in (1, 2):
+			if length == (nlines-1)*(per_line*width + newline) + last*width + newline:
+				line_bytes = per_line*width + newline
+		if line_bytes is None:
+			return self.read(filename, name)[start:stop]
+		first, end = start // per_line, (stop - 1) // per_line + 1
+		with open(filename,'rb') as inputfile, \
+				mmap.mmap(inputfile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+			text = mm[offset + first*line_bytes:min(offset + end*line_bytes, offset + length)]
+		skip = start - first*per_line
+		return decode_block(kind, text, skip + stop - start)[skip:]
+
+
+def block_length(mm, offset, kind, n, newline=1):
+	'''
+	Return the number of bytes taken by an array block starting at offset.
+	Gaussian writes fixed-width lines, so only the position of the last line has to be
+	checked; blocks that are not fixed width are walked line by line.
+	'''
+	nlines = block_lines(kind, n)
+	if nlines == 0:
+		return 0
+	last = offset
+	if kind in WIDTH:
+		last = offset + (nlines-1)*(PER_LINE[kind]*WIDTH[kind] + newline)
+	if last < len(mm) and (nlines == 1 or mm[last-1:last] == b'\n'):
+		end = mm.find(b'\n', last)
+	else:
+		end = offset - 1
+		for _ in range(nlines):
+			end = mm.find(b'\n', end + 1)
+			if end == -1:
+				break
+	return (len(mm) if end == -1 else end + 1) - offset
+
+
+# attributes backed by an array section, and the section each one is built from
+SECTION_ATTRIBUTES = {
+	'atomic_numbers': 'Atomic numbers',
+	'formula': 'Atomic numbers',
+	'nuclear_charges': 'Nuclear charges',
+	'positions': 'Current cartesian coordinates',
+	'coordinates': 'Current cartesian coordinates',
+	'alpha_energies': 'Alpha Orbital Energies',
+	'beta_energies': 'Beta Orbital Energies',
+	'alpha_coeffs': 'Alpha MO coefficients',
+	'beta_coeffs': 'Beta MO coefficients',
+	'nsteps': 'Optimization Number of geometries',
+	'ngeometry': 'Optimization Number of geometries',
+	'dipole': 'Dipole Moment',
+}
+
+
+def section_property(attr):
+	'''
+	Make an attribute that is decoded from its section the first time it is read.
+	'''
+	def getter(self):
+		if attr not in self._arrays:
+			self._load(SECTION_ATTRIBUTES[attr])
+		return self._arrays[attr]
+	def setter(self, value):
+		self._arrays[attr] = value
+	return property(getter, setter)
+
+
 class Fchk:
-	''' 
+	'''
 	A class to store the the variables found in a Gaussian .fhck file.
 	'''
-	def __init__(self,filename,tag=''):
-		#species should be extended to contain all elements
-		species = {
-            1: 'H', 2: 'He', 3: 'Li', 4: 'Be', 5: 'B', 6: 'C', 7: 'N', 8: 'O',
-            9: 'F', 10: 'Ne', 11: 'Na', 12: 'Mg', 13: 'Al', 14: 'Si', 15: 'P',
-            16: 'S', 17: 'Cl', 18: 'Ar', 19: 'K', 20: 'Ca', 21: 'Sc', 22: 'Ti',
-            23: 'V', 24: 'Cr', 25: 'Mn', 26: 'Fe', 27: 'Co', 28: 'Ni', 29: 'Cu',
-            30: 'Zn', 31: 'Ga', 32: 'Ge', 33: 'As', 34: 'Se', 35: 'Br', 36: 'Kr',
-            37: 'Rb', 38: 'Sr', 39: 'Y', 40: 'Zr', 41: 'Nb', 42: 'Mo', 43: 'Tc',
-            44: 'Ru', 45: 'Rh', 46: 'Pd', 47: 'Ag', 48: 'Cd', 49: 'In', 50: 'Sn',
-            51: 'Sb', 52: 'Te', 53: 'I', 54: 'Xe', 55: 'Cs', 56: 'Ba', 57: 'La',
-            58: 'Ce', 59: 'Pr', 60: 'Nd', 61: 'Pm', 62: 'Sm', 63: 'Eu', 64: 'Gd',
-            65: 'Tb', 66: 'Dy', 67: 'Ho', 68: 'Er', 69: 'Tm', 70: 'Yb', 71: 'Lu',
-            72: 'Hf', 73: 'Ta', 74: 'W', 75: 'Re', 76: 'Os', 77: 'Ir', 78: 'Pt',
-            79: 'Au', 80: 'Hg', 81: 'Tl', 82: 'Pb', 83: 'Bi', 84: 'Po', 85: 'At',
-            86: 'Rn', 87: 'Fr', 88: 'Ra', 89: 'Ac', 90: 'Th', 91: 'Pa', 92: 'U',
-            93: 'Np', 94: 'Pu', 95: 'Am', 96: 'Cm', 97: 'Bk', 98: 'Cf', 99: 'Es',
-            100: 'Fm', 101: 'Md', 102: 'No', 103: 'Lr', 104: 'Rf', 105: 'Db',
-            106: 'Sg', 107: 'Bh', 108: 'Hs', 109: 'Mt', 110: 'Ds', 111: 'Rg',
-            112: 'Cn', 113: 'Nh', 114: 'Fl', 115: 'Mc', 116: 'Lv', 117: 'Ts',
-            118: 'Og'
-        }
-
-		inputfile = open(filename,'r').readlines()
+	atomic_numbers = section_property('atomic_numbers')
+	formula = section_property('formula')
+	nuclear_charges = section_property('nuclear_charges')
+	positions = section_property('positions')
+	coordinates = section_property('coordinates')
+	alpha_energies = section_property('alpha_energies')
+	beta_energies = section_property('beta_energies')
+	alpha_coeffs = section_property('alpha_coeffs')
+	beta_coeffs = section_property('beta_coeffs')
+	nsteps = section_property('nsteps')
+	ngeometry = section_property('ngeometry')
+	dipole = section_property('dipole')
+
+	def __init__(self,filename,tag='',lazy=False,index=None,coeff_dtype=np.float64):
+		'''
+		With lazy=True only the section index and scalar values are read up front,
+		and array attributes such as alpha_coeffs are decoded on first access.
+		index may be a FchkIndex or the path of a saved index to reuse or create.
+		coeff_dtype is the dtype of the MO coefficient matrices, e.g. np.float32 to halve their size.
+		'''
+		self._arrays = {}
+		self._index = None
+		self._coeff_dtype = np.dtype(coeff_dtype)
 		( self.calc,
 		self.method,
 		self.basis,
@@ -38,191 +318,238 @@ class Fchk:
 		self.belec,
 		self.numbasis,
 		self.numindbasis,
-		self.atomic_numbers,
-		self.nuclear_charges,
-		self.positions,
-		self.coordinates,
-		self.alpha_energies,
-		self.beta_energies,
 		self.scf_energy,
 		self.alumo,
 		self.blumo,
 		self.gap,
-		self.nsteps,
-		self.ngeometry,
-		self.formula,
 		self.ahomo,
 		self.bhomo,
 		self.agap,
-		self.bgap,
-		self.alpha_coeffs,
-		self.beta_coeffs,
-		self.dipole ) = [None]*31
+		self.bgap ) = [None]*19
+		self.filename=filename
 		self.tag=tag
-		for i,line in enumerate(inputfile):
-			if i == 0:
-				self.title = line
-				continue
-			#
-			if i == 1:
-				self.line = line.split()
-				self.calc = line[0]
-				self.method = line[1]
-				self.basis = line[3]
-				continue
-			#
-			if line.startswith('Number of atoms'):
-				self.nat = int(line.split()[-1])
-				continue
-			#
-			if line.startswith('Charge'):
-				self.charge=int(line.split()[-1])
-				continue
-			#
-			if line.startswith('Multiplicity'):
-				self.multi=int(line.split()[-1])
-				continue
-			#
-			if line.startswith('Number of electrons'):
-				self.nelec=int(line.split()[-1])
-				continue
-			#
-			if line.startswith('Number of alpha electrons'):
-				self.aelec=int(line.split()[-1])
-				continue
-			#
-			if line.startswith('Number of beta electrons'):
-				self.belec=int(line.split()[-1])
-				continue
-			#
-			if line.startswith('Number of basis functions'):
-				self.numbasis=int(line.split()[-1])
-				continue
-			#
-			if line.startswith('Number of independent functions'):
-				self.numindbasis=int(line.split()[-1])
-				continue
-			#
-			if line.startswith('Atomic numbers'):
-				n = int(line.split()[-1])
-				self.atomic_numbers = np.zeros(n)
-				j = i+1
-				h = 0
-				while h < n:
-					for m in inputfile[j].split():
-						self.atomic_numbers[h]=(int(m))
-						h = h + 1
-					j = j + 1
-				numbers,counts = np.unique(self.atomic_numbers,
-												return_counts=True)
-				types=[]
-				for n in numbers:
-					types.append(species[n])
-				self.formula=list(zip(types,list(counts)))
-				continue
-			#
-			if line.startswith('Nuclear charges'):
-				n = int(line.split()[-1])
-				self.nuclear_charges = np.zeros(n)
-				j = i+1
-				h = 0
-				while h < n:
-					for m in inputfile[j].split():
-						self.nuclear_charges[h]=(float(m))
-						h = h + 1
-					j = j + 1
-				continue			
-			#
-			if line.startswith('Current cartesian coordinates'):
-				coords=[]
-				n = int(line.split()[-1])
-				nat = int(n/3)	
-				h,j=0,0,
-				coords=[]
-				xyz = []
-				while h < n:
-					for m in inputfile[j+i+1].split():
-						if h % 3 == 0 and h != 0:
-							coords.append(np.asarray(xyz,dtype=np.float32))
-							xyz=[]
-						xyz.append(float(m)*0.529177)
-						h = h + 1
-					j = j + 1	
-				coords.append(np.asarray(xyz,dtype=np.float32))
-				coords=np.asarray(coords,dtype=np.float32)
-				self.positions=(coords)
-				j = 0
-				if len(self.atomic_numbers) == len(self.positions):
-					self.coordinates,self.named_coordinates=[],[]
-					for j,num in enumerate(self.atomic_numbers):
-						temp = np.zeros(4)
-						temp[0]=num
-						temp[1]=self.positions[j][0]
-						temp[2]=self.positions[j][1]
-						temp[3]=self.positions[j][2]
-						self.coordinates.append(temp)
-					self.coordinates=np.asarray(self.coordinates)
-				continue
-				#	
-			if line.startswith('Alpha Orbital Energies'):
-				n = int(line.split()[-1])
-				self.alpha_energies = np.zeros(n)
-				j = i+1
-				h = 0
-				while h < n:
-					for m in inputfile[j].split():
-						self.alpha_energies[h]=(float(m)*27.2114) # convert to eV
-						self.alpha_energies[h]=round(self.alpha_energies[h],4)
-						h = h + 1
-					j = j + 1
-				if self.aelec:
-					self.ahomo=int(self.aelec)-1
-					self.alumo=int((self.aelec))
-				continue
-			#
-			if line.startswith('Beta Orbital Energies'):
-				n = int(line.split()[-1])
-				self.beta_energies = np.zeros(n)
-				j = i+1
-				h = 0
-				while h < n:
-					for m in inputfile[j].split():
-						self.beta_energies[h]=(float(m)*27.2114)
-						h = h + 1
-					j = j + 1
-				if self.belec:
-					self.bhomo=int(self.belec)-1
-					self.blumo=int((self.belec))
-				continue			
-			
-			if line.startswith('Total Energy'):
-				self.total_energy=float(line.split()[-1])
-				self.total_energy=self.total_energy*27.2114
-				continue
-			if line.startswith('SCF Energy'):
-				self.scf_energy=float(line.split()[-1])
-				#self.scf_energy=self.scf_energy*27.2114
-				continue
-			if line.startswith('Optimization Number of geometries'):
-				self.nsteps = int(inputfile[i+1].split()[0])
-				self.ngeometry = int(line.split()[-1])
-				continue
-	
-			if line.startswith('Alpha MO coefficients'):
-				n = int(line.split()[-1])
-				self.alpha_coeffs = np.zeros(n)
-				j = i+1
-				h = 0
-				while h < n:
-					for m in inputfile[j].split():
-						self.alpha_coeffs[h]=(m)
-						h = h + 1
-					j = j + 1
-				continue
-			
-			if line.startswith('Dipole Moment'):
-				dip=inputfile[i+1]
-				dip=[float(f)*2.541746473 for f in dip.split()]
-				self.dipole=dip
-				# dip in fchk is in C*m units
-				# 1 C*m = 2.541746473 D
\ No newline at end of file
+		with open(filename,'rb') as inputfile:
+			self.title = inputfile.readline().decode(errors='replace')
+			self.line = inputfile.readline().decode(errors='replace').split()
+			if len(self.line) < 2:
+				raise ValueError(f"{filename} is not a formatted checkpoint: it has no calculation line")
+			self.calc = self.line[0]
+			self.method = self.line[1]
+			self.basis = self.line[2] if len(self.line) > 2 else None
+			if not lazy:
+				wanted = set(SECTION_ATTRIBUTES.values())
+				with stage('fchk parse'):
+					for name, kind, n, value in iter_sections(inputfile, wanted):
+						self._set_section(name, n, value)
+					for name in wanted:
+						self._load(name)
+		if lazy or index is not None:
+			with stage('fchk index'):
+				self._index = index if isinstance(index, FchkIndex) else FchkIndex.open(filename, index)
+		if lazy:
+			for name, (kind, value) in self._index.scalars.items():
+				self._set_section(name, None, value)
+		if self.nat is None:
+			raise ValueError(f"{filename} is not a formatted checkpoint: it has no 'Number of atoms' section")
+		# an empty manifold (e.g. no beta electrons) gets a HOMO of -1, below its first orbital
+		if self.aelec is not None and self._has_section('Alpha Orbital Energies'):
+			self.ahomo=int(self.aelec)-1
+			self.alumo=int((self.aelec))
+		if self.belec is not None and self._has_section('Beta Orbital Energies'):
+			self.bhomo=int(self.belec)-1
+			self.blumo=int((self.belec))
+
+	def to_dict(self, attributes=None):
+		'''
+		Return every attribute as a dict, decoding any sections that have not been read yet.
+		attributes limits the section-backed attributes to the named ones, e.g. ['alpha_energies'],
+		so that a lazy Fchk does not decode sections nobody needs.
+		'''
+		values = {name: value for name, value in vars(self).items() if not name.startswith('_')}
+		for attr in SECTION_ATTRIBUTES if attributes is None else attributes:
+			values[attr] = getattr(self, attr)
+		return values
+
+	@classmethod
+	def from_dict(cls, values, coeff_dtype=None):
+		'''
+		Rebuild a Fchk from the output of to_dict without reading the .fchk file.
+		coeff_dtype is the dtype of coefficient rows decoded later from the file; if None it is
+		taken from the stored alpha_coeffs, falling back to float64.
+		'''
+		self = cls.__new__(cls)
+		self._arrays = {}
+		self._index = None
+		if coeff_dtype is None:
+			coeffs = values.get('alpha_coeffs')
+			coeff_dtype = coeffs.dtype if isinstance(coeffs, np.ndarray) else np.float64
+		self._coeff_dtype = np.dtype(coeff_dtype)
+		for name, value in values.items():
+			setattr(self, name, value)
+		return self
+
+	def _has_section(self, name):
+		'''
+		Return True if the file contains the named section, whether or not it is decoded yet.
+		'''
+		if self._index is not None and name in self._index.sections:
+			return True
+		attrs = [attr for attr, section in SECTION_ATTRIBUTES.items() if section == name]
+		return any(self._arrays.get(attr) is not None for attr in attrs)
+
+	def _load(self, name):
+		'''
+		Decode the named section from its recorded offset and store the attributes built from it.
+		Attributes whose section is missing from the file are set to None.
+		'''
+		for attr, section in SECTION_ATTRIBUTES.items():
+			if section == name and attr not in self._arrays:
+				self._arrays[attr] = None
+		if self._index is not None and name in self._index.sections:
+			kind, n, offset, length = self._index.sections[name]
+			with stage('fchk decode ' + name):
+				value = self._index.read(self.filename, name)
+			self._set_section(name, n, value)
+
+	def get(self, name):
+		'''
+		Return any named section of the file, e.g. 'Mulliken Charges' or 'Shell types',
+		decoded from its byte range. Arrays come back in the file's own units as NumPy arrays.
+		'''
+		if self._index is None:
+			self._index = FchkIndex.open(self.filename)
+		if name not in self._index.sections and name not in self._index.scalars:
+			raise KeyError(f"{name!r} is not a section of {self.filename}")
+		return self._index.read(self.filename, name)
+
+	def orbital_window(self, n_occupied=None, n_virtual=None, spin='alpha'):
+		'''
+		Return the orbitals from HOMO-(n_occupied-1) to LUMO+(n_virtual-1) as a dict of arrays:
+		orbital_num, energy (eV), occupied, offset from the HOMO or LUMO, and label ('HOMO-1', 'LUMO+2', ...).
+		Leaving n_occupied or n_virtual as None takes every orbital on that side of the gap.
+		spin selects the alpha or beta orbitals.
+		'''
+		if spin == 'alpha':
+			energies, homo = self.alpha_energies, self.ahomo
+		elif spin == 'beta':
+			energies, homo = self.beta_energies, self.bhomo
+		else:
+			raise ValueError(f"spin must be 'alpha' or 'beta', not {spin!r}")
+		n = len(energies)
+		start = 0 if n_occupied is None else max(homo - n_occupied + 1, 0)
+		stop = n if n_virtual is None else min(homo + 1 + n_virtual, n)
+
+		orbital_num = np.arange(start, stop)
+		occupied = orbital_num <= homo
+		offset = np.where(occupied, homo - orbital_num, orbital_num - homo - 1)
+		base = np.where(occupied, 'HOMO', 'LUMO')
+		signed = np.char.add(np.char.add(base, np.where(occupied, '-', '+')), offset.astype(str))
+		label = np.where(offset == 0, base, signed)
+		return {'orbital_num': orbital_num, 'energy': energies[start:stop],
+				'occupied': occupied, 'offset': offset, 'label': label}
+
+	def coefficient_matrix(self, value):
+		'''
+		Reshape a flat block of MO coefficients into an (n_mo, n_basis) matrix of coeff_dtype.
+		'''
+		value = value.astype(self._coeff_dtype, copy=False)
+		if self.numbasis and len(value) % self.numbasis == 0:
+			return value.reshape(-1, self.numbasis)
+		return value
+
+	def mo_coefficients(self, rows=None, spin='alpha'):
+		'''
+		Return MO coefficients as an (n_mo, n_basis) matrix, one row per orbital.
+		rows may be a slice or an array of orbital numbers, e.g. orbital_window(6, 6)['orbital_num']
+		for HOMO-5..LUMO+5. Unless the full matrix is already in memory, only the text lines holding
+		those rows are decoded.
+		'''
+		if spin not in ('alpha', 'beta'):
+			raise ValueError(f"spin must be 'alpha' or 'beta', not {spin!r}")
+		attr = spin + '_coeffs'
+		if rows is None or attr in self._arrays:
+			matrix = getattr(self, attr)
+			return matrix if rows is None or matrix is None else matrix[rows]
+		if self._index is None:
+			self._index = FchkIndex.open(self.filename)
+		name = SECTION_ATTRIBUTES[attr]
+		if name not in self._index.sections:
+			return None
+		if isinstance(rows, slice):
+			start, stop, step = rows.indices(self._index.sections[name][1] // self.numbasis)
+			rows = np.arange(start, stop, step)
+		rows = np.asarray(rows, dtype=np.int64)
+		if len(rows) == 0:
+			return np.empty((0, self.numbasis), dtype=self._coeff_dtype)
+		first, last = rows.min(), rows.max() + 1
+		values = self._index.read_values(self.filename, name, first*self.numbasis, last*self.numbasis)
+		return self.coefficient_matrix(values)[rows - first]
+
+	def trajectory(self, point=1):
+		'''
+		Return every geometry of an optimization as one (nsteps, nat, 3) array in Angstrom,
+		decoded in bulk from the 'Opt point N Geometries' section without reading the rest of the file.
+		point selects the optimization when the file holds several, e.g. the points of a relaxed scan.
+		'''
+		geometries = self.get(f'Opt point {point} Geometries')
+		geometries *= BOHR_TO_ANGSTROM
+		return geometries.astype(np.float32).reshape(-1, self.nat, 3)
+
+	def trajectory_results(self, point=1):
+		'''
+		Return the energy (eV) and RMS gradient of every step of an optimization as an (nsteps, 2) array.
+		'''
+		results = self.get(f'Opt point {point} Results for each geome').reshape(-1, 2)
+		return results*np.array([HARTREE_TO_EV, 1.0])
+
+	def _set_section(self, name, n, value):
+		'''
+		Store one decoded section under the attribute names used by this class.
+		'''
+		if name == 'Number of atoms':
+			self.nat = value
+		elif name == 'Charge':
+			self.charge = value
+		elif name == 'Multiplicity':
+			self.multi = value
+		elif name == 'Number of electrons':
+			self.nelec = value
+		elif name == 'Number of alpha electrons':
+			self.aelec = value
+		elif name == 'Number of beta electrons':
+			self.belec = value
+		elif name == 'Number of basis functions':
+			self.numbasis = value
+		elif name == 'Number of independent functions':
+			self.numindbasis = value
+		elif name == 'Atomic numbers':
+			self.atomic_numbers = value.astype(np.float64)
+			numbers,counts = np.unique(self.atomic_numbers,
+											return_counts=True)
+			self.formula=[(species[num],count) for num,count in zip(numbers,counts)]
+		elif name == 'Nuclear charges':
+			self.nuclear_charges = value
+		elif name == 'Current cartesian coordinates':
+			self.positions = (value*BOHR_TO_ANGSTROM).astype(np.float32).reshape(-1, 3)
+			if self.atomic_numbers is not None and len(self.atomic_numbers) == len(self.positions):
+				# one (nat, 4) array of atomic number, x, y, z
+				self.coordinates = np.column_stack((self.atomic_numbers, self.positions))
+				self.named_coordinates = []
+		elif name == 'Alpha Orbital Energies':
+			self.alpha_energies = np.round(value*HARTREE_TO_EV, 4) # convert to eV
+		elif name == 'Beta Orbital Energies':
+			self.beta_energies = np.round(value*HARTREE_TO_EV, 4) # convert to eV
+		elif name == 'Total Energy':
+			self.total_energy=value*HARTREE_TO_EV
+		elif name == 'SCF Energy':
+			self.scf_energy=value
+			#self.scf_energy=self.scf_energy*27.2114
+		elif name == 'Optimization Number of geometries':
+			self.nsteps = int(value[0])
+			self.ngeometry = n
+		elif name == 'Alpha MO coefficients':
+			self.alpha_coeffs = self.coefficient_matrix(value)
+		elif name == 'Beta MO coefficients':
+			self.beta_coeffs = self.coefficient_matrix(value)
+		elif name == 'Dipole Moment':
+			self.dipole = (value[:3]*AU_TO_DEBYE).tolist()
@@ -0,0 +1,178 @@
+import weakref
+
+import numpy as np
+
+# One TransformSnapshot per Axes, dropped when the Axes is garbage collected
+_snapshots = weakref.WeakKeyDictionary()
+
+
+class TransformSnapshot:
+    """
+    The size in data coordinates of one display unit on an Axes, computed once and reused for every label. It is recomputed only when the limits, the size of the Axes or the dpi change, so positioning labels costs one transform per figure instead of several per label. The axes are assumed to be linear.
+    """
+
+    def __init__(self, ax):
+        self.ax = ax
+        self._state = None
+        self._scale = None
+
+    def state(self):
+        """
+        Return everything the scale depends on.
+
+        :return: A tuple of the limits, the Axes bounds in display coordinates and the dpi.
+        """
+        ax = self.ax
+        return (ax.get_xlim(), ax.get_ylim(), tuple(ax.bbox.bounds), ax.figure.dpi)
+
+    @property
+    def scale(self):
+        """
+        The data size of one display unit along x and y, as an array of two floats.
+        """
+        state = self.state()
+        if state != self._state:
+            to_data = self.ax.transData.inverted()
+            origin, unit_x, unit_y = to_data.transform([(0, 0), (1, 0), (0, 1)])
+            self._scale = np.array([unit_x[0] - origin[0], unit_y[1] - origin[1]])
+            self._state = state
+        return self._scale
+
+    def pixels_to_data(self, offsets):
+        """
+        Convert offsets in display units to data coordinates.
+
+        :param offsets: An (x, y) offset or an (n, 2) array of offsets.
+        :return: The offsets in data coordinates, with the same shape.
+        """
+        return np.asarray(offsets, dtype=float) * self.scale
+
+    def points_to_data(self, offsets):
+        """
+        Convert offsets in typographic points (1/72 inch) to data coordinates.
+
+        :param offsets: An (x, y) offset or an (n, 2) array of offsets.
+        :return: The offsets in data coordinates, with the same shape.
+        """
+        return self.pixels_to_data(offsets) * (self.ax.figure.dpi / 72.0)
+
+
+def transform_snapshot(ax):
+    """
+    Return the TransformSnapshot of an Axes, creating it on first use.
+
+    :param ax: The Axes.
+    :return: The TransformSnapshot.
+    """
+    snapshot = _snapshots.get(ax)
+    if snapshot is None:
+        snapshot = _snapshots[ax] = TransformSnapshot(ax)
+    return snapshot
+
+
+def pack_column(bottoms, heights, gap=0.0):
+    """
+    Move labels in one column vertically so that none overlap, keeping them in order and as close as possible to where they were asked to be. Overlapping labels are merged into blocks that are centred on their members' targets, which keeps the layout symmetric and needs a single pass over the labels.
+
+    :param bottoms: The desired bottom edge of each label, sorted in ascending order.
+    :param heights: The height of each label.
+    :param gap: The minimum space between neighbouring labels.
+    :return: The new bottom edge of each label.
+    """
+    bottoms = np.asarray(bottoms, dtype=float)
+    stacked = np.asarray(heights, dtype=float) + gap
+    n = len(bottoms)
+    if n == 0:
+        return bottoms
+
+    # Each block is [first label, number of labels, stacked height, sum of targets for the block bottom]
+    blocks = []
+    for i in range(n):
+        first, count, height, total = i, 1, stacked[i], bottoms[i]
+        while blocks:
+            prev_first, prev_count, prev_height, prev_total = blocks[-1]
+            if prev_total / prev_count + prev_height <= total / count:
+                break
+            blocks.pop()
+            total = prev_total + total - count * prev_height
+            first, count, height = prev_first, prev_count + count, prev_height + height
+        blocks.append([first, count, height, total])
+
+    # Place each label at its block's bottom plus the height of the labels below it in the block
+    cumulative = np.concatenate(([0.0], np.cumsum(stacked)[:-1]))
+    block_of = np.repeat(np.arange(len(blocks)), [b[1] for b in blocks])
+    block_first = np.array([b[0] for b in blocks])
+    block_bottom = np.array([b[3] / b[1] for b in blocks])
+    return block_bottom[block_of] + cumulative - cumulative[block_first][block_of]
+
+
+def place_labels_1d(y, heights, columns, gap=0.0):
+    """
+    Remove vertical overlaps between labels that share a column, independently for every column.
+
+    :param y: The desired bottom edge of each label.
+    :param heights: The height of each label.
+    :param columns: A column key for each label; labels only collide with labels in the same column.
+    :param gap: The minimum space between neighbouring labels.
+    :return: The new bottom edge of each label, in the input order.
+    """
+    y = np.asarray(y, dtype=float)
+    heights = np.asarray(heights, dtype=float)
+    column_codes = np.unique(np.asarray(columns), return_inverse=True)[1].ravel()
+    order = np.lexsort((np.arange(len(y)), y, column_codes))
+    sorted_codes = column_codes[order]
+    bounds = np.flatnonzero(np.diff(sorted_codes)) + 1
+    new_y = np.empty_like(y)
+    for idx in np.split(order, bounds):
+        new_y[idx] = pack_column(y[idx], heights[idx], gap)
+    return new_y
+
+
+def pack_extents(ax, extents, positions, gap_points=1.0, columns=None):
+    """
+    Work out the y positions that remove the overlaps between labels of known extents, packing each column of labels (labels sharing an x position) in a single pass. The y-limits are widened if a label is pushed outside them.
+
+    :param ax: The Axes containing the labels.
+    :param extents: An (n, 4) array of the x0, y0, x1, y1 extents of the labels, in pixels.
+    :param positions: An (n, 2) array of the anchor positions of the labels, in data coordinates.
+    :param gap_points: The minimum space between neighbouring labels, in points.
+    :param columns: A column key for each label, if labels at different x positions may collide.
+    :return: The new y position of each anchor, in data coordinates.
+    """
+    # Convert the extents to data coordinates with a single inverted transform
+    to_data = ax.transData.inverted()
+    lower = to_data.transform(extents[:, :2])
+    upper = to_data.transform(extents[:, 2:])
+    bottoms = lower[:, 1]
+    heights = upper[:, 1] - lower[:, 1]
+    gap = transform_snapshot(ax).points_to_data((0, gap_points))[1]
+
+    if columns is None:
+        columns = np.round(positions[:, 0], 6)
+    new_bottoms = place_labels_1d(bottoms, heights, columns, gap)
+
+    ymin, ymax = ax.get_ylim()
+    ax.set_ylim(min(ymin, new_bottoms.min()), max(ymax, (new_bottoms + heights).max()))
+    return positions[:, 1] + (new_bottoms - bottoms)
+
+
+def place_texts(ax, texts, gap_points=1.0, columns=None):
+    """
+    Lay out text labels on an MO diagram without overlaps by moving them only in y. The text extents are measured once and each column of labels is packed in a single pass, so the result is deterministic. The y-limits are widened if a label is pushed outside them.
+
+    :param ax: The Axes containing the texts.
+    :param texts: The Text objects to lay out.
+    :param gap_points: The minimum space between neighbouring labels, in points.
+    :param columns: A column key for each text, e.g. the levels' _x, so that the labels of degenerate levels, which are shifted right by different amounts, are packed together; texts sharing an x position form a column if None.
+    :return: None
+    """
+    if not texts:
+        return
+    fig = ax.figure
+    renderer = fig.canvas.get_renderer()
+    extents = np.array([t.get_window_extent(renderer).extents for t in texts])  # x0, y0, x1, y1 in pixels
+
+    positions = np.array([t.get_position() for t in texts])
+    new_y = pack_extents(ax, extents, positions, gap_points, columns)
+    for t, x, y_ in zip(texts, positions[:, 0], new_y):
+        t.set_position((x, y_))
@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+from matplotlib.artist import Artist
+from matplotlib.collections import LineCollection
+from matplotlib.text import Text
+from matplotlib.transforms import Bbox
+
+from label_layout import pack_extents, transform_snapshot
+
+# The colour of levels whose symmetry label is missing
+MISSING_COLOR = (0.5, 0.5, 0.5, 1.0)
+
+
+def level_extents(levels, bar_width=0.6, degen_gap=0.05):
+    """
+    Return the horizontal extent of the bar of every level. A level's bar spans bar_width of its column, and the levels of a degenerate cluster (see prepare_levels) split that width between them and sit side by side, degen_gap apart, in the order of their rank.
+
+    :param levels: The levels from prepare_levels.
+    :param bar_width: The width of a column's bars, in x data units (one column is 1 wide).
+    :param degen_gap: The space between the bars of degenerate levels, in x data units.
+    :return: A tuple (x0, x1) of arrays with the left and right end of every bar.
+    """
+    x = levels["_x"].to_numpy(dtype=float)
+    rank = levels["_degen"].to_numpy()
+    cluster = levels["_cluster"].to_numpy()
+    count = np.bincount(cluster)[cluster] if len(cluster) else np.zeros(0, dtype=int)
+    width = (bar_width - (count - 1) * degen_gap) / count
+    centre = x + (rank - (count - 1) / 2) * (width + degen_gap)
+    return centre - width / 2, centre + width / 2
+
+
+def palette_colors(labels, hue_order=None, palette="flare_r"):
+    """
+    Look up the colour of every level from one palette array, the way seaborn colours a hue column.
+
+    :param labels: The hue value of every level, e.g. the symmetry_label column.
+    :param hue_order: The order of the hue values in the palette; their order of appearance if None.
+    :param palette: The name of the seaborn or matplotlib palette.
+    :return: An (n, 4) array of RGBA colours.
+    """
+    import seaborn as sns
+
+    labels = pd.Series(labels)
+    if hue_order is None:
+        hue_order = list(labels.dropna().unique())
+    colors = np.ones((len(hue_order) + 1, 4))
+    if hue_order:
+        colors[:-1, :3] = sns.color_palette(palette, len(hue_order))
+    colors[-1] = MISSING_COLOR
+    codes = pd.Categorical(labels, categories=hue_order).codes  # -1, the last row, for missing labels
+    return colors[codes]
+
+
+def draw_level_lines(ax, levels, column_order, line_width, hue_order=None, bar_width=0.6, degen_gap=0.05, palette="flare_r"):
+    """
+    Draw the energy levels from prepare_levels as horizontal bars in one LineCollection, one column per compound (or spin), with degenerate levels side by side.
+
+    :param ax: The Axes to draw into.
+    :param levels: The levels from prepare_levels.
+    :param column_order: The column names in plotting order.
+    :param line_width: The thickness of the bars, in points.
+    :param hue_order: The order of the symmetry labels in the palette, so that several panels colour them alike.
+    :param bar_width: See level_extents.
+    :param degen_gap: See level_extents.
+    :param palette: The palette the symmetry labels are coloured from.
+    :return: The LineCollection.
+    """
+    x0, x1 = level_extents(levels, bar_width, degen_gap)
+    y = levels["eV"].to_numpy(dtype=float)
+    segments = np.stack((np.column_stack((x0, y)), np.column_stack((x1, y))), axis=1)
+    lines = LineCollection(
+        segments,
+        colors=palette_colors(levels["symmetry_label"], hue_order, palette),
+        linewidths=line_width,
+        capstyle="butt",
+        zorder=3,
+    )
+    ax.add_collection(lines)
+    ax.autoscale_view()
+    ax.set_xticks(np.arange(len(column_order)), column_order)
+    ax.set_xlim(-0.5, len(column_order) - 0.5)
+    return lines
+
+
+class LabelLayer(Artist):
+    """
+    Many text labels drawn by one artist. A single Text is moved to each label in turn when the layer is drawn, so a diagram with thousands of labels adds one artist to the Axes instead of thousands, and labels with the same text reuse one cached layout.
+    """
+
+    zorder = 4
+
+    def __init__(self, x, y, labels, **text_kwargs):
+        """
+        :param x: The x position of every label, in data coordinates.
+        :param y: The y position of every label, in data coordinates.
+        :param labels: The text of every label; empty labels are skipped.
+        :param text_kwargs: Properties shared by every label, e.g. size, ha and va.
+        """
+        super().__init__()
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.labels = [str(label) for label in labels]
+        self._stamp = Text(0, 0, "", **text_kwargs)
+
+    def _prepare_stamp(self):
+        """
+        Give the shared Text this layer's figure, transform and clipping.
+
+        :return: The Text.
+        """
+        stamp = self._stamp
+        if stamp.figure is not self.figure:
+            stamp.set_figure(self.figure)
+        stamp.set_transform(self.get_transform())
+        stamp.set_clip_path(self.get_clip_path())
+        stamp.set_clip_on(self.get_clip_on())
+        return stamp
+
+    def window_extents(self, renderer):
+        """
+        Measure every label.
+
+        :param renderer: The renderer to measure with.
+        :return: An (n, 4) array of x0, y0, x1, y1 extents in pixels.
+        """
+        stamp = self._prepare_stamp()
+        extents = np.empty((len(self.labels), 4))
+        for i, (x, y, label) in enumerate(zip(self.x, self.y, self.labels)):
+            stamp.set_position((x, y))
+            stamp.set_text(label)
+            extents[i] = stamp.get_window_extent(renderer).extents
+        return extents
+
+    def get_window_extent(self, renderer=None):
+        """
+        Return the box around every non-empty label, so that tight bounding boxes include the labels.
+        """
+        if renderer is None:
+            renderer = self.figure.canvas.get_renderer()
+        extents = self.window_extents(renderer)[[bool(label) for label in self.labels]]
+        if not len(extents):
+            return Bbox.null()
+        return Bbox([extents[:, :2].min(axis=0), extents[:, 2:].max(axis=0)])
+
+    def draw(self, renderer):
+        if not self.get_visible():
+            return
+        stamp = self._prepare_stamp()
+        for x, y, label in zip(self.x, self.y, self.labels):
+            if label:
+                stamp.set_position((x, y))
+                stamp.set_text(label)
+                stamp.draw(renderer)
+        self.stale = False
+
+
+def label_positions(ax, levels, line_width, texty, bar_width=0.6, degen_gap=0.05):
+    """
+    Return where the labels of the bars from draw_level_lines go: centred under each bar, texty points below its lower edge. The limits must be final, as the offset is converted to data coordinates with one transform.
+
+    :param ax: The Axes containing the levels.
+    :param levels: The levels from prepare_levels.
+    :param line_width: The thickness of the bars, in points.
+    :param texty: The space between a bar and its label, in points.
+    :param bar_width: See level_extents.
+    :param degen_gap: See level_extents.
+    :return: An (n, 2) array of label anchors in data coordinates, for labels with ha="center" and va="top".
+    """
+    x0, x1 = level_extents(levels, bar_width, degen_gap)
+    dy = transform_snapshot(ax).points_to_data((0, -(0.5 * line_width + texty)))[1]
+    return np.column_stack(((x0 + x1) / 2, levels["eV"].to_numpy(dtype=float) + dy))
+
+
+def draw_label_layer(ax, positions, labels, size, use_adjust_text, columns=None, gap_points=1.0):
+    """
+    Draw the labels of the bars from draw_level_lines as one LabelLayer, packing each column of labels without overlaps if use_adjust_text is on. The labels of side-by-side degenerate bars share a column, so columns should be the levels' _x.
+
+    :param ax: The Axes containing the levels.
+    :param positions: The output of label_positions.
+    :param labels: The text of every label.
+    :param size: The size of the labels.
+    :param use_adjust_text: Whether to move labels so that they do not overlap.
+    :param columns: A column key for each label; labels with the same x position share a column if None.
+    :param gap_points: The minimum space between neighbouring labels, in points.
+    :return: The LabelLayer.
+    """
+    layer = LabelLayer(positions[:, 0], positions[:, 1], labels, size=size, ha="center", va="top", fontstyle="oblique")
+    ax.add_artist(layer)
+    layer.set_clip_path(ax.patch)
+    if use_adjust_text and len(layer.labels):
+        extents = layer.window_extents(ax.figure.canvas.get_renderer())
+        layer.y = pack_extents(ax, extents, positions, gap_points, columns)
+        layer.stale = True
+    return layer
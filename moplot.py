@@ -0,0 +1,50 @@
+import argparse
+import importlib
+import sys
+
+# Subcommands and the module that implements each one. A module is imported only when its command
+# runs, so `moplot --help` and the extraction commands never load matplotlib, seaborn or pandas.
+COMMANDS = {
+    "extract": ("extract_orbitals", "extract the orbitals around the HOMO/LUMO gap from .fchk files into one CSV"),
+    "render": ("render_figures", "render MO diagrams to files without a display, skipping up-to-date figures"),
+    "watch": ("watch_figure", "redraw an MO diagram whenever its settings or data file changes"),
+    "plot": ("MOplot_repulsion_adjustText2", "show the MO diagram of a settings file"),
+    "dos": ("density_of_states", "compute broadened, optionally atom-projected densities of states from .fchk files"),
+}
+
+
+def run_plot(module, argv):
+    """
+    Show the figure of a settings file; the plotting script itself takes no command line.
+
+    :param module: The imported plotting module.
+    :param argv: The arguments after "plot".
+    :return: The exit status.
+    """
+    parser = argparse.ArgumentParser(prog="moplot plot", description=COMMANDS["plot"][1])
+    parser.add_argument("settings", nargs="?", default="settings.json", help="settings file")
+    args = parser.parse_args(argv)
+    module.main(args.settings)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="moplot",
+        description="Extract, plot and render molecular orbital energy diagrams.",
+        epilog="Run 'moplot <command> --help' for the options of a command.",
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="command", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        # The command's own parser handles its options, including --help
+        subparsers.add_parser(name, help=help_text, add_help=False)
+    args, rest = parser.parse_known_args(argv)
+
+    module = importlib.import_module(COMMANDS[args.command][0])
+    if args.command == "plot":
+        return run_plot(module, rest)
+    return module.main(rest)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+
+from fchk_class import species
+
+ANGULAR_LABELS = "spdfghi"
+
+
+def basis_function_map(fchk):
+    """
+    Return the atom and the angular momentum of every basis function, expanded from the "Shell types" and "Shell to atom map" sections. Gaussian's shell type codes are 0 (s), 1 (p), -1 (sp), 2 (6d), -2 (5d), 3 (10f), -3 (7f) and so on.
+
+    :param fchk: The parsed Fchk.
+    :return: A tuple (atoms, angular) of integer arrays with one entry per basis function; atoms are 0-based.
+    """
+    shell_types = np.asarray(fchk.get("Shell types"), dtype=np.int64)
+    shell_atoms = np.asarray(fchk.get("Shell to atom map"), dtype=np.int64) - 1
+    l = np.abs(shell_types)
+    n_functions = np.where(
+        shell_types == -1, 4, np.where(shell_types < 0, 2 * l + 1, (l + 1) * (l + 2) // 2)
+    )
+    if fchk.numbasis is not None and n_functions.sum() != fchk.numbasis:
+        raise ValueError(
+            f"the shells of {fchk.filename} hold {n_functions.sum()} basis functions, not {fchk.numbasis}"
+        )
+    atoms = np.repeat(shell_atoms, n_functions)
+    angular = np.repeat(l, n_functions)
+    # The first function of an sp shell is its s function
+    first = np.concatenate(([0], np.cumsum(n_functions)[:-1]))
+    angular[first[shell_types == -1]] = 0
+    return atoms, angular
+
+
+def element_fragments(fchk):
+    """
+    Group the atoms of a checkpoint by element.
+
+    :param fchk: The parsed Fchk.
+    :return: A dict mapping each element symbol to the 0-based indices of its atoms, in order of atomic number.
+    """
+    numbers = np.asarray(fchk.atomic_numbers, dtype=np.int64)
+    return {species[z]: np.flatnonzero(numbers == z) for z in np.unique(numbers)}
+
+
+def group_matrix(atoms, angular, fragments, by_angular=False):
+    """
+    Build the one-hot matrix that sums basis-function weights into fragments.
+
+    :param atoms: The atom of every basis function.
+    :param angular: The angular momentum of every basis function.
+    :param fragments: A dict mapping fragment names to 0-based atom indices.
+    :param by_angular: Whether to split every fragment into its s, p, d, ... functions.
+    :return: A tuple (matrix, names), where matrix has one row per basis function and one column per group.
+    """
+    names, columns = [], []
+    for name, members in fragments.items():
+        in_fragment = np.isin(atoms, np.asarray(members, dtype=np.int64))
+        if not by_angular:
+            names.append(name)
+            columns.append(in_fragment)
+            continue
+        for l in np.unique(angular[in_fragment]):
+            names.append(f"{name} {ANGULAR_LABELS[l]}")
+            columns.append(in_fragment & (angular == l))
+    return np.column_stack(columns).astype(float), names
+
+
+def checkpoint_groups(fchk, fragments=None, by_angular=False):
+    """
+    Build the group matrix of a checkpoint from its shells, see group_matrix.
+
+    :param fchk: The parsed Fchk.
+    :param fragments: A dict mapping fragment names to 0-based atom indices; atoms are grouped by element if None.
+    :param by_angular: Whether to split every fragment into its s, p, d, ... functions.
+    :return: A tuple (matrix, names) as returned by group_matrix.
+    """
+    atoms, angular = basis_function_map(fchk)
+    return group_matrix(atoms, angular, element_fragments(fchk) if fragments is None else fragments, by_angular)
+
+
+def orbital_composition(fchk, rows=None, spin="alpha", fragments=None, by_angular=False, groups=None):
+    """
+    Return the percentage contribution of each fragment to each selected MO. Contributions are computed from the squared coefficients normalised per orbital (C-squared population analysis), as the .fchk has no overlap matrix. The whole window is done with one matrix product, and only the selected rows of the coefficient matrix are decoded.
+
+    For example, the metal d-character of HOMO-3..LUMO+3:
+
+        window = fchk.orbital_window(4, 4)
+        orbital_composition(fchk, window["orbital_num"], by_angular=True)["Ni d"]
+
+    :param fchk: The parsed Fchk.
+    :param rows: The orbital numbers to analyse, a slice, or None for every orbital.
+    :param spin: "alpha" or "beta".
+    :param fragments: A dict mapping fragment names to 0-based atom indices; atoms are grouped by element if None.
+    :param by_angular: Whether to split every fragment into its s, p, d, ... contributions, e.g. "Ni d".
+    :param groups: The output of checkpoint_groups for this checkpoint, to reuse across many calls; fragments and by_angular are ignored if it is given.
+    :return: A DataFrame with one row per orbital, indexed by orbital number, and one column of percentages per fragment.
+    """
+    coeffs = np.asarray(fchk.mo_coefficients(rows, spin), dtype=float)
+    if coeffs.ndim != 2:
+        raise ValueError(f"{fchk.filename} has no {spin} MO coefficient matrix")
+    if rows is None:
+        orbital_num = np.arange(len(coeffs))
+    elif isinstance(rows, slice):
+        orbital_num = np.arange(*rows.indices(fchk.numindbasis or len(coeffs)))
+    else:
+        orbital_num = np.asarray(rows)
+
+    groups, names = checkpoint_groups(fchk, fragments, by_angular) if groups is None else groups
+    weights = np.square(coeffs)
+    weights /= weights.sum(axis=1, keepdims=True)
+    return pd.DataFrame(100 * (weights @ groups), index=pd.Index(orbital_num, name="orbital_num"), columns=names)
+
+
+def composition_labels(composition, threshold=10.0, max_terms=2):
+    """
+    Turn a composition table into short labels such as "62% Ni d, 21% N p", listing the largest contributions first.
+
+    :param composition: The output of orbital_composition.
+    :param threshold: The smallest percentage worth listing.
+    :param max_terms: The maximum number of contributions in a label.
+    :return: A Series of labels with the index of composition.
+    """
+    values = composition.to_numpy()
+    names = np.asarray(composition.columns, dtype=str)
+    order = np.argsort(-values, axis=1, kind="stable")[:, :max_terms]
+    top = np.take_along_axis(values, order, axis=1)
+    terms = np.char.add(np.char.add(np.round(top).astype(int).astype(str), "% "), names[order])
+    terms = np.where(top >= threshold, terms, "")
+    labels = [", ".join(t for t in row if t) for row in terms]
+    return pd.Series(labels, index=composition.index, name="composition_label")
+
+
+def composition_column(fchk, orbital_num, spins, fragments=None, by_angular=True, threshold=10.0, max_terms=2):
+    """
+    Return the composition label of every orbital in a list, analysing each spin's orbitals in one batch.
+
+    :param fchk: The parsed Fchk.
+    :param orbital_num: The orbital numbers.
+    :param spins: The spin of each orbital, "alpha" or "beta".
+    :param fragments: See orbital_composition.
+    :param by_angular: See orbital_composition.
+    :param threshold: See composition_labels.
+    :param max_terms: See composition_labels.
+    :return: An object array of labels, one per orbital.
+    """
+    orbital_num, spins = np.asarray(orbital_num), np.asarray(spins)
+    labels = np.empty(len(orbital_num), dtype=object)
+    for spin in np.unique(spins):
+        mask = spins == spin
+        composition = orbital_composition(fchk, orbital_num[mask], spin, fragments, by_angular)
+        labels[mask] = composition_labels(composition, threshold, max_terms).to_numpy()
+    return labels
+
+
+def label_table(fchk, table, fragments=None, by_angular=True, threshold=10.0, max_terms=2):
+    """
+    Add a composition_label column to an orbital table from extract_orbitals.orbital_table.
+
+    :param fchk: The parsed Fchk the table was extracted from.
+    :param table: The orbital table.
+    :param fragments: See orbital_composition.
+    :param by_angular: See orbital_composition.
+    :param threshold: See composition_labels.
+    :param max_terms: See composition_labels.
+    :return: A copy of the table with the composition_label column.
+    """
+    spins = table["spin"] if "spin" in table else np.full(len(table), "alpha")
+    labels = composition_column(fchk, table["orbital_num"], spins, fragments, by_angular, threshold, max_terms)
+    return table.assign(composition_label=labels)
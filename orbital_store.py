@@ -0,0 +1,190 @@
+import glob
+import os
+import re
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from extract_orbitals import CSV_HEADER, orbital_table
+
+# Columns of the store, in order: the CSV columns plus the calculation date, the source file and an ingestion counter
+SCHEMA = pa.schema(
+    [
+        ("compound", pa.string()),
+        ("calc_date", pa.string()),
+        ("orbital_num", pa.int64()),
+        ("spin", pa.string()),
+        ("unround_eV", pa.float64()),
+        ("eV", pa.float64()),
+        ("symmetry_label", pa.string()),
+        ("orbital_label", pa.string()),
+        ("source", pa.string()),
+        ("ingest_id", pa.int64()),
+    ]
+)
+KEY = ["compound", "calc_date", "spin", "orbital_num"]
+COMPACT_FILE = "orbitals.parquet"
+
+
+def calc_date_from_path(path):
+    """
+    Return the calculation date in a file name such as NiCis_06-20-23_1.csv, or "" if there is none.
+
+    :param path: The path to the .csv or .fchk file.
+    :return: The date as written in the file name, e.g. "06-20-23".
+    """
+    match = re.search(r"_(\d{2}-\d{2}-\d{2})(?:_|\.|$)", os.path.basename(path))
+    return match.group(1) if match else ""
+
+
+def append_frame(store, frame, source=""):
+    """
+    Append a table of orbitals to the store as a new Parquet file. Files in the store are never rewritten, except by compact().
+
+    :param store: The store directory.
+    :param frame: A DataFrame with the CSV columns and optionally calc_date. Tables written before the spin column existed are taken as alpha orbitals.
+    :param source: The file the orbitals came from.
+    :return: The path of the new Parquet file.
+    """
+    os.makedirs(store, exist_ok=True)
+    frame = frame.copy()
+    if "calc_date" not in frame:
+        frame["calc_date"] = ""
+    if "spin" not in frame:
+        frame["spin"] = "alpha"
+    frame["source"] = source
+    frame["ingest_id"] = time.time_ns()
+    frame["symmetry_label"] = frame["symmetry_label"].fillna("").astype(str)
+    frame["orbital_label"] = frame["orbital_label"].astype(str)
+    table = pa.Table.from_pandas(frame[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+    path = os.path.join(store, f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet")
+    pq.write_table(table, path)
+    return path
+
+
+def ingest_csv(store, paths):
+    """
+    Append existing orbital CSV files to the store, taking the calculation date from each file name.
+
+    :param store: The store directory.
+    :param paths: The CSV files to ingest.
+    :return: The paths of the new Parquet files.
+    """
+    written = []
+    for path in paths:
+        frame = pd.read_csv(path, encoding="utf-8-sig")
+        frame["calc_date"] = calc_date_from_path(path)
+        written.append(append_frame(store, frame, os.path.abspath(path)))
+    return written
+
+
+def ingest_fchk(store, fchk_data, compound_name, N_orbitals=5, calc_date=None):
+    """
+    Append the orbitals around the HOMO/LUMO gap of a parsed checkpoint to the store, for both spins of an unrestricted calculation.
+
+    :param store: The store directory.
+    :param fchk_data: The parsed Fchk.
+    :param compound_name: The value of the compound column.
+    :param N_orbitals: The number of occupied and of virtual orbitals to include.
+    :param calc_date: The calculation date; taken from the checkpoint's file name if None.
+    :return: The path of the new Parquet file.
+    """
+    source = getattr(fchk_data, "filename", "")
+    frame = orbital_table(fchk_data, compound_name, N_orbitals, N_orbitals)
+    frame["calc_date"] = calc_date_from_path(source) if calc_date is None else calc_date
+    return append_frame(store, frame, os.path.abspath(source) if source else "")
+
+
+def compact(store):
+    """
+    Merge every file in the store into one Parquet file sorted by compound, calculation date, spin and orbital number, keeping only the latest ingestion of each orbital. The single file can be memory-mapped and its row-group statistics let filters skip whole compounds.
+
+    :param store: The store directory.
+    :return: The path of the compacted file.
+    """
+    parts = glob.glob(os.path.join(store, "*.parquet"))
+    table = ds.dataset(parts, schema=SCHEMA, format="parquet").to_table()
+    frame = table.to_pandas().fillna({"spin": "alpha"})
+    frame = frame.sort_values("ingest_id", kind="stable").drop_duplicates(KEY, keep="last")
+    frame = frame.sort_values(KEY, kind="stable")
+    tmp = os.path.join(store, COMPACT_FILE + ".tmp")
+    pq.write_table(
+        pa.Table.from_pandas(frame, schema=SCHEMA, preserve_index=False),
+        tmp,
+        row_group_size=64 * 1024,
+    )
+    os.replace(tmp, os.path.join(store, COMPACT_FILE))
+    for part in parts:
+        if os.path.basename(part) != COMPACT_FILE:
+            os.remove(part)
+    return os.path.join(store, COMPACT_FILE)
+
+
+def build_filter(compounds=None, calc_dates=None, orbital_labels=None, orbital_nums=None, spins=None):
+    """
+    Build a pyarrow filter expression from lists of allowed values. Arguments left as None do not filter.
+
+    :return: The expression, or None if nothing is filtered.
+    """
+    expression = None
+    for column, values in (
+        ("compound", compounds),
+        ("calc_date", calc_dates),
+        ("orbital_label", orbital_labels),
+        ("orbital_num", orbital_nums),
+        ("spin", spins),
+    ):
+        if values is None:
+            continue
+        term = ds.field(column).isin(list(values))
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def load_orbitals(
+    store,
+    compounds=None,
+    calc_dates=None,
+    orbital_labels=None,
+    orbital_nums=None,
+    spins=None,
+    columns=None,
+    latest=True,
+):
+    """
+    Load the orbitals matching a query from the store. The query is pushed down to the Parquet reader, so only the row groups and columns it needs are read. For example, all LUMO..LUMO+3 of the Ni/Pd/Pt cis compounds:
+
+        load_orbitals(store, compounds=["NiCis", "PdCis", "PtCis"], orbital_labels=["LUMO", "LUMO+1", "LUMO+2", "LUMO+3"])
+
+    :param store: The store directory.
+    :param compounds: Compounds to keep; the result keeps this order of compounds, as plotMO_cat uses it for the x-axis.
+    :param calc_dates: Calculation dates to keep.
+    :param orbital_labels: Orbital labels to keep, e.g. "HOMO-1".
+    :param orbital_nums: Orbital numbers to keep.
+    :param spins: Spins to keep, "alpha" and/or "beta".
+    :param columns: Columns to return; all CSV columns if None.
+    :param latest: Whether to keep only the latest ingestion of each orbital.
+    :return: A DataFrame with the CSV columns, ready for plotMO_cat.
+    """
+    columns = list(columns or CSV_HEADER)
+    read_columns = list(dict.fromkeys(columns + KEY + ["ingest_id"]))
+    dataset = ds.dataset(
+        glob.glob(os.path.join(store, "*.parquet")), schema=SCHEMA, format="parquet"
+    )
+    table = dataset.to_table(
+        columns=read_columns,
+        filter=build_filter(compounds, calc_dates, orbital_labels, orbital_nums, spins),
+    )
+    frame = table.to_pandas().fillna({"spin": "alpha"})  # files written before the spin column
+    frame = frame.sort_values("ingest_id", kind="stable")
+    if latest:
+        frame = frame.drop_duplicates(KEY, keep="last")
+    if compounds is not None:
+        order = {compound: i for i, compound in enumerate(compounds)}
+        frame = frame.assign(_order=frame["compound"].map(order))
+        frame = frame.sort_values(["_order", "calc_date", "spin", "orbital_num"], kind="stable")
+    return frame[columns].reset_index(drop=True)
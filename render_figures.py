@@ -0,0 +1,238 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+
+matplotlib.use("Agg")  # render off-screen, before pyplot is imported
+
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+from build_manifest import (
+    MANIFEST_FILE,
+    code_digest,
+    file_state,
+    is_up_to_date,
+    job_record,
+    load_manifest,
+    save_manifest,
+    settings_digest,
+)
+from extract_orbitals import available_cpus
+from MOplot_repulsion_adjustText2 import load_settings, plot_settings
+
+# The Figure and Axes reused by every render in this process
+_figure = None
+_axes = None
+
+
+def resolve_data_path(data_path, settings_file):
+    """
+    Return the full path to a settings file's data file. Paths such as "/CisTrans.csv" are taken relative to the directory of the settings file, as the plotting script takes them relative to itself.
+
+    :param data_path: The data_path entry of the settings.
+    :param settings_file: The settings file the entry came from.
+    :return: The full path to the data file.
+    """
+    head = os.path.dirname(os.path.abspath(settings_file))
+    full_path = os.path.normpath(os.path.join(head, data_path.lstrip("/\\")))
+    if not os.path.exists(full_path) and os.path.exists(data_path):
+        return os.path.abspath(data_path)
+    return full_path
+
+
+def resolve_settings_paths(settings, settings_file):
+    """
+    Return a copy of a settings dict whose checkpoint paths (correlation_fchk, also inside panels, and dos.files) are resolved like data_path, relative to the settings file.
+
+    :param settings: The settings.
+    :param settings_file: The settings file they came from.
+    :return: The settings with full paths.
+    """
+
+    def resolve(files):
+        if not isinstance(files, dict):
+            return [resolve_data_path(path, settings_file) for path in files]
+        return {name: resolve_data_path(path, settings_file) for name, path in files.items()}
+
+    settings = dict(settings)
+    if settings.get("correlation_fchk"):
+        settings["correlation_fchk"] = resolve(settings["correlation_fchk"])
+    if settings.get("panels"):
+        settings["panels"] = [
+            dict(panel, correlation_fchk=resolve(panel["correlation_fchk"])) if panel.get("correlation_fchk") else panel
+            for panel in settings["panels"]
+        ]
+    if settings.get("dos") and settings["dos"].get("files"):
+        settings["dos"] = dict(settings["dos"], files=resolve(settings["dos"]["files"]))
+    return settings
+
+
+def make_jobs(inputs, base_settings_file="settings.json"):
+    """
+    Turn settings files and data files into render jobs. A data file (.csv) is rendered with the options of base_settings_file.
+
+    :param inputs: Paths to settings files (.json) or data files (.csv).
+    :param base_settings_file: The settings used for data files.
+    :return: A list of (name, settings, data_path, source) tuples, where source is the absolute path of the input the job came from.
+    """
+    jobs = []
+    base_settings = None
+    for path in inputs:
+        name = os.path.splitext(os.path.basename(path))[0]
+        if path.endswith(".json"):
+            settings = resolve_settings_paths(load_settings(path), path)
+            jobs.append((name, settings, resolve_data_path(settings["data_path"], path), os.path.abspath(path)))
+        else:
+            if base_settings is None:
+                base_settings = resolve_settings_paths(load_settings(base_settings_file), base_settings_file)
+            jobs.append((name, base_settings, os.path.abspath(path), os.path.abspath(path)))
+    return jobs
+
+
+def get_axes():
+    """
+    Return this process's reusable Axes, cleared of the previous render. The seaborn theme is set once, when the Figure is first created. If a multi-panel render replaced the Figure's Axes, a single Axes is put back.
+
+    :return: The Axes.
+    """
+    global _figure, _axes
+    if _figure is None:
+        sns.set_theme(style="ticks", context="notebook", font_scale=1)
+        _figure, _axes = plt.subplots()
+    elif _figure.axes != [_axes]:
+        _figure.clf()
+        _axes = _figure.add_subplot()
+    else:
+        _axes.cla()
+    return _axes
+
+
+def render_job(job, out_dir, formats, dpi):
+    """
+    Render one job into the reusable Axes and write it in each format.
+
+    :param job: A (name, settings, data_path, source) tuple from make_jobs.
+    :param out_dir: The directory to write the figures to.
+    :param formats: File formats to write, e.g. ["png", "svg"].
+    :param dpi: The resolution of raster formats.
+    :return: A tuple (name, written paths, error), where error is None on success.
+    """
+    name, settings, data_path = job[:3]
+    try:
+        ax = get_axes()
+        plot_settings(settings, data_path, ax=ax)
+        written = []
+        for fmt in formats:
+            out_path = os.path.join(out_dir, name + "." + fmt)
+            ax.figure.savefig(out_path, dpi=dpi, bbox_inches="tight")
+            written.append(out_path)
+        return name, written, None
+    except Exception as e:
+        return name, [], f"{type(e).__name__}: {e}"
+
+
+def render_figures(jobs, out_dir=".", formats=("png",), dpi=300, workers=1):
+    """
+    Render many figures without a display, optionally across a process pool.
+
+    :param jobs: The jobs from make_jobs.
+    :param out_dir: The directory to write the figures to.
+    :param formats: File formats to write, e.g. ["png", "pdf"].
+    :param dpi: The resolution of raster formats.
+    :param workers: The number of worker processes; 1 renders in this process.
+    :return: A list of (name, written paths, error) tuples in job order.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    args = ([out_dir] * len(jobs), [list(formats)] * len(jobs), [dpi] * len(jobs))
+    if workers == 1 or len(jobs) < 2:
+        return list(map(render_job, jobs, *args))
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        return list(pool.map(render_job, jobs, *args))
+
+
+def output_paths(name, out_dir, formats):
+    """
+    Return the files a job writes.
+
+    :param name: The job name.
+    :param out_dir: The output directory.
+    :param formats: The file formats.
+    :return: A list of paths.
+    """
+    return [os.path.join(out_dir, name + "." + fmt) for fmt in formats]
+
+
+def build_figures(jobs, out_dir=".", formats=("png",), dpi=300, workers=1, force=False):
+    """
+    Render only the figures whose data, checkpoints, settings, plotting code or output files changed since the last build. Each build is recorded in a manifest of content hashes in out_dir; unchanged inputs are recognised by size and mtime without being hashed again.
+
+    :param jobs: The jobs from make_jobs.
+    :param out_dir: The directory to write the figures and the manifest to.
+    :param formats: File formats to write, e.g. ["png", "pdf"].
+    :param dpi: The resolution of raster formats.
+    :param workers: The number of worker processes.
+    :param force: Whether to render every job regardless of the manifest.
+    :return: A tuple (results, skipped): the (name, written paths, error) tuples of the rendered jobs, and the names of the jobs that were up to date.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+    manifest = load_manifest(manifest_path)
+    code_hash = code_digest()
+    stale, keys, records, skipped = [], [], [], []
+    for job in jobs:
+        name, settings, data_path, source = job
+        # Records are keyed by the input's path, as settings files in different directories may share a name
+        key = os.path.relpath(source, out_dir)
+        settings_hash = settings_digest(settings, data_path=data_path, formats=list(formats), dpi=dpi)
+        previous = manifest.get(key)
+        record = job_record(
+            data_path, settings_hash, output_paths(name, out_dir, formats), previous, code_hash, settings
+        )
+        if not force and is_up_to_date(record, previous):
+            skipped.append(name)
+            manifest[key] = record
+        else:
+            stale.append(job)
+            keys.append(key)
+            records.append(record)
+
+    results = render_figures(stale, out_dir, formats, dpi, workers)
+    for key, record, (name, written, error) in zip(keys, records, results):
+        if error is None:
+            manifest[key] = dict(record, outputs={path: file_state(path) for path in written})
+        else:
+            manifest.pop(key, None)
+    save_manifest(manifest, manifest_path)
+    return results, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render MO diagrams to files without a display.")
+    parser.add_argument("inputs", nargs="+", help="settings files (.json) or data files (.csv)")
+    parser.add_argument("-o", "--out-dir", default="figures", help="directory to write figures to")
+    parser.add_argument("-f", "--format", action="append", dest="formats", help="png, svg or pdf; may be repeated (default: png)")
+    parser.add_argument("--dpi", type=int, default=300, help="resolution of raster formats")
+    parser.add_argument("--settings", default="settings.json", help="settings used for .csv inputs")
+    parser.add_argument("-j", "--jobs", type=int, default=available_cpus(), help="worker processes")
+    parser.add_argument("--force", action="store_true", help="render every figure, even if it is up to date")
+    args = parser.parse_args(argv)
+
+    jobs = make_jobs(args.inputs, args.settings)
+    results, skipped = build_figures(jobs, args.out_dir, args.formats or ["png"], args.dpi, args.jobs, args.force)
+    if skipped:
+        print(f"{len(skipped)} of {len(jobs)} figures up to date.", file=sys.stderr)
+    failed = 0
+    for name, written, error in results:
+        if error is None:
+            print(f"{name}: {', '.join(written)}", file=sys.stderr)
+        else:
+            failed += 1
+            print(f"{name}: FAILED {error}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+import atexit
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILE_ENV = "MOPLOT_PROFILE"
+MEMORY_ENV = "MOPLOT_PROFILE_MEMORY"
+
+# Returned by stage() while profiling is off, so an instrumented block costs one global lookup and a no-op context
+NULL_STAGE = contextlib.nullcontext()
+
+_profiler = None
+
+
+class StageProfiler:
+    """
+    Record the wall time, call count and memory of named pipeline stages. Stages may nest; the memory of a stage is the net change in traced Python allocations and the peak above its starting point, both measured with tracemalloc when memory tracking is on. Every call is also kept as an event so the run can be written as a Chrome trace.
+    """
+
+    def __init__(self, memory=True):
+        """
+        :param memory: Whether to track allocations with tracemalloc, which slows the profiled code down.
+        """
+        self.memory = memory
+        self.stats = {}
+        self.events = []
+        self.origin = time.perf_counter()
+        self._stack = []
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Time the enclosed block as one call of a stage.
+
+        :param name: The name of the stage.
+        :return: A context manager.
+        """
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            frame = [current, current]
+        else:
+            frame = [0, 0]
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            allocated = peak_above = 0
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                frame[1] = max(frame[1], peak)
+                allocated, peak_above = current - frame[0], frame[1] - frame[0]
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], frame[1])
+                tracemalloc.reset_peak()
+            self.record(name, start, elapsed, allocated, peak_above)
+
+    def record(self, name, start, elapsed, allocated=0, peak=0):
+        """
+        Add one call of a stage to the statistics and the event list.
+
+        :param name: The name of the stage.
+        :param start: The perf_counter time the call started.
+        :param elapsed: The wall time of the call, in seconds.
+        :param allocated: The net bytes allocated by the call.
+        :param peak: The peak bytes allocated above the start of the call.
+        :return: None
+        """
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = {"calls": 0, "total": 0.0, "max": 0.0, "allocated": 0, "peak": 0}
+        stats["calls"] += 1
+        stats["total"] += elapsed
+        stats["max"] = max(stats["max"], elapsed)
+        stats["allocated"] += allocated
+        stats["peak"] = max(stats["peak"], peak)
+        self.events.append((name, start - self.origin, elapsed, threading.get_ident()))
+
+    def summary(self):
+        """
+        Format the statistics as a table, slowest stage first.
+
+        :return: The table as a string.
+        """
+        rows = sorted(self.stats.items(), key=lambda item: -item[1]["total"])
+        width = max([len("stage")] + [len(name) for name in self.stats])
+        lines = [f"{'stage':<{width}}  {'calls':>7}  {'total ms':>10}  {'mean ms':>9}  {'max ms':>9}"]
+        if self.memory:
+            lines[0] += f"  {'alloc KiB':>10}  {'peak KiB':>10}"
+        for name, s in rows:
+            line = (
+                f"{name:<{width}}  {s['calls']:>7d}  {s['total'] * 1000:>10.2f}"
+                f"  {s['total'] / s['calls'] * 1000:>9.3f}  {s['max'] * 1000:>9.3f}"
+            )
+            if self.memory:
+                line += f"  {s['allocated'] / 1024:>10.1f}  {s['peak'] / 1024:>10.1f}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def to_dict(self):
+        """
+        Return the statistics in a JSON-serialisable form, with times in seconds and memory in bytes.
+
+        :return: A dict mapping stage names to their statistics.
+        """
+        return {name: dict(stats) for name, stats in self.stats.items()}
+
+    def chrome_trace(self):
+        """
+        Return the recorded calls in the Chrome trace event format, for chrome://tracing or Perfetto.
+
+        :return: A dict with a traceEvents list of complete events, with times in microseconds.
+        """
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {"name": name, "ph": "X", "ts": start * 1e6, "dur": elapsed * 1e6, "pid": pid, "tid": tid}
+                for name, start, elapsed, tid in self.events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def write(self, destination):
+        """
+        Report the statistics: as a table on stderr for "summary", as a Chrome trace for paths ending in .trace.json, and as a JSON summary for other paths. A "{pid}" in the path is replaced with the process id, so worker processes do not overwrite each other's reports.
+
+        :param destination: "summary" or a file path.
+        :return: None
+        """
+        if destination == "summary":
+            print(self.summary(), file=sys.stderr)
+            return
+        path = destination.replace("{pid}", str(os.getpid()))
+        report = self.chrome_trace() if path.endswith(".trace.json") else self.to_dict()
+        with open(path, "w") as f:
+            json.dump(report, f, indent=1)
+
+
+def stage(name):
+    """
+    Time a block as a stage of the active profiler, or do nothing if profiling is off:
+
+        with stage("check_degen"):
+            ...
+
+    :param name: The name of the stage.
+    :return: A context manager.
+    """
+    if _profiler is None:
+        return NULL_STAGE
+    return _profiler.stage(name)
+
+
+def get_profiler():
+    """
+    Return the active profiler.
+
+    :return: The StageProfiler, or None if profiling is off.
+    """
+    return _profiler
+
+
+def enable(memory=True):
+    """
+    Start profiling stages, keeping the active profiler if there is one.
+
+    :param memory: Whether to track allocations as well as times.
+    :return: The active StageProfiler.
+    """
+    global _profiler
+    if _profiler is None:
+        _profiler = StageProfiler(memory)
+    return _profiler
+
+
+def disable():
+    """
+    Stop profiling stages.
+
+    :return: The profiler that was active, or None.
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None and profiler.memory:
+        tracemalloc.stop()
+    return profiler
+
+
+def configure(value, memory=True):
+    """
+    Turn profiling on from a setting or environment value and report the stages when the process exits. Nothing happens if the value is empty or "0", or if profiling is already on.
+
+    :param value: True, "1" or "summary" for a table on stderr, or a file path (see StageProfiler.write).
+    :param memory: Whether to track allocations as well as times.
+    :return: The active StageProfiler, or None if profiling is off.
+    """
+    if not value or value in ("0", "false") or _profiler is not None:
+        return _profiler
+    destination = "summary" if value is True or value in ("1", "true", "summary") else value
+    profiler = enable(memory)
+    atexit.register(lambda: profiler.stats and profiler.write(destination))
+    return profiler
+
+
+configure(os.environ.get(PROFILE_ENV), os.environ.get(MEMORY_ENV, "1") not in ("0", "false"))
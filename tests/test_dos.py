@@ -0,0 +1,85 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # the project modules live one level up
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from density_of_states import broaden, broadening_kernel, checkpoint_dos, energy_grid, stick_spectrum
+from fchk_class import Fchk
+from orbital_composition import basis_function_map
+from synthetic import write_fchk
+
+
+def shells(types, atoms, numbasis=None):
+    """
+    Stand in for a Fchk holding only the shell sections basis_function_map reads.
+    """
+    sections = {"Shell types": types, "Shell to atom map": atoms}
+    return SimpleNamespace(get=sections.get, numbasis=numbasis, filename="shells.fchk")
+
+
+@pytest.mark.parametrize(
+    "shell_type, angular",
+    [
+        (0, [0]),
+        (1, [1] * 3),
+        (-1, [0, 1, 1, 1]),  # sp: one s and three p functions
+        (-2, [2] * 5),  # pure d
+        (2, [2] * 6),  # Cartesian d
+        (-3, [3] * 7),  # pure f
+        (3, [3] * 10),  # Cartesian f
+    ],
+)
+def test_basis_function_map(shell_type, angular):
+    atoms, l = basis_function_map(shells([shell_type], [1], len(angular)))
+    assert list(l) == angular
+    assert list(atoms) == [0] * len(angular)
+
+
+def test_basis_function_map_atoms():
+    atoms, l = basis_function_map(shells([0, -1, -2, 2], [1, 1, 2, 2], 16))
+    assert list(atoms) == [0] * 5 + [1] * 11
+    assert list(l) == [0, 0, 1, 1, 1] + [2] * 11
+    with pytest.raises(ValueError, match="hold 16 basis functions, not 17"):
+        basis_function_map(shells([0, -1, -2, 2], [1, 1, 2, 2], 17))
+
+
+def test_broaden_area():
+    grid = energy_grid(-5.0, 5.0, 0.01)
+    sticks = stick_spectrum([-1.0, 0.0, 0.0, 2.5], grid)
+    broadened = broaden(sticks, broadening_kernel(0.01, 0.3))
+    assert np.isclose(broadened.sum() * 0.01, 4.0)
+
+
+@pytest.mark.parametrize("shape", ["gaussian", "lorentzian"])
+def test_dos_grid_edge(shape):
+    # Levels on and just outside the edges of the grid keep the part of their area that falls inside it
+    energies = np.array([-5.1, -5.0, 0.0, 5.0, 5.05])
+    fchk = SimpleNamespace(alpha_energies=energies, beta_energies=None)
+    grid = energy_grid(-5.0, 5.0, 0.01)
+    wide = energy_grid(-15.0, 15.0, 0.01)
+    dos = checkpoint_dos(fchk, grid, 0.1, shape)
+    reference = checkpoint_dos(fchk, wide, 0.1, shape)
+    inside = (reference["eV"] >= -5.0 - 1e-9) & (reference["eV"] <= 5.0 + 1e-9)
+    assert np.allclose(dos["total"], reference.loc[inside, "total"], atol=1e-9)
+    # A restricted orbital holds two states
+    assert np.isclose(reference["total"].sum() * 0.01, 2 * len(energies), rtol=1e-2)
+    assert dos["total"].iloc[0] > 0
+
+
+def test_projected_dos(tmp_path):
+    path = str(tmp_path / "synthetic.fchk")
+    write_fchk(path, 5, 23)
+    fchk = Fchk(path, lazy=True)
+    grid = energy_grid(-40.0, 20.0, 0.01)
+    dos = checkpoint_dos(fchk, grid, project=True, by_angular=True, chunk=4)
+    # The fragments split the total, however the orbitals are chunked
+    fragments = dos.drop(columns=["eV", "total"])
+    assert np.allclose(fragments.sum(axis=1), dos["total"])
+    whole = checkpoint_dos(fchk, grid, project=True, by_angular=True)
+    assert np.allclose(dos.to_numpy(), whole.to_numpy())
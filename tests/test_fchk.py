@@ -0,0 +1,196 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # the project modules live one level up
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import fchk_cache
+from extract_orbitals import extract_file, orbital_columns, orbital_spins
+from fchk_cache import evict, load_fchk
+from fchk_class import HARTREE_TO_EV, Fchk, FchkIndex
+from synthetic import scalar_line, write_fchk
+
+# Small enough to parse quickly; 23 leaves a partial last line in every R block
+NAT, NBASIS = 5, 23
+
+
+def reference_section(path, name):
+    """
+    Read an array section with plain string splitting, independently of fchk_class.
+
+    :param path: The .fchk file.
+    :param name: The section name.
+    :return: The values as a float array.
+    """
+    with open(path, "r", newline="") as f:
+        lines = f.read().splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith(name) and "N=" in line:
+            n = int(line.split()[-1])
+            values = []
+            for text in lines[i + 1 :]:
+                values.extend(text.split())
+                if len(values) >= n:
+                    return np.array(values[:n], dtype=float)
+    raise KeyError(name)
+
+
+@pytest.fixture(params=["lf", "crlf"])
+def checkpoint(request, tmp_path):
+    path = write_fchk(str(tmp_path / "synthetic.fchk"), NAT, NBASIS, beta=True)
+    if request.param == "crlf":
+        with open(path, "rb") as f:
+            text = f.read()
+        with open(path, "wb") as f:
+            f.write(text.replace(b"\n", b"\r\n"))
+    return path
+
+
+@pytest.fixture(params=["eager", "lazy"])
+def parsed(request, checkpoint):
+    return Fchk(checkpoint, lazy=request.param == "lazy")
+
+
+def test_energies(parsed, checkpoint):
+    for spin in ("alpha", "beta"):
+        expected = np.round(reference_section(checkpoint, f"{spin.title()} Orbital Energies") * HARTREE_TO_EV, 4)
+        np.testing.assert_array_equal(getattr(parsed, f"{spin}_energies"), expected)
+
+
+def test_homo(parsed):
+    assert parsed.numbasis == NBASIS
+    assert parsed.ahomo == parsed.aelec - 1
+    assert parsed.alumo == parsed.aelec
+    assert parsed.bhomo == parsed.belec - 1
+
+
+def test_coefficients(parsed, checkpoint):
+    expected = reference_section(checkpoint, "Alpha MO coefficients").reshape(NBASIS, NBASIS)
+    np.testing.assert_array_equal(parsed.mo_coefficients(), expected)
+    np.testing.assert_array_equal(parsed.mo_coefficients(slice(3, 9)), expected[3:9])
+    rows = np.array([parsed.ahomo, 0, NBASIS - 1])
+    np.testing.assert_array_equal(parsed.mo_coefficients(rows), expected[rows])
+
+
+def test_row_slices(checkpoint):
+    expected = reference_section(checkpoint, "Beta MO coefficients").reshape(NBASIS, NBASIS)
+    fchk = Fchk(checkpoint, lazy=True)
+    np.testing.assert_array_equal(fchk.mo_coefficients(slice(5, 7), "beta"), expected[5:7])
+    assert "beta_coeffs" not in fchk._arrays  # decoded from the needed lines only
+    values = reference_section(checkpoint, "Alpha MO coefficients")
+    index = FchkIndex.build(checkpoint)
+    for start, stop in ((0, 1), (4, 11), (7, 8), (520, 600)):
+        np.testing.assert_array_equal(index.read_values(checkpoint, "Alpha MO coefficients", start, stop), values[start:stop])
+
+
+def test_saved_index(checkpoint, tmp_path):
+    index_file = str(tmp_path / "synthetic.index.json")
+    first = Fchk(checkpoint, lazy=True, index=index_file)
+    assert os.path.exists(index_file)
+    second = Fchk(checkpoint, lazy=True, index=index_file)
+    assert second._index.sections == first._index.sections
+    np.testing.assert_array_equal(second.alpha_energies, Fchk(checkpoint).alpha_energies)
+
+
+def test_cache(checkpoint, tmp_path):
+    eager = Fchk(checkpoint)
+    cache_dir = str(tmp_path / "cache")
+    for _ in range(2):  # a miss that writes the entry, then a hit that reads it
+        cached = load_fchk(checkpoint, cache_dir=cache_dir)
+        np.testing.assert_array_equal(cached.alpha_energies, eager.alpha_energies)
+        np.testing.assert_array_equal(np.asarray(cached.mo_coefficients(slice(2, 6))), eager.alpha_coeffs[2:6])
+        assert cached.ahomo == eager.ahomo
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_not_a_checkpoint(tmp_path, lazy):
+    path = tmp_path / "orbitals.fchk"
+    for text in (b"", b"Synthetic checkpoint\n", b"compound,eV\nNiCis,-5.2\n", b"title\nSP RB3LYP def2SVP\n1 2 3\n"):
+        path.write_bytes(text)
+        with pytest.raises(ValueError, match="not a formatted checkpoint"):
+            Fchk(str(path), lazy=lazy)
+
+
+def test_truncated(checkpoint, tmp_path):
+    with open(checkpoint, "rb") as f:
+        text = f.read()
+    path = str(tmp_path / "truncated.fchk")
+    with open(path, "wb") as f:
+        f.write(text[: text.index(b"Alpha MO coefficients") + 400])
+    with pytest.raises(ValueError, match="truncated"):
+        Fchk(path)
+    with pytest.raises(ValueError, match="truncated"):
+        Fchk(path, lazy=True).mo_coefficients()
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_empty_beta_manifold(tmp_path, lazy):
+    path = write_fchk(str(tmp_path / "doublet.fchk"), NAT, NBASIS, beta=True)
+    with open(path, "r") as f:
+        lines = f.read().splitlines()
+    i = next(i for i, line in enumerate(lines) if line.startswith("Number of beta electrons"))
+    lines[i] = scalar_line("Number of beta electrons", "I", 0)
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+    fchk = Fchk(path, lazy=lazy)
+    assert orbital_spins(fchk) == ["alpha", "beta"]
+    assert (fchk.bhomo, fchk.blumo) == (-1, 0)
+    columns = orbital_columns(fchk, "doublet", 2, 2, spin="beta")
+    assert list(columns["orbital_label"]) == ["LUMO", "LUMO+1"]
+
+
+def test_partial_cache(checkpoint, tmp_path):
+    eager = Fchk(checkpoint)
+    cache_dir = str(tmp_path / "cache")
+    energies = load_fchk(checkpoint, cache_dir=cache_dir, attributes=["alpha_energies", "beta_energies"])
+    np.testing.assert_array_equal(energies.beta_energies, eager.beta_energies)
+    assert "alpha_coeffs" not in energies._arrays  # the coefficient block was never decoded
+    entry = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+    assert not os.path.exists(os.path.join(entry, "alpha_coeffs.npy"))
+
+    # A caller that needs everything does not take the partial entry
+    full = load_fchk(checkpoint, cache_dir=cache_dir)
+    np.testing.assert_array_equal(np.asarray(full.alpha_coeffs), eager.alpha_coeffs)
+    assert os.path.exists(os.path.join(entry, "alpha_coeffs.npy"))
+
+
+@pytest.mark.parametrize("attributes", [None, ["alpha_energies", "beta_energies"]])
+def test_cache_dtype(checkpoint, tmp_path, attributes):
+    cache_dir = str(tmp_path / "cache")
+    for _ in range(2):  # coefficient rows keep the requested dtype on a miss and on a hit
+        cached = load_fchk(checkpoint, cache_dir=cache_dir, coeff_dtype=np.float32, attributes=attributes)
+        rows = cached.mo_coefficients([1, 4])
+        assert rows.dtype == np.float32
+        np.testing.assert_allclose(rows, Fchk(checkpoint).alpha_coeffs[[1, 4]], rtol=1e-6)
+
+
+def vanished(*args, **kwargs):
+    raise FileNotFoundError("removed by another worker")
+
+
+@pytest.mark.parametrize("step", ["read_table", "load_fchk", "write_table"])
+def test_extract_survives_eviction(checkpoint, tmp_path, monkeypatch, step):
+    monkeypatch.setattr(fchk_cache, step, vanished)
+    path, columns, error = extract_file(checkpoint, 3, str(tmp_path / "cache"))
+    assert error is None
+    np.testing.assert_array_equal(columns["eV"], orbital_columns(Fchk(checkpoint), "synthetic", 3, 3)["eV"])
+
+
+def test_extract_missing_file_fails(tmp_path):
+    path, columns, error = extract_file(str(tmp_path / "missing.fchk"), 3, str(tmp_path / "cache"))
+    assert columns is None and error.startswith("FileNotFoundError")
+
+
+def test_evict_skips_vanished_entries(checkpoint, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    load_fchk(checkpoint, cache_dir=cache_dir)
+    os.makedirs(os.path.join(cache_dir, "gone"))
+    entry_size = fchk_cache.entry_size
+    monkeypatch.setattr(fchk_cache, "entry_size", lambda path: vanished() if path.endswith("gone") else entry_size(path))
+    removed = evict(cache_dir, 0)
+    assert len(removed) == 1 and not removed[0].endswith("gone")
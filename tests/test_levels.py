@@ -0,0 +1,97 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # the project modules live one level up
+
+from MOplot_repulsion_adjustText2 import check_degen, degen_clusters, prepare_levels
+from correlation_lines import match_by_key
+from label_layout import pack_column
+
+
+def test_degen_groups():
+    # The same energies in two compounds are never degenerate with each other
+    values = [1.0, 1.0, 2.0, 1.0]
+    groups = ["A", "B", "A", "A"]
+    cluster = degen_clusters(values, 0.1, groups)
+    assert cluster[0] == cluster[3] != cluster[1]
+    assert len({cluster[0], cluster[1], cluster[2]}) == 3
+    assert list(check_degen(values, 0.1, groups)) == [0, 0, 0, 1]
+
+
+def test_degen_chain():
+    # Each gap is below degen, so the whole chain is one cluster although its ends are further apart
+    values = [1.0, 1.05, 1.1, 1.15, 3.0]
+    cluster = degen_clusters(values, 0.08)
+    assert len(set(cluster[:4])) == 1
+    assert cluster[4] != cluster[0]
+    # A gap of exactly degen starts a new cluster
+    assert degen_clusters([1.0, 1.5], 0.5)[0] != degen_clusters([1.0, 1.5], 0.5)[1]
+
+
+def test_degen_rank_order():
+    # Members of a cluster are ranked by their position in the input, not by value
+    values = [1.1, 5.0, 1.0, 1.05]
+    assert list(check_degen(values, 0.08)) == [0, 0, 1, 2]
+    cluster = degen_clusters(values, 0.08)
+    assert list(check_degen(values, 0.08, cluster=cluster)) == [0, 0, 1, 2]
+
+
+def test_pack_column():
+    rng = np.random.default_rng(0)
+    bottoms = np.sort(rng.uniform(0, 10, 50))
+    heights = rng.uniform(0.2, 0.6, 50)
+    packed = pack_column(bottoms, heights, gap=0.1)
+    # Labels keep their order and no two neighbours overlap
+    assert np.all(np.diff(packed) > 0)
+    assert np.all(packed[1:] >= packed[:-1] + heights[:-1] + 0.1 - 1e-12)
+
+
+def test_pack_column_centred():
+    # Labels that already fit stay where they are; overlapping ones are centred on their targets
+    assert np.allclose(pack_column([0.0, 2.0], [1.0, 1.0]), [0.0, 2.0])
+    assert np.allclose(pack_column([1.0, 1.0], [1.0, 1.0]), [0.5, 1.5])
+    assert len(pack_column([], [])) == 0
+
+
+def level_table():
+    return pd.DataFrame(
+        {
+            "compound": ["A"] * 4 + ["B"] * 3,
+            "eV": [-5.0, -5.0, -5.01, -2.0, -4.0, -4.0, -1.0],
+            "orbital_label": ["HOMO-2", "HOMO-1", "HOMO", "LUMO", "HOMO-1", "HOMO", "LUMO"],
+        }
+    )
+
+
+def test_jitter_seed():
+    first, order = prepare_levels(level_table(), 0.05, 0.1, jitter_seed=7)
+    second, _ = prepare_levels(level_table(), 0.05, 0.1, jitter_seed=7)
+    other, _ = prepare_levels(level_table(), 0.05, 0.1, jitter_seed=8)
+    assert order == ["A", "B"]
+    assert np.array_equal(first["_jitter"], second["_jitter"])
+    assert np.array_equal(first["eV"], second["eV"])
+    assert not np.array_equal(first["_jitter"], other["_jitter"])
+    # Only the second and later members of a degenerate cluster move
+    assert list(first["_jitter"] > 0) == [False, True, True, False, False, True, False]
+
+
+def test_match_by_key():
+    energy_a = np.array([-5.0, -3.0, -2.0, -1.0])
+    energy_b = np.array([-1.1, -2.1, -5.2, -0.5])
+    keys_a = ["A1", "B", "B", '" "']
+    keys_b = ["B", "B", "A1", '" "']
+    ia, ib = match_by_key(energy_a, energy_b, keys_a, keys_b)
+    pairs = sorted(zip(ia.tolist(), ib.tolist()))
+    # A1 is paired directly, the two Bs by closest energy, and the blank labels not at all
+    assert pairs == [(0, 2), (1, 1), (2, 0)]
+
+
+@pytest.mark.parametrize("keys_b", [["C"], []])
+def test_match_by_key_unmatched(keys_b):
+    ia, ib = match_by_key(np.array([-1.0]), np.array([-1.0] * len(keys_b)), ["A"], keys_b)
+    assert len(ia) == len(ib) == 0
@@ -0,0 +1,63 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # the project modules live one level up
+
+from build_manifest import code_digest, is_up_to_date, job_record, settings_digest, settings_inputs
+
+
+@pytest.fixture
+def job(tmp_path):
+    data = tmp_path / "orbitals.csv"
+    data.write_text("compound,eV\nNiCis,-5.0\n")
+    checkpoint = tmp_path / "NiCis.fchk"
+    checkpoint.write_text("checkpoint\n")
+    output = tmp_path / "figure.png"
+    output.write_bytes(b"png")
+    settings = {"degen": 0.05, "dos": {"files": {"NiCis": str(checkpoint)}}}
+    return data, checkpoint, output, settings
+
+
+def record(data, output, settings, code="code"):
+    return job_record(str(data), settings_digest(settings, formats=["png"]), [str(output)], code_hash=code, settings=settings)
+
+
+def test_up_to_date(job):
+    data, checkpoint, output, settings = job
+    previous = record(data, output, settings, code_digest())
+    assert str(checkpoint) in previous["inputs"]
+    assert is_up_to_date(record(data, output, settings, code_digest()), previous)
+    assert not is_up_to_date(record(data, output, settings), None)
+
+
+@pytest.mark.parametrize("change", ["data", "checkpoint", "settings", "code", "output"])
+def test_out_of_date(job, change):
+    data, checkpoint, output, settings = job
+    previous = record(data, output, settings)
+    code = "code"
+    if change == "data":
+        data.write_text("compound,eV\nNiCis,-5.1\n")
+    elif change == "checkpoint":
+        checkpoint.write_text("checkpoint, rerun\n")
+    elif change == "settings":
+        settings = {**settings, "degen": 0.1}
+    elif change == "code":
+        code = "edited"
+    else:
+        output.unlink()
+    assert not is_up_to_date(record(data, output, settings, code), previous)
+
+
+@pytest.mark.parametrize("listed", [False, True])
+def test_settings_inputs(listed):
+    checkpoints = {"NiCis": "/data/NiCis.fchk", "PdCis": "/data/PdCis.fchk"}
+    files = list(checkpoints.values()) if listed else checkpoints
+    settings = {"correlate": "overlap", "correlation_fchk": files, "dos": {"files": files}}
+    assert settings_inputs(settings) == ["/data/NiCis.fchk", "/data/PdCis.fchk"]
+    # A panel may name its own checkpoints, and only correlate="overlap" reads them
+    panels = {"panels": [{"correlate": "overlap", "correlation_fchk": files}, {"correlation_fchk": ["/data/ZnCis.fchk"]}]}
+    assert settings_inputs(panels) == ["/data/NiCis.fchk", "/data/PdCis.fchk"]
+    assert settings_inputs({"correlation_fchk": files}) == []
@@ -0,0 +1,65 @@
+import glob
+import os
+import sys
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # the project modules live one level up
+
+from orbital_store import COMPACT_FILE, append_frame, compact, load_orbitals
+
+
+def orbital_frame(compound, energies, spin="alpha"):
+    labels = ["HOMO-1", "HOMO", "LUMO", "LUMO+1"][: len(energies)]
+    return pd.DataFrame(
+        {
+            "compound": compound,
+            "unround_eV": energies,
+            "eV": [round(e, 2) for e in energies],
+            "symmetry_label": '" "',
+            "orbital_label": labels,
+            "orbital_num": range(10, 10 + len(energies)),
+            "spin": spin,
+            "calc_date": "06-20-23",
+        }
+    )
+
+
+def fill_store(store):
+    append_frame(store, orbital_frame("NiCis", [-6.0, -5.0, -2.0, -1.0]))
+    append_frame(store, orbital_frame("PdCis", [-6.5, -5.5, -2.5, -1.5]))
+    append_frame(store, orbital_frame("PtCis", [-7.0, -6.0, -3.0, -2.0]))
+    # A later ingestion of NiCis replaces the first one
+    append_frame(store, orbital_frame("NiCis", [-6.1, -5.1, -2.1, -1.1]))
+
+
+def test_load_filters(tmp_path):
+    store = str(tmp_path / "store")
+    fill_store(store)
+    frame = load_orbitals(store, compounds=["PtCis", "NiCis"], orbital_labels=["HOMO", "LUMO"])
+    # The compounds come back in the order asked for, with only the latest NiCis rows
+    assert list(frame["compound"]) == ["PtCis", "PtCis", "NiCis", "NiCis"]
+    assert list(frame["orbital_label"]) == ["HOMO", "LUMO", "HOMO", "LUMO"]
+    assert list(frame.loc[frame["compound"] == "NiCis", "unround_eV"]) == [-5.1, -2.1]
+
+    assert len(load_orbitals(store, orbital_nums=[10])) == 3
+    assert len(load_orbitals(store, spins=["beta"])) == 0
+    assert len(load_orbitals(store, compounds=["NiCis"], latest=False)) == 8
+
+
+def test_compact(tmp_path):
+    store = str(tmp_path / "store")
+    fill_store(store)
+    before = load_orbitals(store)
+    path = compact(store)
+    assert glob.glob(os.path.join(store, "*.parquet")) == [path]
+    assert os.path.basename(path) == COMPACT_FILE
+    after = load_orbitals(store, latest=False)
+    # Compaction keeps one row per orbital, the latest one
+    assert len(after) == 12
+    assert list(after.loc[after["compound"] == "NiCis", "unround_eV"]) == [-6.1, -5.1, -2.1, -1.1]
+    key = ["compound", "orbital_num"]
+    pd.testing.assert_frame_equal(
+        before.sort_values(key).reset_index(drop=True), after.sort_values(key).reset_index(drop=True)
+    )
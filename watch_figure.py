@@ -0,0 +1,251 @@
+import argparse
+import os
+import sys
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")  # render off-screen, before pyplot is imported
+
+import matplotlib.pyplot as plt
+import pandas as pd
+import seaborn as sns
+
+from MOplot_repulsion_adjustText2 import (
+    draw_correlations,
+    draw_labels,
+    draw_levels,
+    engine_levels,
+    load_settings,
+    plot_settings,
+    prepare_levels,
+    with_defaults,
+)
+from render_figures import resolve_data_path, resolve_settings_paths
+
+# Settings that only move or restyle the labels; a change to any other setting redraws the levels as well
+LABEL_SETTINGS = {
+    "size",
+    "textX",
+    "texty",
+    "use_adjust_text",
+    "use_orbital_labels",
+    "label_engine",
+    "label_column",
+}
+
+
+class FigureWatcher:
+    """
+    Keep one figure, its data and its settings in memory, and redraw it when the settings file or the data change. Edits that only touch label settings redraw just the labels; other edits redraw the levels from the data already in memory, and the data is reread only when its file changes. Settings with "panels" or "dos" are drawn whole by plot_settings, as render_figures.py draws them. The figure is written out after every redraw.
+    """
+
+    def __init__(self, settings_file, out_path, dpi=150, data_path=None):
+        """
+        :param settings_file: The settings file to watch.
+        :param out_path: The image file to write after every redraw.
+        :param dpi: The resolution of the image.
+        :param data_path: A data file or orbital store to use instead of the data_path entry of the settings.
+        """
+        self.settings_file = settings_file
+        self.out_path = out_path
+        self.dpi = dpi
+        self.data_override = data_path
+        self.settings = None
+        self.data_path = None
+        self.data = None
+        self.levels = None
+        self.base_ylim = None
+        self.labels = []
+        self.stamps = {}
+        sns.set_theme(style="ticks", context="notebook", font_scale=1)
+        self.figure, self.ax = plt.subplots()
+
+    def changed(self, path):
+        """
+        Return True if a file or directory has changed since the last call for it.
+
+        :param path: The file or directory.
+        :return: Whether its modification time or size changed.
+        """
+        try:
+            stat = os.stat(path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stamp = None
+        if self.stamps.get(path, False) == stamp:
+            return False
+        self.stamps[path] = stamp
+        return True
+
+    def update(self):
+        """
+        Check the settings and data for changes and redraw what they affect.
+
+        :return: "figure" or "labels" for what was redrawn, or None if nothing changed.
+        """
+        old_settings = self.settings
+        if self.changed(self.settings_file):
+            self.settings = with_defaults(resolve_settings_paths(load_settings(self.settings_file), self.settings_file))
+        data_path = self.data_override or resolve_data_path(self.settings["data_path"], self.settings_file)
+        query_changed = old_settings is not None and old_settings.get("query") != self.settings.get("query")
+        data_changed = self.changed(data_path) or data_path != self.data_path or query_changed
+        if data_changed:
+            self.data_path = data_path
+            self.data = self.read_data()
+
+        changed_keys = {
+            key
+            for key in set(self.settings) | set(old_settings or {})
+            if (old_settings or {}).get(key) != self.settings.get(key)
+        }
+        if data_changed or changed_keys - LABEL_SETTINGS:
+            self.draw_figure()
+            redrawn = "figure"
+        elif changed_keys and self.levels is None:  # a composite figure has no labels of its own to redraw
+            self.draw_figure()
+            redrawn = "figure"
+        elif changed_keys:
+            self.draw_labels()
+            redrawn = "labels"
+        else:
+            return None
+        self.figure.savefig(self.out_path, dpi=self.dpi, bbox_inches="tight")
+        return redrawn
+
+    def read_data(self):
+        """
+        Read the orbital table from the data file or orbital store.
+
+        :return: The DataFrame.
+        """
+        if os.path.isdir(self.data_path):
+            from orbital_store import load_orbitals
+
+            return load_orbitals(self.data_path, **self.settings.get("query", {}))
+        return pd.read_csv(self.data_path)
+
+    def draw_figure(self):
+        """
+        Clear the Axes and draw the levels and labels from the data in memory. Panels and DOS figures go through plot_settings, which replaces the contents of the Figure.
+
+        :return: None
+        """
+        settings = self.settings
+        self.labels = []
+        self.levels = None
+        if self.ax not in self.figure.axes:  # removed by an earlier composite figure
+            self.figure.clf()
+            self.ax = self.figure.add_subplot()
+        if "panels" in settings or "dos" in settings:
+            plot_settings(settings, self.data, ax=self.ax)
+            return
+        ax = self.ax
+        ax.cla()
+        self.figure.set_size_inches(tuple(settings["figsize"]))
+        ax.grid(axis="y")
+        self.levels, column_order = prepare_levels(
+            self.data,
+            settings["degen"],
+            settings["vertical_jitter"],
+            settings["jitter_seed"],
+            settings["split_spins"],
+        )
+        self.levels = engine_levels(self.levels, settings["level_engine"])
+        draw_levels(
+            ax,
+            self.levels,
+            column_order,
+            settings["marker_size"],
+            settings["line_width"],
+            None,
+            settings["level_engine"],
+            settings["bar_width"],
+            settings["degen_gap"],
+        )
+        if settings["correlate"]:
+            draw_correlations(
+                ax,
+                self.levels,
+                column_order,
+                settings["correlate"],
+                settings["marker_size"],
+                settings["level_engine"],
+                settings["bar_width"],
+                settings["degen_gap"],
+                settings["correlation_fchk"],
+            )
+        self.base_ylim = ax.get_ylim()
+        self.draw_labels()
+        ax.set(xlabel=None)
+        ax.set_ylabel("eV")
+        sns.despine(ax=ax)
+
+    def draw_labels(self):
+        """
+        Replace the labels, restoring the y-limits the label layout may have widened.
+
+        :return: None
+        """
+        settings, ax = self.settings, self.ax
+        for artist in self.labels:
+            artist.remove()
+        ax.set_ylim(self.base_ylim)
+        self.labels = draw_labels(
+            ax,
+            self.levels,
+            settings["size"],
+            settings["textX"],
+            settings["marker_size"],
+            settings["line_width"],
+            settings["texty"],
+            settings["use_adjust_text"],
+            settings["use_orbital_labels"],
+            settings["label_engine"],
+            settings["label_column"],
+            settings["level_engine"],
+            settings["bar_width"],
+            settings["degen_gap"],
+        )
+
+    def run(self, interval=0.2):
+        """
+        Poll for changes until interrupted, reporting each redraw on stderr.
+
+        :param interval: The time between polls, in seconds.
+        :return: None
+        """
+        while True:
+            start = time.perf_counter()
+            try:
+                redrawn = self.update()
+            except Exception as e:  # keep watching while a file is half-written or invalid
+                print(f"FAILED {type(e).__name__}: {e}", file=sys.stderr)
+                redrawn = None
+            if redrawn:
+                elapsed = time.perf_counter() - start
+                print(f"redrew {redrawn} in {elapsed:.2f}s: {self.out_path}", file=sys.stderr)
+            time.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Redraw an MO diagram whenever its settings or data file changes, keeping the figure in memory."
+    )
+    parser.add_argument("settings", nargs="?", default="settings.json", help="settings file to watch")
+    parser.add_argument("-o", "--output", default="figure.png", help="image to write after every redraw")
+    parser.add_argument("--data", default=None, help="data file or orbital store, instead of the settings' data_path")
+    parser.add_argument("--dpi", type=int, default=150, help="resolution of the image")
+    parser.add_argument("--interval", type=float, default=0.2, help="seconds between checks for changes")
+    args = parser.parse_args(argv)
+
+    watcher = FigureWatcher(args.settings, args.output, args.dpi, args.data)
+    try:
+        watcher.run(args.interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())